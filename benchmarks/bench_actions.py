@@ -0,0 +1,128 @@
+"""文字列の行動と行動コード (Action + DurationTable) の比較．
+
+イベント処理の速度と，イベントログを保持したときの 1 イベントあたりの
+メモリ使用量を比べます．スケジューラの違いが混ざらないよう，どちらの
+モデルも ``--scheduler`` のイベントキューで走らせます．
+
+    python benchmarks/bench_actions.py --customers 100000 --scheduler heap
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sushi import Simulation, SushiModel  # noqa: E402
+from sushi.scheduler import CalendarQueue, HeapScheduler  # noqa: E402
+from sushi.sinks import MemorySink  # noqa: E402
+
+SCHEDULERS = {'heap': HeapScheduler, 'calendar': CalendarQueue}
+
+EATING_DURATION = 5
+ORDERING_DURATION = 3
+
+
+def string_customer_process(customer_id, plates, start_time=0):
+    # 行動コード導入前 (ページ 05 の 3 節) のプロセス
+    time = yield (start_time, customer_id, 'お店に到着')
+    for _ in range(plates - 1):
+        time = yield (time, customer_id, '1皿注文')
+    time = yield (time, customer_id, '最後の注文')
+    yield (time, customer_id, '退店')
+
+
+def string_model(number, seed):
+    rng = random.Random(seed)
+
+    def compute_duration(previous_action):
+        if previous_action == 'お店に到着':
+            interval = ORDERING_DURATION
+        elif previous_action == '1皿注文':
+            interval = EATING_DURATION + ORDERING_DURATION
+        elif previous_action == '最後の注文':
+            interval = EATING_DURATION
+        else:
+            return 1
+        return int(rng.expovariate(1 / interval))
+
+    sim = Simulation(compute_duration)
+    for i in range(number):
+        sim.add(
+            i,
+            string_customer_process(i, rng.randint(1, 10),
+                                    3 * i + rng.randint(1, 3)))
+    return sim
+
+
+def code_model(number, seed):
+    return SushiModel(number_of_customers=number, end_time=None,
+                      seed=seed).simulation()
+
+
+class TupleLog:
+    # print の代わりにタプルのリストへ溜める素朴なログ
+
+    def __init__(self):
+        self.events = []
+
+    def record(self, time, customer_id, action):
+        self.events.append((time, customer_id, action))
+
+    def flush(self):
+        pass
+
+
+def pin(sim, scheduler):
+    # 登録済みのイベントを指定のスケジューラに移し替える
+    target = SCHEDULERS[scheduler]()
+    while len(sim.scheduler):
+        target.push(sim.scheduler.pop())
+    sim.scheduler = target
+    return sim
+
+
+def events_per_second(build, number, scheduler, repeat):
+    best = None
+    for _ in range(repeat):
+        sim = pin(build(number, 1991), scheduler)
+        start = time.perf_counter()
+        sim.run()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return sim.events, sim.events / best
+
+
+def bytes_per_event(build, number, sink):
+    sim = build(number, 1991)
+    tracemalloc.start()
+    sim.sink = sink
+    sim.run()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return size / sim.events
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--customers', type=int, default=100_000)
+    parser.add_argument('--scheduler', choices=SCHEDULERS, default='heap')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f'{"model":<10}{"events":>12}{"events/s":>14}'
+          f'{"B/event (tuple)":>18}{"B/event (columns)":>20}')
+    for name, build in [('string', string_model), ('code', code_model)]:
+        events, rate = events_per_second(build, args.customers,
+                                         args.scheduler, args.repeat)
+        tuple_size = bytes_per_event(build, args.customers, TupleLog())
+        column_size = bytes_per_event(build, args.customers, MemorySink())
+        print(f'{name:<10}{events:>12,}{rate:>14,.0f}'
+              f'{tuple_size:>18.1f}{column_size:>20.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+"""ジェネレータのエンジンと asyncio (仮想時間) バックエンドのスループット比較．
+
+    python benchmarks/bench_async.py --customers 20000
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sushi import SushiModel  # noqa: E402
+from sushi.aio import AsyncShop  # noqa: E402
+
+
+def model(customers):
+    return SushiModel(number_of_customers=customers, end_time=None, seed=1991)
+
+
+def run_generator(customers):
+    sim = model(customers).simulation()
+    sim.run()
+    return sim.events
+
+
+def run_asyncio(customers):
+    shop = AsyncShop(model(customers))
+    shop.run()
+    return shop.events
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--customers', type=int, default=20_000)
+    args = parser.parse_args()
+
+    print(f'{"backend":<12}{"events":>12}{"sec":>10}{"events/s":>14}')
+    for name, runner in [('generator', run_generator),
+                         ('asyncio', run_asyncio)]:
+        start = time.perf_counter()
+        events = runner(args.customers)
+        elapsed = time.perf_counter() - start
+        print(f'{name:<12}{events:>12,}{elapsed:>10.2f}'
+              f'{events / elapsed:>14,.0f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""我慢の限界 (取り消されるイベント) のコスト．
+
+席数のあるモデルで，並んだ顧客全員に我慢の限界を持たせる場合と，
+持たせない場合の毎秒のイベント数を比べます．我慢できる時間を十分長く
+するので，処理されるイベントはどちらも同じです．``waited`` は我慢の限界を
+持って並んだ顧客の数です．
+
+マシンの揺らぎを抑えるため，設定を交互に ``--repeat`` 回ずつ実行し，
+CPU 時間から求めた毎秒のイベント数の中央値を出します．
+
+    python benchmarks/bench_cancel.py --customers 100000
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sushi import SushiModel  # noqa: E402
+from sushi.scheduler import CalendarQueue, HeapScheduler  # noqa: E402
+
+
+def run(customers, seats, patience, heap, seed):
+    model = SushiModel(number_of_customers=customers,
+                       customer_interval=1,
+                       end_time=None,
+                       seats=seats,
+                       patience=patience,
+                       seed=seed)
+    sim = model.simulation()
+    scheduler = HeapScheduler() if heap else CalendarQueue()
+    while len(sim.scheduler):
+        scheduler.push(sim.scheduler.pop())
+    sim.scheduler = scheduler
+    start = time.process_time()
+    sim.run()
+    elapsed = time.process_time() - start
+    waited = 0
+    if patience is not None:
+        waited = model.seating.waited
+    return sim.events, waited, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--customers', type=int, default=100_000)
+    parser.add_argument('--seats', type=int, default=40)
+    parser.add_argument('--seed', type=int, default=1991)
+    parser.add_argument('--patience', type=float, default=10**9)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    configs = [(heap, patience)
+               for heap in (True, False)
+               for patience in (None, args.patience)]
+    results = {config: [] for config in configs}
+    for _ in range(args.repeat):
+        for heap, patience in configs:
+            results[heap, patience].append(
+                run(args.customers, args.seats, patience, heap, args.seed))
+
+    print(f'{"scheduler":<10}{"patience":>10}{"events":>12}'
+          f'{"waited":>12}{"events/s":>14}{"ratio":>8}')
+    baseline = None
+    for heap, patience in configs:
+        runs = results[heap, patience]
+        events, waited, _ = runs[0]
+        rate = statistics.median(events / elapsed for _, _, elapsed in runs)
+        if patience is None:
+            baseline = rate
+        name = 'heap' if heap else 'calendar'
+        print(f'{name:<10}{str(patience):>10}{events:>12,}'
+              f'{waited:>12,}{rate:>14,.0f}{rate / baseline:>8.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""queue.PriorityQueue によるループと sushi.Simulation のスループット比較．
+
+    python benchmarks/bench_engine.py --events 10000000
+"""
+import argparse
+import os
+import queue
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sushi import Simulation, customer_process  # noqa: E402
+from sushi.actions import Action  # noqa: E402
+
+DURATIONS = {
+    Action.ARRIVE: 3,
+    Action.ORDER: 8,
+    Action.LAST_ORDER: 5,
+    Action.LEAVE: 1,
+}
+compute_duration = DURATIONS.__getitem__
+
+
+def make_customers(number, plates):
+    return {
+        i: customer_process(i, plates, start_time=i % 97)
+        for i in range(number)
+    }
+
+
+def run_priority_queue(customers):
+    # ページ 05 のループから print を除いたもの
+    event_que = queue.PriorityQueue()
+    for _, process in customers.items():
+        event_que.put(next(process))
+    events = 0
+    while not event_que.empty():
+        simulation_time, customer_id, previous_action = event_que.get()
+        events += 1
+        next_time = simulation_time + compute_duration(previous_action)
+        try:
+            next_event = customers[customer_id].send(next_time)
+        except StopIteration:
+            del customers[customer_id]
+        else:
+            event_que.put(next_event)
+    return events
+
+
+def run_engine(customers):
+    sim = Simulation(compute_duration)
+    for customer_id, process in customers.items():
+        sim.add(customer_id, process)
+    sim.run()
+    return sim.events
+
+
+def measure(runner, customers):
+    start = time.perf_counter()
+    events = runner(customers)
+    elapsed = time.perf_counter() - start
+    return events, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--events', type=int, default=1_000_000)
+    parser.add_argument('--customers', type=int, default=1000)
+    args = parser.parse_args()
+
+    # 1 人あたり plates + 2 イベント
+    plates = max(1, args.events // args.customers - 2)
+    print(f'{"backend":<16}{"events":>12}{"sec":>10}{"events/s":>14}')
+    for name, runner in [('PriorityQueue', run_priority_queue),
+                         ('Simulation', run_engine)]:
+        events, elapsed = measure(runner,
+                                  make_customers(args.customers, plates))
+        print(f'{name:<16}{events:>12,}{elapsed:>10.2f}'
+              f'{events / elapsed:>14,.0f}')
+
+
+if __name__ == '__main__':
+    main()
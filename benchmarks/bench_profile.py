@@ -0,0 +1,63 @@
+"""プロファイリングモード (sushi.profiling) のコストと出力．
+
+``profiler`` なし (通常のループ) と計測ありで毎秒のイベント数を比べ，
+計測ありの要約の表を表示します．``--trace`` を
+指定すると Chrome のトレース形式の JSON を書き出します．
+
+    python benchmarks/bench_profile.py --customers 100000 --trace trace.json
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sushi import SushiModel  # noqa: E402
+from sushi.profiling import Profiler  # noqa: E402
+
+
+def run(customers, seed, profiler):
+    model = SushiModel(number_of_customers=customers,
+                       customer_interval=1,
+                       end_time=None,
+                       seats=customers // 20,
+                       seed=seed)
+    sim = model.simulation()
+    sim.profiler = profiler
+    start = time.perf_counter()
+    sim.run()
+    return sim.events, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--customers', type=int, default=100_000)
+    parser.add_argument('--seed', type=int, default=1991)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--trace', default=None)
+    args = parser.parse_args()
+
+    print(f'{"mode":<10}{"events":>12}{"events/s":>14}{"ratio":>8}')
+    baseline = None
+    for name, factory in (('off', lambda: None), ('profiled', Profiler)):
+        events, elapsed = min(
+            (run(args.customers, args.seed, factory())
+             for _ in range(args.repeat)),
+            key=lambda result: result[1])
+        rate = events / elapsed
+        if baseline is None:
+            baseline = rate
+        print(f'{name:<10}{events:>12,}{rate:>14,.0f}{rate / baseline:>8.2f}')
+
+    profiler = Profiler()
+    run(args.customers, args.seed, profiler)
+    print()
+    print(profiler.table())
+    if args.trace is not None:
+        profiler.write_trace(args.trace)
+        print(f'\ntrace written to {args.trace}')
+
+
+if __name__ == '__main__':
+    main()
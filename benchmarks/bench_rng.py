@@ -0,0 +1,80 @@
+"""ブロック単位の乱数列 (sushi.rng) による所要時間の抽出の比較．
+
+``random.Random`` で 1 個ずつ引く場合と，``Streams`` でブロック単位に
+引く場合の毎秒のイベント数を測り，``cProfile`` で内部時間の上位の関数を
+表示します．
+
+    python benchmarks/bench_rng.py --customers 100000
+"""
+import argparse
+import cProfile
+import os
+import pstats
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sushi import SushiModel  # noqa: E402
+from sushi.rng import BACKENDS, Streams  # noqa: E402
+
+
+def make_model(customers, seed, backend):
+    streams = None
+    if backend is not None:
+        streams = Streams(seed, backend=backend)
+    return SushiModel(number_of_customers=customers,
+                      customer_interval=1,
+                      end_time=None,
+                      streams=streams,
+                      seed=seed)
+
+
+def run(customers, seed, backend):
+    sim = make_model(customers, seed, backend).simulation()
+    start = time.perf_counter()
+    sim.run()
+    return sim.events, time.perf_counter() - start
+
+
+def profile(customers, seed, backend, top):
+    sim = make_model(customers, seed, backend).simulation()
+    profiler = cProfile.Profile()
+    profiler.runcall(sim.run)
+    stats = pstats.Stats(profiler)
+    stats.sort_stats('tottime')
+    width = max(len(pstats.func_std_string(func)) for func in stats.fcn_list)
+    for func in stats.fcn_list[:top]:
+        _, calls, tottime, _, _ = stats.stats[func]
+        name = pstats.func_std_string(func)
+        print(f'  {name:<{min(width, 60)}.60}{calls:>10,}{tottime:>8.3f}s')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--customers', type=int, default=100_000)
+    parser.add_argument('--seed', type=int, default=1991)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--top', type=int, default=6)
+    args = parser.parse_args()
+
+    backends = [None] + sorted(BACKENDS)
+    print(f'{"rng":<10}{"events":>12}{"events/s":>14}{"ratio":>8}')
+    baseline = None
+    for backend in backends:
+        events, elapsed = min(
+            (run(args.customers, args.seed, backend)
+             for _ in range(args.repeat)),
+            key=lambda result: result[1])
+        rate = events / elapsed
+        if baseline is None:
+            baseline = rate
+        name = backend or 'random'
+        print(f'{name:<10}{events:>12,}{rate:>14,.0f}{rate / baseline:>8.2f}')
+    for backend in backends:
+        print(f'\n{backend or "random"}: top {args.top} by internal time')
+        profile(args.customers, args.seed, backend, args.top)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""HeapScheduler と CalendarQueue の比較．
+
+店内の顧客数 (イベントキューの長さ) を変えながら，所要時間が整数の
+モデルで毎秒のイベント数を測り，CalendarQueue が速くなる境目を探します．
+
+    python benchmarks/bench_scheduler.py --events 1000000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sushi import Simulation, customer_process  # noqa: E402
+from sushi.actions import Action  # noqa: E402
+from sushi.durations import DurationTable, FloorExponential  # noqa: E402
+from sushi.scheduler import CalendarQueue, HeapScheduler  # noqa: E402
+
+SCHEDULERS = {
+    'heap': HeapScheduler,
+    'calendar': CalendarQueue,
+}
+
+
+def make_durations(seed):
+    rng = random.Random(seed)
+    return DurationTable(
+        {
+            Action.ARRIVE: FloorExponential(3),
+            Action.ORDER: FloorExponential(8),
+            Action.LAST_ORDER: FloorExponential(5),
+            Action.LEAVE: FloorExponential(1),
+        },
+        rng=rng)
+
+
+def run(scheduler, customers, plates, seed):
+    sim = Simulation(make_durations(seed), scheduler=scheduler())
+    for i in range(customers):
+        sim.add(i, customer_process(i, plates, start_time=i % 97))
+    start = time.perf_counter()
+    sim.run()
+    return sim.events, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--events', type=int, default=1_000_000)
+    parser.add_argument('--customers',
+                        type=int,
+                        nargs='+',
+                        default=[100, 1_000, 10_000, 100_000, 300_000])
+    parser.add_argument('--seed', type=int, default=1991)
+    args = parser.parse_args()
+
+    print(f'{"customers":>10}' +
+          ''.join(f'{name + " ev/s":>16}' for name in SCHEDULERS) +
+          f'{"ratio":>8}')
+    crossover = None
+    for customers in args.customers:
+        # 1 人あたり plates + 2 イベント
+        plates = max(1, args.events // customers - 2)
+        rates = []
+        for scheduler in SCHEDULERS.values():
+            events, elapsed = run(scheduler, customers, plates, args.seed)
+            rates.append(events / elapsed)
+        ratio = rates[1] / rates[0]
+        if crossover is None and ratio > 1:
+            crossover = customers
+        print(f'{customers:>10,}' + ''.join(f'{rate:>16,.0f}'
+                                            for rate in rates) +
+              f'{ratio:>8.2f}')
+    if crossover is None:
+        print('calendar queue was not faster at any size')
+    else:
+        print(f'calendar queue first beats the heap at '
+              f'{crossover:,} customers')
+
+
+if __name__ == '__main__':
+    main()
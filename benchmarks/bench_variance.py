@@ -0,0 +1,74 @@
+"""分散減少法による信頼区間の半幅の比較．
+
+席数を 1 つ増やしたときの指標の差を，独立な乱数で 2 つの設定を別々に
+反復した場合と，共通乱数 (``compare()``) の場合で比べます．1 つの設定の
+平均についても，素朴な反復・対称変量・制御変量 (来店数) を比べます．
+``ratio`` は同じ半幅を得るのに必要な反復数が何分の 1 になるか
+(半幅の比の 2 乗) です．対称変量は 1 反復が 2 回のシミュレーションなので，
+同じシミュレーション回数で比べています．
+
+    python benchmarks/bench_variance.py --replications 64
+"""
+import argparse
+import math
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sushi import PiecewiseIntensity  # noqa: E402
+from sushi.runner import compare, replicate  # noqa: E402
+from sushi.stats import t_quantile  # noqa: E402
+
+METRICS = ('mean_wait', 'mean_queue_length', 'mean_time_in_store')
+
+
+def row(metric, method, half_width, baseline):
+    ratio = (baseline / half_width)**2 if half_width else math.inf
+    print(f'{metric:<20}{method:<22}{half_width:>12.4f}{ratio:>8.1f}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--replications', type=int, default=64)
+    parser.add_argument('--seats', type=int, default=14)
+    parser.add_argument('--rate', type=float, default=0.3)
+    parser.add_argument('--end-time', type=float, default=600)
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    n = args.replications
+    baseline = dict(seats=args.seats,
+                    intensity=PiecewiseIntensity([0], [args.rate]),
+                    end_time=args.end_time)
+    variant = dict(baseline, seats=args.seats + 1)
+    quantile = t_quantile(0.975, n - 1)
+
+    print(f'{"metric":<20}{"method":<22}{"half width":>12}{"ratio":>8}')
+    print(f'-- difference ({args.seats + 1} seats - {args.seats} seats)')
+    before = replicate(n, 1, args.workers, **baseline)
+    after = replicate(n, 2, args.workers, **variant)
+    paired = compare(n, baseline, variant, workers=args.workers)
+    for metric in METRICS:
+        independent = quantile * math.sqrt(
+            (before.stats[metric].variance + after.stats[metric].variance) /
+            n)
+        row(metric, 'independent', independent, independent)
+        row(metric, 'common random numbers',
+            paired.stats[metric].half_width(), independent)
+
+    print(f'-- mean ({args.seats} seats)')
+    plain = replicate(n, 1, args.workers, streams=True, **baseline)
+    mirrored = replicate(n // 2, 1, args.workers, antithetic=True,
+                         **baseline)
+    for metric in METRICS:
+        half_width = plain.stats[metric].half_width()
+        row(metric, 'plain', half_width, half_width)
+        row(metric, 'antithetic', mirrored.stats[metric].half_width(),
+            half_width)
+        row(metric, 'control variate', plain.controlled(metric)[1],
+            half_width)
+
+
+if __name__ == '__main__':
+    main()
@@ -391,6 +391,8 @@ st.markdown('''
     -   パラメータ `lambd` は，単位時間に平均で発生するイベントの数を表します
         -   例えば `rambd=1` のとき，単位時間あたりに平均 1 回のイベントが発生することを意味します
         -   例えば `rambd=1/10` のとき，単位時間あたりに平均 1/10 回のイベントが発生することを意味します，これはおよそ 10 秒に 1 回発生するイベントが次に起こるまでのランダムな秒数を返すことになります
+-   `queue.PriorityQueue` はスレッド間でデータを受け渡すためのキューで，`put`/`get` のたびにロックを取ります
+    -   単一スレッドのシミュレーションでは `heapq` で十分です．リポジトリの `sushi` パッケージには `heapq` を使ったエンジン `sushi.Simulation` を収録しています
 
 ''')
 
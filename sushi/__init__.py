@@ -0,0 +1,26 @@
+"""回転寿司顧客注文シミュレーション (ページ 05) の実装．"""
+from .actions import Action
+from .arrivals import ArrivalSource, PeakIntensity, PiecewiseIntensity
+from .engine import PROCESS_REGISTRY, Simulation, register_process
+from .model import (DEFAULT_CUSTOMER_INTERVAL, DEFAULT_END_TIME,
+                    DEFAULT_NUMBER_OF_CUSTOMERS, EATING_DURATION,
+                    ORDERING_DURATION, SushiModel, customer_process)
+from .resource import Seats
+
+__all__ = [
+    'Action',
+    'ArrivalSource',
+    'DEFAULT_CUSTOMER_INTERVAL',
+    'DEFAULT_END_TIME',
+    'DEFAULT_NUMBER_OF_CUSTOMERS',
+    'EATING_DURATION',
+    'ORDERING_DURATION',
+    'PROCESS_REGISTRY',
+    'PeakIntensity',
+    'PiecewiseIntensity',
+    'Seats',
+    'Simulation',
+    'SushiModel',
+    'customer_process',
+    'register_process',
+]
@@ -0,0 +1,44 @@
+"""顧客の行動を表すコード．
+
+ページ 05 ではイベントに 'お店に到着' などの文字列を持たせ，
+``compute_duration`` で文字列を順に比較していました．ここでは行動を
+整数のコード (``IntEnum``) で表し，文字列は表示するときにだけ
+``label()`` で取り出します．
+"""
+import enum
+
+
+class Action(enum.IntEnum):
+    ARRIVE = 0
+    ORDER = 1
+    LAST_ORDER = 2
+    LEAVE = 3
+    SPAWN = 4
+    TICK = 5
+    BALK = 6
+    RENEGE = 7
+    DELIVERY = 8
+
+    @property
+    def label(self):
+        return LABELS[self]
+
+
+LABELS = {
+    Action.ARRIVE: 'お店に到着',
+    Action.ORDER: '1皿注文',
+    Action.LAST_ORDER: '最後の注文',
+    Action.LEAVE: '退店',
+    Action.SPAWN: '来店',
+    Action.TICK: 'レーン回転',
+    Action.BALK: '並ばずに帰る',
+    Action.RENEGE: '待ちきれずに帰る',
+    Action.DELIVERY: '入荷',
+}
+
+
+def label(action):
+    """表示用の文字列．``Action`` 以外の値はそのまま文字列にする"""
+    if isinstance(action, Action):
+        return LABELS[action]
+    return str(action)
@@ -0,0 +1,135 @@
+"""``async def`` で書いた顧客を仮想時間のイベントループで動かすバックエンド．
+
+ページ 06 の ``asyncio`` と同じ書き方で，顧客を ``await asyncio.sleep()``
+するコルーチンとして表します．``VirtualTimeEventLoop`` は眠る代わりに
+次に予定された時刻まで時計を進めるので，シミュレーションは一瞬で
+終わります．``scale`` (実時間 1 秒あたりの仮想時間) を指定すると，
+同じモデルを実時間に合わせてゆっくり動かすこともできます．
+"""
+import asyncio
+import selectors
+import time as _time
+
+from .actions import Action
+
+
+class _VirtualSelector(selectors.DefaultSelector):
+    # イベントループが select() で待つ時間だけ仮想時計を進める
+
+    def __init__(self, loop):
+        super().__init__()
+        self._loop = loop
+
+    def select(self, timeout=None):
+        events = super().select(0)
+        if events or timeout is None or timeout <= 0:
+            return events or super().select(timeout)
+        scale = self._loop.scale
+        if scale is None:
+            self._loop.advance(timeout)
+            return events
+        started = _time.monotonic()
+        events = super().select(timeout / scale)
+        if events:
+            self._loop.advance((_time.monotonic() - started) * scale)
+        else:
+            self._loop.advance(timeout)
+        return events
+
+
+class VirtualTimeEventLoop(asyncio.SelectorEventLoop):
+    """``time()`` が仮想時計を返すイベントループ
+
+    ``scale=None`` なら待たずに次の予定時刻へ飛び，数値を指定すると
+    実時間 1 秒につき ``scale`` だけ仮想時計を進めます．
+    """
+
+    def __init__(self, start=0.0, scale=None):
+        self.virtual_time = start
+        self.scale = scale
+        super().__init__(selector=_VirtualSelector(self))
+
+    def time(self):
+        return self.virtual_time
+
+    def advance(self, duration):
+        self.virtual_time += duration
+
+
+class AsyncShop:
+    """``SushiModel`` の顧客を ``async def`` のプロセスとして動かす
+
+    所要時間の分布 (``model.compute_duration``) と席数はモデルのものを
+    そのまま使います．イベントは ``sink.record()`` で記録されます．
+    """
+
+    def __init__(self, model, sink=None, stats=None):
+        self.model = model
+        self.sink = sink
+        self.stats = stats
+        self.events = 0
+        self.seats = None
+
+    def _record(self, customer_id, action):
+        self.events += 1
+        if self.sink is not None:
+            self.sink.record(asyncio.get_running_loop().time(), customer_id,
+                             action)
+
+    async def customer(self, customer_id, plates, start_time=0):
+        loop = asyncio.get_running_loop()
+        compute_duration = self.model.compute_duration
+        sleep = asyncio.sleep
+        await sleep(start_time - loop.time())
+        self._record(customer_id, Action.ARRIVE)
+        if self.seats is not None:
+            arrived = loop.time()
+            await self.seats.acquire()
+            if self.stats is not None:
+                self.stats.observe_wait(loop.time() - arrived)
+        try:
+            await sleep(compute_duration(Action.ARRIVE))
+            for _ in range(plates - 1):
+                self._record(customer_id, Action.ORDER)
+                await sleep(compute_duration(Action.ORDER))
+            self._record(customer_id, Action.LAST_ORDER)
+            await sleep(compute_duration(Action.LAST_ORDER))
+            self._record(customer_id, Action.LEAVE)
+        finally:
+            if self.seats is not None:
+                self.seats.release()
+
+    async def main(self):
+        model = self.model
+        if model.seats is not None:
+            self.seats = asyncio.Semaphore(model.seats)
+        randint = model.rng.randint
+        interval = model.customer_interval
+        tasks = [
+            asyncio.create_task(
+                self.customer(i, randint(1, 10),
+                              interval * i + randint(1, interval)))
+            for i in range(model.number_of_customers)
+        ]
+        if not tasks:
+            return 0
+        timeout = None
+        if model.end_time is not None:
+            timeout = model.end_time - asyncio.get_running_loop().time()
+        _, pending = await asyncio.wait(tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        return len(pending)
+
+    def run(self, scale=None):
+        """シミュレーションを実行し，取り残された顧客の人数を返す"""
+        loop = VirtualTimeEventLoop(scale=scale)
+        try:
+            return loop.run_until_complete(self.main())
+        finally:
+            loop.close()
+
+
+def run_async(model, sink=None, stats=None, scale=None):
+    return AsyncShop(model, sink, stats).run(scale)
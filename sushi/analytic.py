@@ -0,0 +1,196 @@
+"""待ち行列の公式による席の待ち時間の計算．
+
+来店が一定強度のポアソン過程で，席が ``c`` 席のモデルは M/G/c 待ち行列
+です．滞在時間 (席に着いてから立つまで) が指数分布なら M/M/c で，
+待つ確率はアーランの C 式で厳密に求まります．ページ 05 の 3 節の
+モデルでは滞在時間は ``int()`` で切り捨てた指数分布の和なので，
+Allen–Cunneen の近似 (待ち時間を ``(1 + 滞在時間の変動係数²) / 2`` 倍する)
+で補正します．どちらも席数に比例する回数の四則演算だけなので，
+シミュレーションを回さずにマイクロ秒単位で答えが出ます．
+
+``validate()`` はシミュレーションの反復結果を公式と比べます．
+シミュレーションは空の店から始まるので，``end_time`` は滞在時間に比べて
+十分長くしてください．
+"""
+import math
+from typing import NamedTuple
+
+from .actions import Action
+from .durations import UniformInt
+from .model import SushiModel
+from .runner import DEFAULT_MASTER_SEED, replicate
+
+# SushiModel.customers() と同じ 1 人あたりの皿数
+PLATES = UniformInt(1, 10)
+
+
+class QueueMetrics(NamedTuple):
+    arrival_rate: float
+    mean_stay: float
+    servers: int
+    utilization: float
+    prob_wait: float
+    mean_wait: float
+    mean_queue_length: float
+    mean_time_in_store: float
+    mean_in_store: float
+    exact: bool
+
+
+def erlang_c(servers, load):
+    """``servers`` 席，提供負荷 ``load`` (= λ × 平均滞在時間) で待つ確率
+
+    アーランの B 式の漸化式 B(k) = a B(k-1) / (k + a B(k-1)) から求めるので，
+    席数が多くても桁あふれしません．``load >= servers`` なら 1 です．
+    """
+    if load >= servers:
+        return 1.0
+    blocking = 1.0
+    for k in range(1, servers + 1):
+        blocking = load * blocking / (k + load * blocking)
+    return servers * blocking / (servers - load * (1 - blocking))
+
+
+def mgc(arrival_rate, mean_stay, servers, stay_scv=1.0):
+    """M/G/c 待ち行列の定常状態の指標
+
+    ``stay_scv`` は滞在時間の変動係数の 2 乗 (分散 / 平均²) です．
+    1 (指数分布) なら M/M/c の厳密な値，それ以外は Allen–Cunneen の近似です．
+    席が足りない (利用率が 1 以上) ときは待ち時間と行列の長さが無限大になります．
+    """
+    load = arrival_rate * mean_stay
+    utilization = load / servers
+    exact = stay_scv == 1
+    if utilization >= 1:
+        return QueueMetrics(arrival_rate, mean_stay, servers, 1.0, 1.0,
+                            math.inf, math.inf, math.inf, math.inf, exact)
+    prob_wait = erlang_c(servers, load)
+    mean_wait = 0.0
+    if mean_stay > 0:
+        mean_wait = (prob_wait * mean_stay / (servers - load) *
+                     (1 + stay_scv) / 2)
+    # リトルの公式
+    mean_queue_length = arrival_rate * mean_wait
+    return QueueMetrics(arrival_rate, mean_stay, servers, utilization,
+                        prob_wait, mean_wait, mean_queue_length,
+                        mean_wait + mean_stay, mean_queue_length + load,
+                        exact)
+
+
+def arrival_rate(model):
+    """一定強度のポアソン過程で来店するモデルの来店強度"""
+    rates = set(getattr(model.intensity, 'rates', ()))
+    if len(rates) != 1:
+        raise ValueError('arrivals must be a constant-rate PiecewiseIntensity')
+    return rates.pop()
+
+
+def stay_moments(model):
+    """1 人が席にいる時間 (来店から退店まで) の平均と分散
+
+    滞在時間は ``ARRIVE`` と ``LAST_ORDER`` の所要時間と，皿数 - 1 回の
+    ``ORDER`` の所要時間の和です (ランダムな個数の和の分散の公式を使う)．
+    """
+    distributions = model.compute_duration.distributions
+    try:
+        arrive, order, last_order = (distributions[action] for action in (
+            Action.ARRIVE, Action.ORDER, Action.LAST_ORDER))
+        orders_mean = PLATES.mean - 1
+        mean = arrive.mean + orders_mean * order.mean + last_order.mean
+        variance = (arrive.variance + last_order.variance +
+                    orders_mean * order.variance +
+                    PLATES.variance * order.mean * order.mean)
+    except AttributeError:
+        raise ValueError('durations must have a known mean and variance')
+    return mean, variance
+
+
+def analyze(model):
+    """``model`` (``SushiModel``) の席の待ち行列を公式で求める
+
+    公式が使えない設定 (ポアソン過程でない来店，席数なし，我慢の限界，
+    レーンなど) では ``ValueError`` を送出します．
+    """
+    if type(model) is not SushiModel:
+        raise ValueError('only SushiModel has a closed form')
+    if model.seats is None:
+        raise ValueError('the model has no seats')
+    if (model.patience is not None or model.balk_at is not None or
+            model.conveyor is not None):
+        raise ValueError('reneging, balking and conveyors have no closed form')
+    rate = arrival_rate(model)
+    mean, variance = stay_moments(model)
+    scv = variance / (mean * mean) if mean > 0 else 1.0
+    return mgc(rate, mean, model.seats, scv)
+
+
+class Check(NamedTuple):
+    name: str
+    analytic: float
+    simulated: float
+    low: float
+    high: float
+
+    @property
+    def within(self):
+        """公式の値が信頼区間に入っているか"""
+        return self.low <= self.analytic <= self.high
+
+    @property
+    def relative_error(self):
+        if not self.analytic:
+            return math.inf if self.simulated else 0.0
+        return (self.simulated - self.analytic) / self.analytic
+
+
+class Validation:
+    """シミュレーションの反復結果と公式の比較"""
+
+    NAMES = ('mean_wait', 'mean_queue_length', 'mean_time_in_store')
+
+    def __init__(self, expected, summary, level=0.95):
+        self.expected = expected
+        self.summary = summary
+        self.level = level
+        self.checks = []
+        for name in self.NAMES:
+            if name in summary.stats:
+                low, high = summary.confidence_interval(name, level)
+                self.checks.append(
+                    Check(name, getattr(expected, name), summary.mean(name),
+                          low, high))
+
+    def __repr__(self):
+        return (f'{type(self).__name__}(exact={self.expected.exact}, '
+                f'within={self.within})')
+
+    @property
+    def within(self):
+        return all(check.within for check in self.checks)
+
+    def table(self):
+        lines = [
+            f'{"metric":<20}{"analytic":>12}{"simulated":>12}'
+            f'{"error":>9}  ci'
+        ]
+        for check in self.checks:
+            mark = 'ok' if check.within else 'out'
+            lines.append(f'{check.name:<20}{check.analytic:>12.4f}'
+                         f'{check.simulated:>12.4f}'
+                         f'{check.relative_error:>8.1%}  {mark}')
+        return '\n'.join(lines)
+
+
+def validate(replications,
+             master_seed=DEFAULT_MASTER_SEED,
+             workers=None,
+             level=0.95,
+             **params):
+    """``replications`` 回の反復を実行し，公式と比べた ``Validation`` を返す
+
+    ``params`` は ``SushiModel`` にそのまま渡されます．Allen–Cunneen の
+    近似 (``expected.exact`` が偽) の場合，数 % のずれは近似の誤差です．
+    """
+    expected = analyze(SushiModel(**params))
+    summary = replicate(replications, master_seed, workers, **params)
+    return Validation(expected, summary, level)
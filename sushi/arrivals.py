@@ -0,0 +1,167 @@
+"""非定常ポアソン過程による来店の生成．
+
+来店強度 λ(t) (1 分あたりの来店数) を与え，来店時刻を 1 件ずつ遅延生成
+します．``ArrivalSource`` は来店時刻になってから顧客のプロセスを作るので，
+``customers`` 辞書に全顧客を前もって並べる必要がなく，メモリは店内の
+顧客数だけで済みます．
+
+-   ``inversion_arrivals``: 累積強度 Λ(t) の逆関数による厳密な生成
+-   ``thinning_arrivals``: Lewis–Shedler の間引き法．λ(t) の上界だけ分かれば
+    滑らかな強度関数にも使えます
+"""
+import bisect
+import itertools
+import math
+import random
+
+from .actions import Action
+
+
+class PiecewiseIntensity:
+    """区分的に一定な来店強度
+
+    ``breakpoints[i]`` から ``breakpoints[i + 1]`` までの強度が
+    ``rates[i]`` です (最後の区間は ``period`` または無限大まで)．
+    ``period`` を指定すると強度はその周期で繰り返されます．
+    """
+
+    def __init__(self, breakpoints, rates, period=None):
+        if len(breakpoints) != len(rates):
+            raise ValueError('breakpoints and rates must have the same length')
+        if breakpoints[0] != 0:
+            raise ValueError('breakpoints must start at 0')
+        if any(rate < 0 for rate in rates):
+            raise ValueError('rates must be non-negative')
+        self.breakpoints = list(breakpoints)
+        self.rates = list(rates)
+        self.period = period
+        self.max_rate = max(rates)
+        # cumulative[i] は breakpoints[i] までの累積強度
+        self.cumulative = [0.0]
+        for (left, right), rate in zip(
+                itertools.pairwise(self.breakpoints), self.rates):
+            self.cumulative.append(self.cumulative[-1] + rate * (right - left))
+        if period is not None:
+            self.period_total = (self.cumulative[-1] + self.rates[-1] *
+                                 (period - self.breakpoints[-1]))
+
+    def __call__(self, time):
+        if self.period is not None:
+            time %= self.period
+        return self.rates[bisect.bisect_right(self.breakpoints, time) - 1]
+
+    def cumulative_at(self, time):
+        """Λ(time) = ∫_0^time λ(s) ds"""
+        cycles = 0.0
+        if self.period is not None:
+            cycles, time = divmod(time, self.period)
+            cycles *= self.period_total
+        i = bisect.bisect_right(self.breakpoints, time) - 1
+        return (cycles + self.cumulative[i] + self.rates[i] *
+                (time - self.breakpoints[i]))
+
+    def inverse(self, value):
+        """Λ(t) = value となる最小の t (強度 0 の区間は飛ばす)"""
+        offset = 0.0
+        if self.period is not None:
+            if self.period_total <= 0:
+                return math.inf
+            cycles, value = divmod(value, self.period_total)
+            offset = cycles * self.period
+        i = bisect.bisect_right(self.cumulative, value) - 1
+        # 値がちょうど区間の境界にあり，その区間の強度が 0 なら先へ進む
+        while i < len(self.rates) - 1 and self.rates[i] == 0:
+            i += 1
+        if self.rates[i] == 0:
+            return math.inf
+        return (offset + self.breakpoints[i] +
+                (value - self.cumulative[i]) / self.rates[i])
+
+
+class PeakIntensity:
+    """ベースの強度にガウス型のピークを重ねた滑らかな来店強度
+
+    ``peaks`` は ``(中心時刻, 幅, 高さ)`` の列です．昼と夜のピークなどを
+    表します．``max_rate`` は間引き法で使う上界です．
+    """
+
+    def __init__(self, base, peaks=(), period=None):
+        self.base = base
+        self.peaks = [tuple(peak) for peak in peaks]
+        self.period = period
+        self.max_rate = base + sum(height for _, _, height in self.peaks)
+
+    def __call__(self, time):
+        if self.period is not None:
+            time %= self.period
+        rate = self.base
+        for center, width, height in self.peaks:
+            rate += height * math.exp(-0.5 * ((time - center) / width)**2)
+        return rate
+
+
+def inversion_arrivals(intensity, start=0, end=math.inf, rng=random):
+    """累積強度の逆関数で ``[start, end)`` の来店時刻を順に生成する"""
+    level = intensity.cumulative_at(start)
+    expovariate = rng.expovariate
+    while True:
+        level += expovariate(1.0)
+        time = intensity.inverse(level)
+        if time >= end:
+            return
+        yield time
+
+
+def thinning_arrivals(intensity, start=0, end=math.inf, rng=random,
+                      max_rate=None):
+    """Lewis–Shedler の間引き法で ``[start, end)`` の来店時刻を順に生成する
+
+    ``max_rate`` は λ(t) の上界で，省略すると ``intensity.max_rate`` を
+    使います．
+    """
+    if max_rate is None:
+        max_rate = intensity.max_rate
+    if max_rate <= 0:
+        return
+    expovariate = rng.expovariate
+    uniform = rng.random
+    time = start
+    while True:
+        time += expovariate(max_rate)
+        if time >= end:
+            return
+        if uniform() * max_rate < intensity(time):
+            yield time
+
+
+class ArrivalSource:
+    """来店時刻の列から顧客プロセスを遅延生成する
+
+    ``factory(customer_id, time)`` は時刻 ``time`` に到着する顧客の
+    プロセスを返す関数です．ソース自身は顧客IDが ``-1`` のイベント
+    ``action`` として登録されるので，同時刻の顧客より先に処理されます．
+    """
+
+    def __init__(self, times, factory, first_id=0, action=Action.SPAWN):
+        self.times = iter(times)
+        self.factory = factory
+        self.action = action
+        self.arrived = 0
+        self._ids = itertools.count(first_id)
+
+    def attach(self, sim):
+        sim.on(self.action, self._arrive)
+        self._schedule_next(sim)
+        return self
+
+    def _schedule_next(self, sim):
+        time = next(self.times, None)
+        if time is not None:
+            sim.schedule(time, -1, self.action)
+
+    def _arrive(self, sim, time, customer_id, action):
+        customer_id = next(self._ids)
+        sim.add(customer_id, self.factory(customer_id, time))
+        self.arrived += 1
+        self._schedule_next(sim)
+        return False
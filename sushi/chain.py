@@ -0,0 +1,374 @@
+"""チェーン全体 (複数店舗) のシミュレーション．
+
+店舗ごとに ``SushiModel``・イベントキュー・乱数列を持ち，店舗を
+``workers`` 個のワーカープロセスに振り分けて並列に動かします．
+ワーカーとは ``multiprocessing.Pipe`` でやり取りし，返すのは店舗ごとの
+``KPICollector`` と少しの指標だけです．店舗の乱数列は親シードと店舗番号
+だけで決まるので，ワーカー数を変えても結果は変わりません．
+
+``coupling`` (``CentralKitchen`` など) を指定すると，店舗どうしを
+つなぐイベント (中央厨房からの配送など) を扱います．各店舗は
+``window`` 分ずつ進めては止まり，親がその区間の報告を集めて次の区間の
+配送を決めます．配送は区間の終わり以降に届くので，区間の中では
+各店舗が独立に動けます．
+
+ワーカーは ``multiprocessing.Process`` で起動するので，spawn で
+起動する環境 (Windows と macOS) では ``if __name__ == '__main__':`` の
+中から呼んでください．
+"""
+import hashlib
+import math
+import multiprocessing
+import os
+import random
+from collections import deque
+
+from .actions import Action
+from .model import DEFAULT_END_TIME, SushiModel
+from .runner import DEFAULT_MASTER_SEED
+from .stats import KPICollector
+
+# 配送イベントの顧客ID (ArrivalSource は -1，レーンは -2 以下を使う)
+DELIVERY_ID = -1000
+
+
+def store_seed(master_seed, store):
+    """``master_seed`` の ``store`` 番目の店舗に使うシード"""
+    digest = hashlib.sha256(f'{master_seed}:store:{store}'.encode()).digest()
+    return int.from_bytes(digest, 'big')
+
+
+class Stock:
+    """店舗の皿 (ネタ) の在庫
+
+    注文 (``Action.ORDER`` と ``Action.LAST_ORDER``) のたびに 1 皿
+    減らし，在庫がなければ顧客は入荷まで待ちます．入荷は
+    ``deliver()`` で予約し，``Action.DELIVERY`` のイベントで届きます．
+    ``attach()`` の前に同じ行動に登録されていたフックは，在庫を
+    取った時点で呼ばれます．
+    """
+
+    def __init__(self, level):
+        self.level = level
+        self.consumed = 0
+        self.delivered = 0
+        self.stockouts = 0
+        self.waiting = deque()
+        self._deliveries = deque()
+        self._chained = {}
+
+    def __repr__(self):
+        return (f'{type(self).__name__}(level={self.level}, '
+                f'waiting={len(self.waiting)})')
+
+    def attach(self, sim, actions=(Action.ORDER, Action.LAST_ORDER)):
+        for action in actions:
+            self._chained[action] = sim.hooks.get(action)
+            sim.on(action, self.take)
+        sim.on(Action.DELIVERY, self.receive)
+        return self
+
+    def deliver(self, sim, time, quantity):
+        """時刻 ``time`` に ``quantity`` 皿が届くよう予約する"""
+        self._deliveries.append(quantity)
+        sim.schedule(time, DELIVERY_ID, Action.DELIVERY)
+
+    def _serve(self, sim, time, customer_id, action):
+        self.level -= 1
+        self.consumed += 1
+        chained = self._chained.get(action)
+        if chained is None:
+            return True
+        return chained(sim, time, customer_id, action)
+
+    def take(self, sim, time, customer_id, action):
+        if self.level > 0:
+            return self._serve(sim, time, customer_id, action)
+        self.stockouts += 1
+        self.waiting.append((customer_id, action))
+        return False
+
+    def receive(self, sim, time, customer_id, action):
+        quantity = self._deliveries.popleft()
+        self.level += quantity
+        self.delivered += quantity
+        while self.waiting and self.level > 0:
+            waiter, waiter_action = self.waiting.popleft()
+            if self._serve(sim, time, waiter, waiter_action):
+                sim.resume(waiter, time, waiter_action)
+        return False
+
+    def report(self):
+        return {
+            'level': self.level,
+            'consumed': self.consumed,
+            'delivered': self.delivered,
+            'stockouts': self.stockouts,
+            'waiting': len(self.waiting),
+        }
+
+
+class _Store:
+    # 1 店舗分のモデル，シミュレーション，KPI
+
+    def __init__(self, index, params, master_seed, stock=None):
+        self.index = index
+        rng = random.Random(store_seed(master_seed, index))
+        self.model = SushiModel(rng=rng, **params)
+        self.kpis = KPICollector()
+        self.sim = self.model.simulation(sink=self.kpis, stats=self.kpis)
+        self.stock = None
+        if stock is not None:
+            self.stock = Stock(stock).attach(self.sim)
+        self.end_time = self.model.end_time
+        if self.end_time is None:
+            self.end_time = math.inf
+        self.left_behind = len(self.sim.processes)
+
+    def run(self, until, deliveries=()):
+        for time, quantity in deliveries:
+            self.stock.deliver(self.sim, time, quantity)
+        self.left_behind = self.sim.run(min(until, self.end_time))
+        if self.stock is None:
+            return None
+        return self.stock.report()
+
+    def result(self):
+        self.kpis.advance(self.sim.now
+                          if math.isinf(self.end_time) else self.end_time)
+        metrics = {
+            'left_behind': self.left_behind,
+            'events': self.sim.events,
+            'end_time': self.sim.now,
+        }
+        if self.model.seating is not None:
+            report = self.model.seating.report(self.sim.now)
+            metrics['mean_wait'] = report['mean_wait']
+            metrics['mean_queue_length'] = report['mean_queue_length']
+        if self.stock is not None:
+            metrics.update(self.stock.report())
+        return metrics, self.kpis
+
+
+class _Shard:
+    # 1 ワーカーが受け持つ店舗の集まり
+
+    def __init__(self, stores, master_seed, stocks):
+        self.stores = [
+            _Store(index, params, master_seed, stocks.get(index))
+            for index, params in stores
+        ]
+
+    def run(self, until, deliveries):
+        return {
+            store.index: store.run(until, deliveries.get(store.index, ()))
+            for store in self.stores
+        }
+
+    def finish(self):
+        return {store.index: store.result() for store in self.stores}
+
+
+def _worker(conn, stores, master_seed, stocks):
+    shard = _Shard(stores, master_seed, stocks)
+    while True:
+        message = conn.recv()
+        if message[0] == 'run':
+            _, until, deliveries = message
+            conn.send(shard.run(until, deliveries))
+        else:
+            conn.send(shard.finish())
+            conn.close()
+            return
+
+
+class _InlineShard:
+    # workers=1 のときにワーカーを起動せずに同じやり取りをする
+
+    def __init__(self, stores, master_seed, stocks):
+        self._shard = _Shard(stores, master_seed, stocks)
+        self._reply = None
+
+    def send(self, message):
+        if message[0] == 'run':
+            _, until, deliveries = message
+            self._reply = self._shard.run(until, deliveries)
+        else:
+            self._reply = self._shard.finish()
+
+    def recv(self):
+        return self._reply
+
+
+class CentralKitchen:
+    """中央厨房とトラック配送による店舗間の結合
+
+    各店舗は在庫 ``par_level`` 皿から始めます．区間が終わるたびに，
+    在庫と輸送中の皿を ``par_level`` まで戻す量を注文として集め，
+    厨房が 1 区間に作れる ``capacity`` 皿を注文量に比例して配り，
+    ``lead_time`` 分後に届けます．
+    """
+
+    def __init__(self, capacity, par_level, lead_time=0):
+        self.capacity = capacity
+        self.par_level = par_level
+        self.lead_time = lead_time
+        self.shipped = 0
+        self.shortfall = 0
+        self._in_transit = {}  # 店舗ごとの (到着時刻, 皿数) のリスト
+
+    def __repr__(self):
+        return (f'{type(self).__name__}(capacity={self.capacity}, '
+                f'par_level={self.par_level})')
+
+    def initial_stock(self, store):
+        return self.par_level
+
+    def exchange(self, until, reports):
+        """区間の報告 ``{店舗: Stock.report()}`` から配送を決める"""
+        in_transit = self._in_transit
+        orders = {}
+        for store, report in reports.items():
+            # 店舗は until より前のイベントまで進んでいるので，到着時刻が
+            # until 以降の配送はまだ届いていない
+            shipments = [(arrival, quantity)
+                         for arrival, quantity in in_transit.get(store, ())
+                         if arrival >= until]
+            in_transit[store] = shipments
+            pending = sum(quantity for _, quantity in shipments)
+            orders[store] = max(0, self.par_level - report['level'] - pending)
+        total = sum(orders.values())
+        supply = min(self.capacity, total)
+        self.shortfall += total - supply
+        if not supply:
+            return {}
+        shares = {
+            store: order * supply // total
+            for store, order in orders.items()
+        }
+        # 切り捨てた残りは注文の多い店舗から 1 皿ずつ配る
+        rest = supply - sum(shares.values())
+        for store in sorted(orders, key=orders.get, reverse=True)[:rest]:
+            shares[store] += 1
+        arrival = until + self.lead_time
+        deliveries = {}
+        for store, quantity in shares.items():
+            if quantity:
+                deliveries[store] = [(arrival, quantity)]
+                in_transit[store].append((arrival, quantity))
+                self.shipped += quantity
+        return deliveries
+
+
+class ChainResult:
+    """店舗ごとの指標と KPI，全店舗を結合した KPI"""
+
+    def __init__(self, stores, windows=0):
+        self.stores = stores
+        self.windows = windows
+        self.kpis = KPICollector()
+        for _, kpis in stores.values():
+            self.kpis.merge(kpis)
+
+    def __repr__(self):
+        return f'{type(self).__name__}(stores={len(self.stores)})'
+
+    def metrics(self, store):
+        return self.stores[store][0]
+
+    def table(self):
+        lines = [
+            f'{"store":>6}{"customers":>11}{"time in store":>15}'
+            f'{"plates":>9}{"left":>6}'
+        ]
+        for store, (metrics, kpis) in sorted(self.stores.items()):
+            lines.append(f'{store:>6}{kpis.time_in_store.count:>11}'
+                         f'{kpis.time_in_store.mean:>15.2f}'
+                         f'{kpis.plates.mean:>9.2f}'
+                         f'{metrics["left_behind"]:>6}')
+        return '\n'.join(lines)
+
+
+def run_chain(stores,
+              master_seed=DEFAULT_MASTER_SEED,
+              workers=None,
+              coupling=None,
+              window=60):
+    """``stores`` (店舗ごとの ``SushiModel`` の引数の辞書) を並列に動かす
+
+    ``coupling`` がなければ各ワーカーは最後まで一度に進めます．
+    ``coupling`` があるときは ``window`` 分ごとに同期し，その間に
+    ``coupling.exchange(until, reports)`` で店舗間のイベントを決めます．
+    同期は最も遅い ``end_time`` まで続けるので，``end_time`` が
+    ``None`` の店舗があるときは結合できません．
+    """
+    stores = list(enumerate(stores))
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, len(stores)))
+    stocks = {}
+    horizon = math.inf
+    if coupling is not None:
+        stocks = {index: coupling.initial_stock(index) for index, _ in stores}
+        end_times = [
+            params.get('end_time', DEFAULT_END_TIME)
+            for _, params in stores
+        ]
+        if None in end_times:
+            raise ValueError('coupled stores need an end_time')
+        horizon = max(end_times)
+
+    shards = [stores[i::workers] for i in range(workers)]
+    processes = []
+    if workers == 1:
+        conns = [_InlineShard(shards[0], master_seed, stocks)]
+    else:
+        conns = []
+        for shard in shards:
+            parent, child = multiprocessing.Pipe()
+            process = multiprocessing.Process(
+                target=_worker,
+                args=(child, shard, master_seed,
+                      {index: stocks[index]
+                       for index, _ in shard} if stocks else {}),
+                daemon=True)
+            process.start()
+            child.close()
+            conns.append(parent)
+            processes.append(process)
+
+    windows = 0
+    try:
+        if coupling is None:
+            for conn in conns:
+                conn.send(('run', math.inf, {}))
+            for conn in conns:
+                conn.recv()
+        else:
+            deliveries = {}
+            until = 0
+            while until < horizon:
+                until = min(until + window, horizon)
+                # 全ワーカーに区間を渡してから結果を待つので並列に進む
+                for conn in conns:
+                    conn.send(('run', until, deliveries))
+                reports = {}
+                for conn in conns:
+                    reports.update(conn.recv())
+                # 店舗番号順に渡して，ワーカー数によらず同じ配送にする
+                deliveries = coupling.exchange(until, dict(sorted(
+                    reports.items())))
+                windows += 1
+        results = {}
+        for conn in conns:
+            conn.send(('finish', ))
+        for conn in conns:
+            results.update(conn.recv())
+    except BaseException:
+        for process in processes:
+            process.terminate()
+        raise
+    finally:
+        for process in processes:
+            process.join()
+    return ChainResult(dict(sorted(results.items())), windows)
@@ -0,0 +1,143 @@
+"""列ごとのバイナリファイルによる簡単な列指向フォーマット．
+
+ディレクトリの中に列ごとの ``<name>.bin`` (``array`` の生のバイト列) と，
+列の型や件数を記した ``meta.json`` を置きます．読み込みは ``mmap`` で
+行い，各列はコピーなしの ``memoryview`` として取り出せます．
+"""
+import json
+import mmap
+import os
+import sys
+from array import array
+
+META_FILE = 'meta.json'
+
+
+def _column_path(directory, name):
+    return os.path.join(directory, f'{name}.bin')
+
+
+class ColumnWriter:
+    """列をバッチ単位で追記する
+
+    ``append()`` には列名と ``array`` の辞書を渡します．
+    ``close()`` で ``meta.json`` を書き出すまで，読み込み側からは
+    不完全なデータとして扱われます．
+    """
+
+    def __init__(self, directory, typecodes, meta=None):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.typecodes = dict(typecodes)
+        self.meta = dict(meta or {})
+        self.length = 0
+        meta_path = os.path.join(directory, META_FILE)
+        if os.path.exists(meta_path):
+            os.remove(meta_path)
+        self._files = {
+            name: open(_column_path(directory, name), 'wb')
+            for name in self.typecodes
+        }
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def append(self, columns):
+        lengths = {len(values) for values in columns.values()}
+        if len(lengths) != 1 or columns.keys() != self._files.keys():
+            raise ValueError('every column must be given with equal length')
+        for name, values in columns.items():
+            if not isinstance(values, array):
+                values = array(self.typecodes[name], values)
+            elif values.typecode != self.typecodes[name]:
+                raise TypeError(f'column {name!r} must have typecode '
+                                f'{self.typecodes[name]!r}')
+            values.tofile(self._files[name])
+        self.length += lengths.pop()
+
+    def close(self):
+        if self._files is None:
+            return
+        for file in self._files.values():
+            file.close()
+        self._files = None
+        meta = {
+            'length': self.length,
+            'byteorder': sys.byteorder,
+            'columns': self.typecodes,
+            'meta': self.meta,
+        }
+        with open(os.path.join(self.directory, META_FILE), 'w') as file:
+            json.dump(meta, file, ensure_ascii=False)
+
+
+def write_columns(directory, columns, meta=None):
+    """``array`` の辞書をまとめて書き出す"""
+    typecodes = {name: values.typecode for name, values in columns.items()}
+    with ColumnWriter(directory, typecodes, meta) as writer:
+        writer.append(columns)
+
+
+class ColumnTable:
+    """``mmap`` で開いた列の集まり
+
+    ``table[name]`` は列の ``memoryview`` です．ビューはファイルの内容を
+    直接指しているので，``close()`` の前に使い終える必要があります．
+    """
+
+    def __init__(self, directory):
+        with open(os.path.join(directory, META_FILE)) as file:
+            info = json.load(file)
+        if info['byteorder'] != sys.byteorder:
+            raise ValueError(f'{directory} was written on a '
+                             f'{info["byteorder"]}-endian machine')
+        self.directory = directory
+        self.length = info['length']
+        self.typecodes = info['columns']
+        self.meta = info['meta']
+        self._maps = []
+        self._columns = {}
+        for name, typecode in self.typecodes.items():
+            self._columns[name] = self._open(name, typecode)
+
+    def _open(self, name, typecode):
+        size = array(typecode).itemsize * self.length
+        if size == 0:
+            return memoryview(array(typecode))
+        with open(_column_path(self.directory, name), 'rb') as file:
+            mapped = mmap.mmap(file.fileno(), size, access=mmap.ACCESS_READ)
+        self._maps.append(mapped)
+        return memoryview(mapped).cast(typecode)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return self.length
+
+    def __contains__(self, name):
+        return name in self._columns
+
+    def __getitem__(self, name):
+        return self._columns[name]
+
+    def keys(self):
+        return self._columns.keys()
+
+    def close(self):
+        for view in self._columns.values():
+            view.release()
+        self._columns = {}
+        for mapped in self._maps:
+            mapped.close()
+        self._maps = []
+
+
+def open_columns(directory):
+    return ColumnTable(directory)
@@ -0,0 +1,323 @@
+"""回転寿司のレーン．
+
+レーンは ``length`` 個の区画が輪になったもので，皿は区画の番号で引く
+リングバッファ (``array``) に載せます．レーンが 1 区画進むときは
+皿を動かさずに ``offset`` を 1 つ増やすだけなので，レーンを回す手間は
+載っている皿の数によりません．区画 ``i`` の皿がいる位置は
+``(i + offset) % length`` です．
+
+皿は作られてから ``shelf_life`` 分で廃棄されます．廃棄を皿ごとの
+イベントにするとイベントキューが皿の数だけ膨らむので，階層型の
+タイミングホイール (``TimingWheel``) に入れ，レーンが進むたびに
+期限の来た皿だけを取り出します．取られた皿はホイールから消さずに，
+期限が来たときに読み飛ばします．
+
+シミュレーションに積むイベントはレーンごとに 1 つ (``Action.TICK``)
+だけです．注文 (``Action.ORDER`` と ``Action.LAST_ORDER``) の顧客は
+自分の席の前に皿が来るまで保留され，皿を取った時刻に再開されます．
+待っている顧客は席の位置ごとに引けるようにしてあるので，レーンが
+1 区画進む手間は待っている顧客の数ではなく載っている皿の数に比例します．
+"""
+import math
+import random
+from array import array
+
+from .actions import Action
+from .stats import Welford
+
+DEFAULT_WHEEL_SLOTS = 64
+DEFAULT_WHEEL_LEVELS = 4
+EMPTY = -1
+
+
+class TimingWheel:
+    """整数の刻みで期限を管理する階層型タイミングホイール
+
+    各段は ``slots`` (2 のべき) 個のバケツで，段 ``level`` のバケツは
+    ``slots ** level`` 刻み分をまとめて持ちます．上の段のバケツは，
+    その範囲に時刻が入ったときに下の段へ振り分け直します．
+    """
+
+    def __init__(self, slots=DEFAULT_WHEEL_SLOTS, levels=DEFAULT_WHEEL_LEVELS):
+        if slots & (slots - 1):
+            raise ValueError('slots must be a power of two')
+        self.bits = slots.bit_length() - 1
+        self.mask = slots - 1
+        self.levels = levels
+        self.horizon = slots**levels
+        self.tick = 0
+        self._wheels = [[[] for _ in range(slots)] for _ in range(levels)]
+
+    def __len__(self):
+        return sum(len(bucket) for wheel in self._wheels for bucket in wheel)
+
+    def add(self, expires, item):
+        """刻み ``expires`` に取り出す ``item`` を登録する"""
+        expires = max(expires, self.tick + 1)
+        delay = expires - self.tick
+        if delay >= self.horizon:
+            raise ValueError(f'expiry {delay} ticks ahead exceeds the wheel')
+        self._insert(expires, item)
+
+    def _insert(self, expires, item):
+        delay = expires - self.tick
+        level = 0
+        while delay >> (self.bits * (level + 1)):
+            level += 1
+        slot = (expires >> (self.bits * level)) & self.mask
+        self._wheels[level][slot].append((expires, item))
+
+    def advance(self):
+        """1 刻み進め，期限の来た ``item`` のリストを返す"""
+        self.tick = tick = self.tick + 1
+        bits = self.bits
+        top = 0
+        while top + 1 < self.levels and not tick & (
+                (1 << (bits * (top + 1))) - 1):
+            top += 1
+        # 上の段から順に，この範囲に入ったバケツを下の段へ振り分ける
+        for level in range(top, 0, -1):
+            wheel = self._wheels[level]
+            slot = (tick >> (bits * level)) & self.mask
+            bucket = wheel[slot]
+            wheel[slot] = []
+            for expires, item in bucket:
+                self._insert(expires, item)
+        wheel = self._wheels[0]
+        slot = tick & self.mask
+        bucket = wheel[slot]
+        wheel[slot] = []
+        return [item for _, item in bucket]
+
+
+class Lane:
+    """1 本のレーンの状態と統計
+
+    ``tick`` 分ごとに 1 区画進みます．``kitchen`` の位置が空いていれば
+    確率 ``production`` で皿を置き，``seats`` 個の席の前に来た皿は，
+    待っている顧客が確率 ``pick_probability`` で取ります．
+
+    皿は廃棄されるまでに ``shelf_life / tick`` 区画しか進まないので，
+    席はそれより厨房に近い区画 (厨房の次の区画から ``reach`` 区画) に
+    均等に並べます．皿の届かない席に着いた顧客はいつまでも再開されない
+    ためです．皿が厨房の次の区画に届かない ``shelf_life`` では
+    ``ValueError`` を送出します．
+
+    皿を取るまでの待ち時間は ``pick_waits`` (``Welford``) に集計します．
+    """
+
+    def __init__(self,
+                 length,
+                 tick=1,
+                 shelf_life=30,
+                 production=0.5,
+                 pick_probability=0.5,
+                 seats=10,
+                 kitchen=0,
+                 rng=None):
+        self.length = length
+        self.tick = tick
+        self.shelf_life = shelf_life
+        self.life_ticks = max(1, math.ceil(shelf_life / tick))
+        # 皿は置かれた区画から life_ticks - 1 区画先まで取れる
+        self.reach = min(self.life_ticks - 1, length - 1)
+        if self.reach < 1:
+            raise ValueError(
+                f'plates expire before leaving the kitchen (shelf_life='
+                f'{shelf_life}, tick={tick})')
+        self.production = production
+        self.pick_probability = pick_probability
+        self.kitchen = kitchen
+        self.positions = [(kitchen + 1 + i * self.reach // seats) % length
+                          for i in range(seats)]
+        self.rng = rng
+        self.reset()
+
+    def __repr__(self):
+        return (f'{type(self).__name__}(length={self.length}, '
+                f'in_flight={len(self._location)}, '
+                f'waiting={len(self.waiting)})')
+
+    def reset(self):
+        self.ring = array('q', [EMPTY] * self.length)
+        self.offset = 0
+        self.wheel = TimingWheel()
+        self.waiting = {}
+        self.placed = 0
+        self.picked = 0
+        self.wasted = 0
+        self.max_in_flight = 0
+        self.pick_waits = Welford()
+        self._location = {}
+        # 席の位置ごとの待っている顧客 (待ち始めた順の辞書)
+        self._waiting_at = {}
+        self._seat_of = {}
+        self._next_seat = 0
+
+    def cache_key(self):
+        """結果を決める設定だけの辞書 (レーン上の皿などの状態は含めない)"""
+        return {
+            'length': self.length,
+            'tick': self.tick,
+            'shelf_life': self.shelf_life,
+            'production': self.production,
+            'pick_probability': self.pick_probability,
+            'kitchen': self.kitchen,
+            'positions': self.positions,
+        }
+
+    @property
+    def in_flight(self):
+        return len(self._location)
+
+    def wait(self, customer_id, action, time):
+        """``customer_id`` を自分の席の前に皿が来るまで待たせる"""
+        position = self._seat_of.get(customer_id)
+        if position is None:
+            position = self.positions[self._next_seat]
+            self._next_seat = (self._next_seat + 1) % len(self.positions)
+            self._seat_of[customer_id] = position
+        self.waiting[customer_id] = (position, action, time)
+        waiters = self._waiting_at.get(position)
+        if waiters is None:
+            waiters = self._waiting_at[position] = {}
+        waiters[customer_id] = None
+
+    def advance(self, time):
+        """1 区画進め，皿を取った顧客を ``(customer_id, action)`` で返す"""
+        ring = self.ring
+        length = self.length
+        location = self._location
+        rng = self.rng if self.rng is not None else random
+        self.offset = offset = (self.offset + 1) % length
+
+        for plate in self.wheel.advance():
+            index = location.pop(plate, None)
+            if index is not None:
+                ring[index] = EMPTY
+                self.wasted += 1
+
+        index = (self.kitchen - offset) % length
+        if ring[index] == EMPTY and rng.random() < self.production:
+            plate = self.placed
+            self.placed += 1
+            ring[index] = plate
+            location[plate] = index
+            self.wheel.add(self.wheel.tick + self.life_ticks, plate)
+            if len(location) > self.max_in_flight:
+                self.max_in_flight = len(location)
+
+        served = []
+        waiting_at = self._waiting_at
+        if not waiting_at:
+            return served
+        # 皿ごとに，その前で待っている顧客が待ち始めた順に取るかを決める
+        pick_probability = self.pick_probability
+        picks = []
+        for plate, index in location.items():
+            position = (index + offset) % length
+            waiters = waiting_at.get(position)
+            if waiters is None:
+                continue
+            for customer_id in waiters:
+                if rng.random() < pick_probability:
+                    picks.append((plate, index, position, customer_id))
+                    break
+        for plate, index, position, customer_id in picks:
+            ring[index] = EMPTY
+            del location[plate]
+            waiters = waiting_at[position]
+            del waiters[customer_id]
+            if not waiters:
+                del waiting_at[position]
+            _, action, since = self.waiting.pop(customer_id)
+            self.picked += 1
+            self.pick_waits.push(time - since)
+            if action == Action.LAST_ORDER:
+                del self._seat_of[customer_id]
+            served.append((customer_id, action))
+        return served
+
+    def report(self):
+        produced = self.placed
+        return {
+            'placed': produced,
+            'picked': self.picked,
+            'wasted': self.wasted,
+            'in_flight': self.in_flight,
+            'max_in_flight': self.max_in_flight,
+            'waste_rate': self.wasted / produced if produced else 0.0,
+            'pick_rate': self.picked / produced if produced else 0.0,
+            'mean_pick_wait': self.pick_waits.mean,
+            'still_waiting': len(self.waiting),
+        }
+
+
+class Conveyor:
+    """レーンをシミュレーションにつなぐフック
+
+    レーン ``i`` は顧客IDが ``-2 - i`` の ``Action.TICK`` イベントで進みます
+    (``-1`` は ``ArrivalSource`` が使います)．顧客は顧客IDでレーンに
+    振り分けます．``attach()`` の前に同じ行動に登録されていたフック
+    (``Menu`` など) は，皿を取った時点で呼ばれます．
+    """
+
+    def __init__(self, lanes, rng=None):
+        self.lanes = list(lanes)
+        self.rng = rng
+        self._chained = {}
+        self._ticking = 0
+
+    def __repr__(self):
+        return f'{type(self).__name__}(lanes={len(self.lanes)})'
+
+    def attach(self, sim, actions=(Action.ORDER, Action.LAST_ORDER)):
+        """レーンを初期状態に戻し，最初の ``Action.TICK`` を積む"""
+        for action in actions:
+            self._chained[action] = sim.hooks.get(action)
+            sim.on(action, self._order)
+        sim.on(Action.TICK, self._tick)
+        for i, lane in enumerate(self.lanes):
+            if self.rng is not None:
+                lane.rng = self.rng
+            lane.reset()
+            sim.schedule(sim.now + lane.tick, -2 - i, Action.TICK)
+        self._ticking = len(self.lanes)
+        return self
+
+    def cache_key(self):
+        """結果を決める設定だけの辞書"""
+        return {'lanes': [lane.cache_key() for lane in self.lanes]}
+
+    def lane_of(self, customer_id):
+        return self.lanes[customer_id % len(self.lanes)]
+
+    def _order(self, sim, time, customer_id, action):
+        self.lane_of(customer_id).wait(customer_id, action, time)
+        return False
+
+    def _tick(self, sim, time, customer_id, action):
+        lane = self.lanes[-2 - customer_id]
+        for served, served_action in lane.advance(time):
+            chained = self._chained.get(served_action)
+            if chained is None or chained(sim, time, served, served_action):
+                sim.resume(served, time, served_action)
+        # 顧客も，ほかのレーンの TICK 以外のイベントも残っていなければ
+        # レーンを止める (ほかのレーンの TICK だけで互いを回し続けないように)
+        if sim.processes or len(sim) > self._ticking - 1:
+            sim.schedule(time + lane.tick, customer_id, Action.TICK)
+        else:
+            self._ticking -= 1
+        return False
+
+    def report(self):
+        """レーンごとの ``Lane.report()`` と全体の合計"""
+        lanes = [lane.report() for lane in self.lanes]
+        total = {
+            key: sum(report[key] for report in lanes)
+            for key in ('placed', 'picked', 'wasted', 'in_flight')
+        }
+        placed = total['placed']
+        total['waste_rate'] = total['wasted'] / placed if placed else 0.0
+        total['pick_rate'] = total['picked'] / placed if placed else 0.0
+        return {'lanes': lanes, 'total': total}
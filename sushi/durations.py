@@ -0,0 +1,413 @@
+"""行動ごとの所要時間の分布と，行動コードで引く所要時間の表．
+
+分布オブジェクトは ``sampler(rng=None)`` で引数なしの関数を返します
+(``rng`` を省略すると分布自身の乱数生成器，それもなければモジュールの
+``random`` を使います)．``block_sampler(stream)`` は ``sushi.rng.Stream``
+からブロック単位で引く関数を返します．
+``DurationTable`` は行動コードをインデックスとしてその関数を並べた
+リスト ``draws`` を持ちます．``Simulation`` のループは ``draws[action]()``
+と直接引くので，1 回の抽出はリストの参照 1 回と関数呼び出し 1 回で済みます．
+
+実データの所要時間からは ``empirical``，``kernel``，``fit_exponential``，
+``fit_lognormal``，``fit_weibull`` で分布を作れます．どれも分位点関数を
+``InverseCDFTable`` に焼き込むので，1 回の抽出は表の参照と線形補間だけです．
+"""
+import math
+import random
+from statistics import NormalDist
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+DEFAULT_TABLE_SIZE = 1024
+DEFAULT_KERNEL_BINS = 512
+
+
+def _rng(*candidates):
+    # 最初に指定された乱数生成器．どれもなければモジュールの random を使う
+    for rng in candidates:
+        if rng is not None:
+            return rng
+    return random
+
+
+class Constant:
+
+    def __init__(self, value):
+        self.value = value
+        self.mean = value
+        self.variance = 0
+        self.integral = isinstance(value, int)
+
+    def __repr__(self):
+        return f'{type(self).__name__}({self.value!r})'
+
+    def sampler(self, rng=None):
+        value = self.value
+        return lambda: value
+
+    def block_sampler(self, stream):
+        return self.sampler()
+
+
+class UniformInt:
+    """``[low, high]`` の一様分布 (``random.randint``)"""
+
+    integral = True
+
+    def __init__(self, low, high, rng=None):
+        self.low = low
+        self.high = high
+        self.mean = (low + high) / 2
+        self.variance = ((high - low + 1)**2 - 1) / 12
+        self.rng = rng
+
+    def __repr__(self):
+        return f'{type(self).__name__}({self.low!r}, {self.high!r})'
+
+    def sampler(self, rng=None):
+        randint = _rng(rng, self.rng).randint
+        low, high = self.low, self.high
+        return lambda: randint(low, high)
+
+    def block_sampler(self, stream):
+        return stream.integers(self.low, self.high)
+
+
+class Exponential:
+    """平均 ``scale`` の指数分布"""
+
+    integral = False
+
+    def __init__(self, scale, rng=None):
+        self.scale = scale
+        self.mean = scale
+        self.variance = scale * scale
+        self.rng = rng
+
+    def __repr__(self):
+        return f'{type(self).__name__}({self.scale!r})'
+
+    def sampler(self, rng=None):
+        # random.expovariate() と同じ式を展開して関数呼び出しを 1 段省く
+        uniform = _rng(rng, self.rng).random
+        log = math.log
+        lambd = 1 / self.scale
+        return lambda: -log(1.0 - uniform()) / lambd
+
+    def block_sampler(self, stream):
+        return stream.exponential(self.scale)
+
+
+class FloorExponential(Exponential):
+    """``int(random.expovariate(1 / scale))`` (ページ 05 の 3 節)"""
+
+    integral = True
+
+    def __init__(self, scale, rng=None):
+        super().__init__(scale, rng)
+        # floor(X) は成功確率 1 - e^(-1/scale) の幾何分布 (0 始まり) なので，
+        # 平均は 1 / (e^(1/scale) - 1)，分散は e^(1/scale) / (e^(1/scale) - 1)^2
+        growth = math.expm1(1 / scale)
+        self.mean = 1 / growth
+        self.variance = (growth + 1) / (growth * growth)
+
+    def sampler(self, rng=None):
+        uniform = _rng(rng, self.rng).random
+        log = math.log
+        lambd = 1 / self.scale
+        return lambda: int(-log(1.0 - uniform()) / lambd)
+
+    def block_sampler(self, stream):
+        return stream.floor_exponential(self.scale)
+
+
+class InverseCDFTable:
+    """分位点関数を等間隔の表にした分布
+
+    ``quantiles[i]`` は累積確率 ``i / (len(quantiles) - 1)`` の分位点です．
+    1 回の抽出は一様乱数 1 個と表の参照 1 回，線形補間だけなので，元の
+    データの件数によらず一定の時間で済みます．``integral=True`` なら
+    ``int()`` で切り捨てた値を返します．
+    """
+
+    def __init__(self, quantiles, rng=None, integral=False):
+        if len(quantiles) < 2:
+            raise ValueError('at least two quantiles are required')
+        self.quantiles = [float(q) for q in quantiles]
+        self.rng = rng
+        self.integral = integral
+        self.params = {}
+        # 区間ごとの平均 (台形) の和
+        pairs = zip(self.quantiles, self.quantiles[1:])
+        self.mean = sum(a + b for a, b in pairs) / (2 * len(self) - 2)
+        # 区間内は一様なので，区間ごとの 2 次モーメントは (a² + ab + b²) / 3
+        pairs = zip(self.quantiles, self.quantiles[1:])
+        second = sum(a * a + a * b + b * b
+                     for a, b in pairs) / (3 * len(self) - 3)
+        self.variance = max(second - self.mean * self.mean, 0.0)
+
+    def __repr__(self):
+        return f'{type(self).__name__}(<{len(self)} quantiles>)'
+
+    def __len__(self):
+        return len(self.quantiles)
+
+    def ppf(self, u):
+        """累積確率 ``u`` の分位点 (表の線形補間)"""
+        position = u * (len(self.quantiles) - 1)
+        i = min(int(position), len(self.quantiles) - 2)
+        low = self.quantiles[i]
+        return low + (position - i) * (self.quantiles[i + 1] - low)
+
+    def sampler(self, rng=None):
+        return self._sampler(_rng(rng, self.rng).random)
+
+    def block_sampler(self, stream):
+        return self._sampler(stream.random())
+
+    def _sampler(self, uniform):
+        table = self.quantiles
+        # 隣との差を前計算して補間の引き算を省く
+        steps = [b - a for a, b in zip(table, table[1:])]
+        scale = len(steps)
+        if self.integral:
+
+            def draw():
+                position = uniform() * scale
+                i = int(position)
+                return int(table[i] + (position - i) * steps[i])
+        else:
+
+            def draw():
+                position = uniform() * scale
+                i = int(position)
+                return table[i] + (position - i) * steps[i]
+
+        return draw
+
+    def draw_many(self, size, rng=None):
+        """``size`` 個をまとめて引いてリストで返す
+
+        一様乱数を ``size`` 個まとめて作り，表の参照と補間を NumPy の配列演算
+        で一度に済ませます (NumPy がなければ 1 つのループで同じ計算をします)．
+        同じ乱数生成器から ``sampler()`` で 1 個ずつ引いた列と一致します．
+        """
+        uniform = _rng(rng, self.rng).random
+        uniforms = [uniform() for _ in range(size)]
+        scale = len(self.quantiles) - 1
+        if np is None:
+            table = self.quantiles
+            steps = [b - a for a, b in zip(table, table[1:])]
+            values = []
+            for u in uniforms:
+                position = u * scale
+                i = int(position)
+                values.append(table[i] + (position - i) * steps[i])
+            if self.integral:
+                return [int(value) for value in values]
+            return values
+        table = np.array(self.quantiles)
+        steps = np.diff(table)
+        positions = np.array(uniforms) * scale
+        index = positions.astype(np.int64)
+        values = table[index] + (positions - index) * steps[index]
+        if self.integral:
+            values = values.astype(np.int64)
+        return values.tolist()
+
+
+def _quantile_grid(table_size, tail=None):
+    # 両端の確率 0, 1 は裾が無限大になりうるので tail だけ内側で打ち切る
+    if tail is None:
+        tail = 0.5 / table_size
+    return [min(max(i / table_size, tail), 1 - tail)
+            for i in range(table_size + 1)]
+
+
+def empirical(samples, table_size=DEFAULT_TABLE_SIZE, rng=None,
+              integral=False):
+    """観測値の経験分布 (順序統計量の線形補間) を表にする"""
+    data = sorted(samples)
+    if not data:
+        raise ValueError('samples must not be empty')
+    last = len(data) - 1
+    quantiles = []
+    for i in range(table_size + 1):
+        position = i * last / table_size
+        j = min(int(position), max(last - 1, 0))
+        if last == 0:
+            quantiles.append(data[0])
+        else:
+            quantiles.append(data[j] + (position - j) *
+                             (data[j + 1] - data[j]))
+    return InverseCDFTable(quantiles, rng, integral)
+
+
+def kernel(samples,
+           bandwidth=None,
+           table_size=DEFAULT_TABLE_SIZE,
+           lower=0.0,
+           bins=DEFAULT_KERNEL_BINS,
+           rng=None,
+           integral=False):
+    """ガウスカーネルで平滑化した経験分布を表にする
+
+    データは ``bins`` 個のビンにまとめてから平滑化するので，構築の計算量も
+    データの件数にほぼよりません．``bandwidth`` を省略するとシルバーマンの
+    目安を使います．所要時間は負にならないので ``lower`` 未満は切り詰めます．
+    """
+    data = list(samples)
+    if len(data) < 2:
+        raise ValueError('at least two samples are required')
+    count = len(data)
+    mean = sum(data) / count
+    stdev = math.sqrt(sum((x - mean)**2 for x in data) / (count - 1))
+    low, high = min(data), max(data)
+    if bandwidth is None:
+        iqr = _sorted_quantile(sorted(data), 0.75) - _sorted_quantile(
+            sorted(data), 0.25)
+        spread = min(stdev, iqr / 1.34) if iqr > 0 else stdev
+        bandwidth = 0.9 * spread * count**-0.2 or 1.0
+
+    # ビンごとの重み
+    width = (high - low) / bins or 1.0
+    weights = [0] * bins
+    for x in data:
+        weights[min(int((x - low) / width), bins - 1)] += 1
+    centers = [(low + (i + 0.5) * width, w / count)
+               for i, w in enumerate(weights) if w]
+
+    # 格子上で CDF を計算し，それを逆に引いて分位点の表を作る
+    start = low - 4 * bandwidth
+    stop = high + 4 * bandwidth
+    grid_size = 4 * table_size
+    grid = [start + (stop - start) * i / grid_size
+            for i in range(grid_size + 1)]
+    scale = bandwidth * math.sqrt(2)
+    cdf = [
+        sum(w * (1 + math.erf((x - c) / scale))
+            for c, w in centers) / 2 for x in grid
+    ]
+    quantiles = []
+    j = 0
+    for u in _quantile_grid(table_size):
+        while j < grid_size - 1 and cdf[j + 1] < u:
+            j += 1
+        span = cdf[j + 1] - cdf[j]
+        fraction = (u - cdf[j]) / span if span > 0 else 0.0
+        x = grid[j] + min(max(fraction, 0.0), 1.0) * (grid[j + 1] - grid[j])
+        quantiles.append(max(x, lower))
+    return InverseCDFTable(quantiles, rng, integral)
+
+
+def _sorted_quantile(data, p):
+    position = p * (len(data) - 1)
+    i = int(position)
+    if i + 1 >= len(data):
+        return data[-1]
+    return data[i] + (position - i) * (data[i + 1] - data[i])
+
+
+def fit_exponential(samples, table_size=DEFAULT_TABLE_SIZE, rng=None,
+                    integral=False):
+    """指数分布を最尤推定 (平均) で当てはめて表にする"""
+    data = list(samples)
+    if not data:
+        raise ValueError('samples must not be empty')
+    scale = sum(data) / len(data)
+    quantiles = [-scale * math.log1p(-u) for u in _quantile_grid(table_size)]
+    table = InverseCDFTable(quantiles, rng, integral)
+    table.params = {'scale': scale}
+    return table
+
+
+def fit_lognormal(samples, table_size=DEFAULT_TABLE_SIZE, rng=None,
+                  integral=False):
+    """対数正規分布を最尤推定で当てはめて表にする (正の値だけを使う)"""
+    logs = [math.log(x) for x in samples if x > 0]
+    if len(logs) < 2:
+        raise ValueError('at least two positive samples are required')
+    normal = NormalDist.from_samples(logs)
+    quantiles = [
+        math.exp(normal.inv_cdf(u)) for u in _quantile_grid(table_size)
+    ]
+    table = InverseCDFTable(quantiles, rng, integral)
+    table.params = {'mu': normal.mean, 'sigma': normal.stdev}
+    return table
+
+
+def fit_weibull(samples, table_size=DEFAULT_TABLE_SIZE, rng=None,
+                integral=False, iterations=50):
+    """ワイブル分布を最尤推定 (形状母数はニュートン法) で当てはめて表にする"""
+    data = [x for x in samples if x > 0]
+    if len(data) < 2:
+        raise ValueError('at least two positive samples are required')
+    logs = [math.log(x) for x in data]
+    mean_log = sum(logs) / len(logs)
+    shape = 1.0
+    for _ in range(iterations):
+        powers = [x**shape for x in data]
+        s0 = sum(powers)
+        s1 = sum(p * l for p, l in zip(powers, logs))
+        s2 = sum(p * l * l for p, l in zip(powers, logs))
+        f = s1 / s0 - 1 / shape - mean_log
+        df = (s2 * s0 - s1 * s1) / (s0 * s0) + 1 / shape**2
+        step = f / df
+        shape = max(shape - step, shape / 2)
+        if abs(step) < 1e-10:
+            break
+    scale = (sum(x**shape for x in data) / len(data))**(1 / shape)
+    quantiles = [
+        scale * (-math.log1p(-u))**(1 / shape)
+        for u in _quantile_grid(table_size)
+    ]
+    table = InverseCDFTable(quantiles, rng, integral)
+    table.params = {'shape': shape, 'scale': scale}
+    return table
+
+
+class DurationTable:
+    """行動コードから所要時間を引く ``compute_duration`` の実装
+
+    ``distributions`` は行動コードから分布オブジェクトへの辞書です．
+    ``rng`` を渡すと全ての分布をその乱数生成器で引きます．
+    ``draws[code]`` は行動 ``code`` の所要時間を引く引数なしの関数です．
+    ``streams`` (``sushi.rng.Streams``) を渡すと，``block_sampler()`` を
+    持つ分布は行動ごとの乱数列 ``streams.stream('duration', code)`` から
+    ブロック単位で引きます．
+    """
+
+    def __init__(self, distributions, rng=None, streams=None):
+        self.distributions = dict(distributions)
+        size = max(self.distributions) + 1
+        self.draws = [_missing(code) for code in range(size)]
+        for code, distribution in self.distributions.items():
+            if streams is not None and hasattr(distribution,
+                                               'block_sampler'):
+                self.draws[code] = distribution.block_sampler(
+                    streams.stream('duration', int(code)))
+            else:
+                self.draws[code] = distribution.sampler(rng)
+
+    def __repr__(self):
+        return f'{type(self).__name__}({self.distributions!r})'
+
+    def __call__(self, action):
+        return self.draws[action]()
+
+    @property
+    def integral(self):
+        """全ての所要時間が整数かどうか"""
+        return all(distribution.integral
+                   for distribution in self.distributions.values())
+
+
+def _missing(code):
+
+    def draw():
+        raise KeyError(f'no duration for action {code}')
+
+    return draw
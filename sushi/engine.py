@@ -0,0 +1,296 @@
+"""heapq による単一スレッドの離散事象シミュレーションエンジン．
+
+ページ 05 の ``queue.PriorityQueue`` を使ったループを，ロックを取らない
+``heapq`` に置き換えたものです．プロセスはこれまで通りジェネレータで，
+``(time, customer_id, action)`` を ``yield`` し，エンジンから次の時刻を
+``send()`` で受け取ります．
+
+ヒープには ``(time, customer_id, seq, action)`` を積みます．``seq`` は
+単調増加の通し番号なので，時刻と顧客IDが等しくても ``action`` 同士が
+比較されることはありません．
+
+``on(action, hook)`` で行動ごとのフックを登録できます．フックは
+``hook(sim, time, customer_id, action)`` の形で呼ばれ，``False`` を返すと
+そのプロセスは再開されずに保留されます．保留したプロセスは
+``resume()`` で再開します．席数などの資源はこの仕組みで実装します．
+
+``sink`` を渡すと，処理したイベントを ``sink.record(time, customer_id,
+action)`` で記録します (``sushi.sinks``)．
+
+イベントキューは ``scheduler`` で差し替えられます (``sushi.scheduler``)．
+省略すると ``HeapScheduler`` を使います．
+
+``schedule()`` はイベントのハンドル (``seq``) を返し，``cancel()`` で
+取り消せます．取り消しは ``seq`` を集合に入れるだけの O(1) で，
+イベントキューから取り出したときに読み飛ばします．取り消したイベントが
+キューの半分を超えたら，まとめて取り除きます．
+
+``compute_duration`` が行動コードごとの抽出関数のリスト ``draws`` を持つ
+(``sushi.durations.DurationTable``) ときは，ループはそれを
+``draws[action]()`` と直接引き，``compute_duration`` の呼び出しを 1 段
+省きます．それ以外の関数は行動ごとの ``functools.partial`` にして
+同じ形で呼びます．
+
+``profiler`` (``sushi.profiling.Profiler``) を渡すと，``run()`` は計測付きの
+別のループを回します．渡さなければループは変わりません．
+"""
+import functools
+import heapq
+import itertools
+
+from .scheduler import HeapScheduler
+
+PROCESS_REGISTRY = {}
+
+# 取り消したイベントがこの数を超え，かつキューの半分を超えたら掃除する
+COMPACT_THRESHOLD = 1024
+
+
+def register_process(name):
+    """ジェネレータ関数を ``Simulation.spawn`` から使える名前で登録する"""
+
+    def decorator(func):
+        PROCESS_REGISTRY[name] = func
+        return func
+
+    return decorator
+
+
+class _Draws(dict):
+    # compute_duration(action) を draws[action]() の形で呼ぶための辞書
+
+    def __init__(self, compute_duration):
+        super().__init__()
+        self.compute_duration = compute_duration
+
+    def __missing__(self, action):
+        draw = self[action] = functools.partial(self.compute_duration, action)
+        return draw
+
+
+def duration_draws(compute_duration):
+    """``draws[action]()`` で ``compute_duration(action)`` を引ける対応表"""
+    draws = getattr(compute_duration, 'draws', None)
+    if draws is None:
+        draws = _Draws(compute_duration)
+    return draws
+
+
+class Simulation:
+    """ジェネレータプロセスを駆動するイベントループ
+
+    ``compute_duration(action)`` は直前の行動から次の行動までの時間を返す
+    関数です．``run()`` の戻り値は終了時点で取り残された顧客の人数です．
+    """
+
+    def __init__(self,
+                 compute_duration,
+                 end_time=None,
+                 sink=None,
+                 scheduler=None,
+                 profiler=None):
+        self.compute_duration = compute_duration
+        self.end_time = end_time
+        self.sink = sink
+        self.profiler = profiler
+        self.now = 0
+        self.events = 0
+        self.processes = {}
+        self.hooks = {}
+        if scheduler is None:
+            scheduler = HeapScheduler()
+        self.scheduler = scheduler
+        self._counter = itertools.count()
+        self._cancelled = set()
+        # 取り消しの数がこれを超えたら，掃除するかどうかを調べる
+        self._compact_at = COMPACT_THRESHOLD
+
+    def __len__(self):
+        return len(self.scheduler) - len(self._cancelled)
+
+    def spawn(self, name, customer_id, *args, **kwargs):
+        """登録済みのプロセスを生成してシミュレーションに加える"""
+        process = PROCESS_REGISTRY[name](customer_id, *args, **kwargs)
+        self.add(customer_id, process)
+        return process
+
+    def add(self, customer_id, process):
+        """プロセスを予備動作 (``next()``) させ，最初のイベントを登録する"""
+        self.processes[customer_id] = process
+        self.schedule(*next(process))
+
+    def on(self, action, hook):
+        """``action`` のイベントを処理する直前に呼ばれるフックを登録する"""
+        self.hooks[action] = hook
+
+    def schedule(self, time, customer_id, action):
+        """イベントを登録し，``cancel()`` に渡せるハンドルを返す"""
+        seq = next(self._counter)
+        self.scheduler.push((time, customer_id, seq, action))
+        return seq
+
+    def cancel(self, handle):
+        """まだ処理されていないイベントを取り消す
+
+        処理済みのイベントのハンドルを渡してはいけません．
+        """
+        cancelled = self._cancelled
+        cancelled.add(handle)
+        if len(cancelled) > self._compact_at:
+            self._compact()
+
+    def _compact(self):
+        # 取り消したイベントがキューの半分を超えていればまとめて取り除く．
+        # 超えていなければ，次はその時点のキューの半分まで調べない
+        cancelled = self._cancelled
+        size = len(self.scheduler)
+        if 2 * len(cancelled) > size:
+            self.scheduler.compact(cancelled)
+            cancelled.clear()
+            self._compact_at = COMPACT_THRESHOLD
+        else:
+            self._compact_at = max(COMPACT_THRESHOLD, size // 2)
+
+    def stop(self, customer_id):
+        """保留中のプロセスを終わらせる (並ばずに帰った顧客など)"""
+        self.processes.pop(customer_id).close()
+
+    def _skip_cancelled(self):
+        # 先頭の取り消し済みのイベントを捨てる
+        scheduler = self.scheduler
+        cancelled = self._cancelled
+        entry = scheduler.peek()
+        while entry is not None and entry[2] in cancelled:
+            scheduler.pop()
+            cancelled.discard(entry[2])
+            entry = scheduler.peek()
+        return entry
+
+    def peek(self):
+        """次に処理されるイベントを ``(time, customer_id, action)`` で返す"""
+        entry = self._skip_cancelled()
+        if entry is None:
+            return None
+        time, customer_id, _, action = entry
+        return time, customer_id, action
+
+    def step(self):
+        """イベントを 1 つ処理し，そのイベントを返す"""
+        if self._skip_cancelled() is None:
+            return None
+        time, customer_id, _, action = self.scheduler.pop()
+        self.now = time
+        self.events += 1
+        if self.sink is not None:
+            self.sink.record(time, customer_id, action)
+        hook = self.hooks.get(action)
+        if hook is None or hook(self, time, customer_id, action):
+            self.resume(customer_id, time, action)
+        return time, customer_id, action
+
+    def resume(self, customer_id, time, action):
+        """時刻 ``time`` に ``action`` を終えたものとしてプロセスを進める"""
+        next_time = time + self.compute_duration(action)
+        try:
+            event = self.processes[customer_id].send(next_time)
+        except StopIteration:
+            del self.processes[customer_id]
+        else:
+            self.schedule(*event)
+
+    def run(self, until=None):
+        """``until`` (省略時は ``end_time``) より前のイベントを処理する
+
+        ``until`` 以降のイベントは処理されずに残るので，``run()`` を
+        繰り返し呼び出して少しずつ時間を進めることもできます．
+        """
+        if until is None:
+            until = self.end_time
+        if until is None:
+            until = float('inf')
+
+        if self.profiler is not None:
+            now, events = self.profiler.run(self, until)
+        elif isinstance(self.scheduler, HeapScheduler):
+            now, events = self._run_heap(until)
+        else:
+            now, events = self._run_scheduler(until)
+        self.now = now
+        self.events += events
+        if self.sink is not None:
+            self.sink.flush()
+        return len(self.processes)
+
+    def _run_heap(self, until):
+        # ホットループではグローバル・属性の参照を避ける．二分ヒープは
+        # メソッド呼び出しを挟まずにリストを直接操作する
+        heap = self.scheduler.heap
+        heappush = heapq.heappush
+        heappop = heapq.heappop
+        counter = self._counter
+        cancelled = self._cancelled
+        processes = self.processes
+        draws = duration_draws(self.compute_duration)
+        hooks = self.hooks
+        record = self.sink.record if self.sink is not None else None
+        now = self.now
+        events = 0
+        while heap and heap[0][0] < until:
+            entry = heappop(heap)
+            if cancelled and entry[2] in cancelled:
+                cancelled.discard(entry[2])
+                continue
+            now, customer_id, _, action = entry
+            events += 1
+            if record is not None:
+                record(now, customer_id, action)
+            if hooks:
+                hook = hooks.get(action)
+                if hook is not None and not hook(self, now, customer_id,
+                                                 action):
+                    continue
+            try:
+                time, customer_id, action = processes[customer_id].send(
+                    now + draws[action]())
+            except StopIteration:
+                del processes[customer_id]
+            else:
+                heappush(heap, (time, customer_id, next(counter), action))
+        return now, events
+
+    def _run_scheduler(self, until):
+        # _run_heap() と同じループを，スケジューラのメソッドで回す
+        pop_before = self.scheduler.pop_before
+        push = self.scheduler.push
+        counter = self._counter
+        cancelled = self._cancelled
+        processes = self.processes
+        draws = duration_draws(self.compute_duration)
+        hooks = self.hooks
+        record = self.sink.record if self.sink is not None else None
+        now = self.now
+        events = 0
+        while True:
+            entry = pop_before(until)
+            if entry is None:
+                break
+            if cancelled and entry[2] in cancelled:
+                cancelled.discard(entry[2])
+                continue
+            now, customer_id, _, action = entry
+            events += 1
+            if record is not None:
+                record(now, customer_id, action)
+            if hooks:
+                hook = hooks.get(action)
+                if hook is not None and not hook(self, now, customer_id,
+                                                 action):
+                    continue
+            try:
+                time, customer_id, action = processes[customer_id].send(
+                    now + draws[action]())
+            except StopIteration:
+                del processes[customer_id]
+            else:
+                push((time, customer_id, next(counter), action))
+        return now, events
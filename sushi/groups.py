@@ -0,0 +1,228 @@
+"""複数人の顧客 (グループ) を 1 つのプロセスとして扱うモデル．
+
+``party_process`` はグループ 1 組につき 1 つのジェネレータで，メンバーごとの
+状態 (注文する皿数，食べた皿数，満腹度，退店時刻，次の行動と時刻) は
+``Party`` の ``array`` に持ちます．ジェネレータは常に最も早いメンバーの
+行動を 1 つだけ ``yield`` するので，ヒープ上のイベントとジェネレータの数は
+人数ではなくグループ数に比例します．
+
+グループは全員そろって到着し，席に着いた時刻から (待たされたときは
+案内された時刻から) メンバーごとに最初の注文までの時間を引きます．
+全員が食べ終えた時刻にそろって退店します．
+``お店に到着`` と ``退店`` はグループで 1 回ずつなので，``KPICollector`` や
+``Seats`` はグループを 1 単位として数えます．1 人ごとの統計は
+``PeopleStats`` で集計します．
+"""
+import math
+from array import array
+
+from .actions import Action
+from .durations import Constant, DurationTable
+from .engine import register_process
+from .model import SushiModel
+from .seating import Floor, FloorSeating
+from .stats import Welford
+
+DEFAULT_GROUP_SIZES = (1, 2, 3, 4)
+DEFAULT_SATIETY_PER_PLATE = 0.1
+
+
+class Party:
+    """グループとメンバーごとの状態"""
+
+    __slots__ = ('party_id', 'arrival', 'plates', 'eaten', 'satiety',
+                 'exit_time', 'next_time', 'next_action', 'current')
+
+    def __init__(self, party_id, plates, arrival=0):
+        size = len(plates)
+        self.party_id = party_id
+        self.arrival = arrival
+        self.plates = array('l', plates)
+        self.eaten = array('l', [0] * size)
+        self.satiety = array('d', [0.0] * size)
+        self.exit_time = array('d', [math.nan] * size)
+        self.next_time = array('d', [arrival] * size)
+        self.next_action = array('B', [
+            Action.ORDER if count > 1 else Action.LAST_ORDER
+            for count in plates
+        ])
+        self.current = 0
+
+    def __repr__(self):
+        return (f'{type(self).__name__}(party_id={self.party_id}, '
+                f'size={len(self)})')
+
+    def __len__(self):
+        return len(self.plates)
+
+
+@register_process('party')
+def party_process(party,
+                  first_order,
+                  satiety_per_plate=DEFAULT_SATIETY_PER_PLATE,
+                  on_leave=None):
+    """グループ 1 組分のプロセス
+
+    エンジンの ``Action.ARRIVE`` の所要時間は 0 とし，エンジンから
+    受け取る時刻を席に着いた時刻として扱います．最初の注文までの時間は
+    メンバーごとに ``first_order()`` で引くので，席が空くのを待たされた
+    グループも，その時刻より前のイベントを ``yield`` することはありません．
+    ``on_leave(party)`` は退店の直前に呼ばれます．
+    """
+    party_id = party.party_id
+    size = len(party)
+    next_time = party.next_time
+    next_action = party.next_action
+    plates, eaten = party.plates, party.eaten
+    satiety, exit_time = party.satiety, party.exit_time
+
+    seated = yield (party.arrival, party_id, Action.ARRIVE)
+    for member in range(size):
+        next_time[member] = seated + first_order()
+
+    pending = size
+    earliest = next_time.__getitem__
+    members = range(size)
+    while pending:
+        member = min(members, key=earliest)
+        party.current = member
+        action = next_action[member]
+        time = yield (next_time[member], party_id, Action(action))
+        eaten[member] += 1
+        satiety[member] += satiety_per_plate
+        if action == Action.LAST_ORDER:
+            exit_time[member] = time
+            next_time[member] = math.inf
+            pending -= 1
+        else:
+            if plates[member] - eaten[member] <= 1:
+                next_action[member] = Action.LAST_ORDER
+            next_time[member] = time
+
+    if on_leave is not None:
+        on_leave(party)
+    yield (max(exit_time), party_id, Action.LEAVE)
+
+
+class PeopleStats:
+    """退店したグループのメンバー 1 人ごとの統計"""
+
+    def __init__(self):
+        self.people = 0
+        self.parties = 0
+        self.party_size = Welford()
+        self.time_in_store = Welford()
+        self.plates = Welford()
+        self.satiety = Welford()
+
+    def __repr__(self):
+        return (f'{type(self).__name__}(parties={self.parties}, '
+                f'people={self.people})')
+
+    def observe(self, party):
+        self.parties += 1
+        self.people += len(party)
+        self.party_size.push(len(party))
+        leave = max(party.exit_time)
+        for member in range(len(party)):
+            self.time_in_store.push(leave - party.arrival)
+            self.plates.push(party.eaten[member])
+            self.satiety.push(party.satiety[member])
+
+    def merge(self, other):
+        self.people += other.people
+        self.parties += other.parties
+        self.party_size.merge(other.party_size)
+        self.time_in_store.merge(other.time_in_store)
+        self.plates.merge(other.plates)
+        self.satiety.merge(other.satiety)
+        return self
+
+
+class GroupModel(SushiModel):
+    """来店単位をグループにした ``SushiModel``
+
+    グループの人数は ``group_sizes`` から ``size_weights`` の重みで選び，
+    メンバーごとの皿数はページ 05 と同じく 1 から 10 の一様分布です．
+
+    ``floor`` (``sushi.seating.Floor``) を指定すると，``seats`` の代わりに
+    ``policy`` で選んだカウンター席かボックス席にグループを案内します．
+    ``party_sizes`` は店にいるグループの人数で，退店 (``LEAVE``)・
+    並ばずに帰る (``BALK``)・待ちきれずに帰る (``RENEGE``) ときに消すので，
+    来店したグループの数では増えません．
+    """
+
+    def __init__(self,
+                 group_sizes=DEFAULT_GROUP_SIZES,
+                 size_weights=None,
+                 satiety_per_plate=DEFAULT_SATIETY_PER_PLATE,
+                 floor=None,
+                 policy='best_fit',
+                 **params):
+        super().__init__(**params)
+        self.floor = floor
+        self.policy = policy
+        self.party_sizes = {}
+        self._chained = {}
+        self.group_sizes = tuple(group_sizes)
+        self.size_weights = size_weights
+        self.satiety_per_plate = satiety_per_plate
+        self.people = PeopleStats()
+        # 到着の所要時間はエンジンでは 0 にし，party_process がメンバーごとに
+        # 元の分布から引く
+        self.first_order = self.compute_duration.draws[Action.ARRIVE]
+        distributions = dict(self.compute_duration.distributions)
+        distributions[Action.ARRIVE] = Constant(0)
+        self.compute_duration = DurationTable(distributions,
+                                              rng=self.rng,
+                                              streams=self.streams)
+
+    def party(self, party_id, start_time):
+        rng = self.rng
+        size = rng.choices(self.group_sizes, self.size_weights)[0]
+        plates = [rng.randint(1, 10) for _ in range(size)]
+        self.party_sizes[party_id] = size
+        return Party(party_id, plates, start_time)
+
+    def party_process(self, party):
+        return party_process(party, self.first_order,
+                             self.satiety_per_plate, self.people.observe)
+
+    def customers(self):
+        randint = self.rng.randint
+        interval = self.customer_interval
+        return {
+            i: self.party_process(
+                self.party(i, interval * i + randint(1, interval)))
+            for i in range(self.number_of_customers)
+        }
+
+    def arriving_customer(self, customer_id, time):
+        return self.party_process(self.party(customer_id, time))
+
+    def simulation(self, sink=None, stats=None):
+        self.party_sizes = {}
+        sim = super().simulation(sink, stats)
+        if self.floor is not None:
+            floor = Floor(self.floor.counters, self.floor.boxes)
+            self.seating = FloorSeating(floor,
+                                        self.policy,
+                                        size_of=self.party_sizes.__getitem__,
+                                        stats=stats,
+                                        patience=self.patience_sampler(),
+                                        balk_at=self.balk_at).attach(sim)
+        self._chained = {}
+        for action in (Action.LEAVE, Action.BALK, Action.RENEGE):
+            self._chained[action] = sim.hooks.get(action)
+            sim.on(action, self._forget)
+        return sim
+
+    def _forget(self, sim, time, party_id, action):
+        # 席の解放では並んでいる他のグループの人数を引くので，先につないだ
+        # フックを呼んでからプロセスの終わるグループの人数を消す
+        chained = self._chained.get(action)
+        proceed = (chained is None
+                   or chained(sim, time, party_id, action))
+        self.party_sizes.pop(party_id, None)
+        return proceed
+
@@ -0,0 +1,339 @@
+"""POS の注文ログ (CSV) を読み込み，モデルの較正に使う列キャッシュを作る．
+
+CSV は 1 行 1 レコードで，既定では次の列を持つものとします
+(列名は ``PosSchema`` で変えられます)．
+
+-   ``customer_id``: 顧客 (伝票) を区別する値
+-   ``time``: 分単位の数値，または ISO 8601 形式の日時 (``parse_time``)
+-   ``kind``: ``arrival`` / ``order`` / ``exit`` (省略時は全て ``order``)
+-   ``item``: 注文した商品名 (``order`` の行のみ)
+
+ファイルは ``chunk_size`` 行ずつ読み，顧客ごとに到着・最初の注文・
+最後の注文・退店の時刻と注文間隔を求めて ``sushi.columnar`` 形式で
+保存します．行はファイル全体で時刻順に並んでいるものとします．
+
+``exit`` の行がない顧客 (``kind`` の列がないときは全員) は，最後の行から
+``idle_gap`` 分以上経ったところで最後の注文の時刻に退店したものとして
+書き出します．集計中に持つのはその間に来店した顧客だけなので，何か月分の
+ログでもメモリは増えません．``idle_gap=None`` ならファイルの最後まで
+持ち続けます．
+
+キャッシュのキーは元のファイルのパス・大きさ・更新時刻とスキーマなので，
+同じファイルで較正をやり直すときは CSV を読まずに ``mmap`` で開くだけです．
+"""
+import csv
+import hashlib
+import json
+import math
+import os
+import shutil
+import tempfile
+from array import array
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import NamedTuple
+
+from .actions import Action
+from .arrivals import PiecewiseIntensity
+from .columnar import ColumnWriter, open_columns
+from .durations import empirical
+
+CACHE_VERSION = 3
+DEFAULT_CHUNK_SIZE = 1 << 16
+# 最後の行からこの時間 (分) 行がなければ退店したものとする
+DEFAULT_IDLE_GAP = 4 * 60
+DEFAULT_CACHE_DIR = os.path.join('.cache', 'sushi')
+
+CUSTOMER_COLUMNS = {
+    'arrival': 'd',
+    'ordering': 'd',
+    'eating': 'd',
+    'stay': 'd',
+    'orders': 'q',
+}
+# 日時を分単位の数値にするときの原点 (現地時刻)
+EPOCH = datetime(1970, 1, 1)
+
+
+class PosSchema(NamedTuple):
+    customer: str = 'customer_id'
+    time: str = 'time'
+    kind: str = 'kind'
+    item: str = 'item'
+
+
+def parse_time(value):
+    """分単位の数値か ISO 8601 の日時を，分単位の数値にする
+
+    日時は書かれている現地時刻のまま ``EPOCH`` からの分数にします．
+    実行するホストのタイムゾーンにはよらず，``time % (24 * 60)`` が
+    その日の 0 時からの分数 (``hour * 60 + minute + second / 60``) に
+    なります (UTC オフセットは無視するので，夏時間の切り替えをまたぐ
+    間隔はオフセットの差だけずれます)．
+    """
+    try:
+        return float(value)
+    except ValueError:
+        moment = datetime.fromisoformat(value).replace(tzinfo=None)
+        return (moment - EPOCH) / timedelta(minutes=1)
+
+
+class _Customer:
+    __slots__ = ('arrival', 'first_order', 'last_order', 'exit', 'orders',
+                 'last_seen')
+
+    def __init__(self):
+        self.arrival = None
+        self.first_order = None
+        self.last_order = None
+        self.exit = None
+        self.orders = 0
+        self.last_seen = None
+
+
+class _Builder:
+    # 顧客ごとの集計と，列へのバッファリング
+
+    def __init__(self, directory, idle_gap=DEFAULT_IDLE_GAP):
+        self.idle_gap = idle_gap
+        self.customers = ColumnWriter(os.path.join(directory, 'customers'),
+                                      CUSTOMER_COLUMNS)
+        self.intervals = ColumnWriter(os.path.join(directory, 'intervals'),
+                                      {'interval': 'd'})
+        # 最後の行の時刻の順 (古いものが先頭)
+        self.open = OrderedDict()
+        self.items = {}
+        self.demand = []
+        self._customer_buffer = {
+            name: array(typecode)
+            for name, typecode in CUSTOMER_COLUMNS.items()
+        }
+        self._interval_buffer = array('d')
+
+    def _touch(self, key, time):
+        # 顧客を末尾 (最も新しい) に移す
+        customer = self.open.get(key)
+        if customer is None:
+            customer = self.open[key] = _Customer()
+        else:
+            self.open.move_to_end(key)
+        customer.last_seen = time
+        return customer
+
+    def arrival(self, key, time):
+        self._touch(key, time).arrival = time
+
+    def order(self, key, time, item):
+        customer = self._touch(key, time)
+        if customer.last_order is not None:
+            self._interval_buffer.append(time - customer.last_order)
+        if customer.first_order is None:
+            customer.first_order = time
+        customer.last_order = time
+        customer.orders += 1
+        if item:
+            code = self.items.get(item)
+            if code is None:
+                code = self.items[item] = len(self.demand)
+                self.demand.append(0)
+            self.demand[code] += 1
+
+    def exit(self, key, time):
+        customer = self.open.pop(key, None)
+        if customer is not None:
+            customer.exit = time
+            self._finish(customer)
+
+    def expire(self, now):
+        """最後の行から ``idle_gap`` 以上経った顧客を書き出す"""
+        if self.idle_gap is None:
+            return
+        limit = now - self.idle_gap
+        open_customers = self.open
+        while open_customers:
+            key = next(iter(open_customers))
+            if open_customers[key].last_seen >= limit:
+                break
+            self._finish(open_customers.pop(key))
+
+    def _finish(self, customer):
+        if customer.first_order is None:
+            return
+        arrival = customer.arrival
+        if arrival is None:
+            arrival = customer.first_order
+        exit_time = customer.exit
+        if exit_time is None:
+            exit_time = customer.last_order
+        buffer = self._customer_buffer
+        buffer['arrival'].append(arrival)
+        buffer['ordering'].append(customer.first_order - arrival)
+        buffer['eating'].append(exit_time - customer.last_order)
+        buffer['stay'].append(exit_time - arrival)
+        buffer['orders'].append(customer.orders)
+
+    def flush(self):
+        if self._customer_buffer['arrival']:
+            self.customers.append(self._customer_buffer)
+            self._customer_buffer = {
+                name: array(typecode)
+                for name, typecode in CUSTOMER_COLUMNS.items()
+            }
+        if self._interval_buffer:
+            self.intervals.append({'interval': self._interval_buffer})
+            self._interval_buffer = array('d')
+
+    def close(self, meta):
+        for customer in self.open.values():
+            self._finish(customer)
+        self.open = OrderedDict()
+        self.flush()
+        self.customers.meta.update(meta)
+        self.customers.meta['items'] = list(self.items)
+        self.customers.meta['demand'] = self.demand
+        self.customers.close()
+        self.intervals.close()
+
+
+def ingest(path,
+           directory,
+           schema=PosSchema(),
+           chunk_size=DEFAULT_CHUNK_SIZE,
+           idle_gap=DEFAULT_IDLE_GAP):
+    """CSV を ``chunk_size`` 行ずつ読み，列キャッシュを ``directory`` に作る"""
+    builder = _Builder(directory, idle_gap)
+    rows = 0
+    latest = -math.inf
+    with open(path, newline='', encoding='utf-8') as file:
+        reader = csv.reader(file)
+        header = next(reader)
+        columns = {name: i for i, name in enumerate(header)}
+        customer_column = columns[schema.customer]
+        time_column = columns[schema.time]
+        kind_column = columns.get(schema.kind)
+        item_column = columns.get(schema.item)
+        while True:
+            chunk = [row for _, row in zip(range(chunk_size), reader)]
+            if not chunk:
+                break
+            for row in chunk:
+                key = row[customer_column]
+                time = parse_time(row[time_column])
+                if time > latest:
+                    latest = time
+                kind = 'order' if kind_column is None else row[kind_column]
+                if kind == 'order':
+                    item = '' if item_column is None else row[item_column]
+                    builder.order(key, time, item)
+                elif kind == 'arrival':
+                    builder.arrival(key, time)
+                elif kind == 'exit':
+                    builder.exit(key, time)
+                else:
+                    raise ValueError(f'unknown kind {kind!r} in {path}')
+            rows += len(chunk)
+            builder.expire(latest)
+            builder.flush()
+    builder.close({'source': os.path.abspath(path), 'rows': rows})
+
+
+def cache_key(path, schema=PosSchema(), idle_gap=DEFAULT_IDLE_GAP):
+    stat = os.stat(path)
+    source = {
+        'version': CACHE_VERSION,
+        'path': os.path.abspath(path),
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'schema': schema._asdict(),
+        'idle_gap': idle_gap,
+    }
+    encoded = json.dumps(source, sort_keys=True).encode()
+    return hashlib.sha256(encoded).hexdigest()[:32]
+
+
+class Calibration:
+    """列キャッシュを ``mmap`` で開いたもの
+
+    ``customers`` の列 (到着時刻，来店から最初の注文まで，最後の注文から
+    退店まで，滞在時間，注文数) と ``intervals`` (注文間隔) は，いずれも
+    ファイルを直接指す ``memoryview`` です．
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.customers = open_columns(os.path.join(directory, 'customers'))
+        self.intervals = open_columns(os.path.join(directory, 'intervals'))
+        self.items = self.customers.meta['items']
+        self.demand = self.customers.meta['demand']
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return len(self.customers)
+
+    def close(self):
+        self.customers.close()
+        self.intervals.close()
+
+    def durations(self, build=empirical, **kwargs):
+        """``SushiModel(durations=...)`` に渡せる行動ごとの分布
+
+        ``build`` は ``sushi.durations`` の ``empirical`` や ``fit_weibull``
+        など，観測値の列から分布を作る関数です．
+        """
+        return {
+            Action.ARRIVE: build(self.customers['ordering'], **kwargs),
+            Action.ORDER: build(self.intervals['interval'], **kwargs),
+            Action.LAST_ORDER: build(self.customers['eating'], **kwargs),
+        }
+
+    def menu(self, **kwargs):
+        """商品ごとの注文数を重みとした ``Menu``"""
+        from .menu import Menu
+        return Menu(self.items, self.demand, **kwargs)
+
+    def arrival_intensity(self, bin_width=60, period=24 * 60):
+        """一日の中の時間帯ごとの平均来店強度 (``PiecewiseIntensity``)
+
+        時刻の ``period`` による剰余で時間帯に分けます．日時の列なら
+        ``parse_time`` により現地時刻の 0 時から，数値の列ならその値の
+        0 から数えた時間帯です．
+        """
+        arrivals = self.customers['arrival']
+        bins = int(period // bin_width)
+        counts = [0] * bins
+        first = last = None
+        for time in arrivals:
+            counts[int(time % period // bin_width)] += 1
+            first = time if first is None else min(first, time)
+            last = time if last is None else max(last, time)
+        days = max(1, math.ceil((last - first) / period)) if arrivals else 1
+        return PiecewiseIntensity([i * bin_width for i in range(bins)],
+                                  [count / (days * bin_width)
+                                   for count in counts],
+                                  period=period)
+
+
+def load(path,
+         cache_dir=DEFAULT_CACHE_DIR,
+         schema=PosSchema(),
+         chunk_size=DEFAULT_CHUNK_SIZE,
+         idle_gap=DEFAULT_IDLE_GAP):
+    """``path`` の較正データを開く．キャッシュがなければ作る"""
+    directory = os.path.join(cache_dir, cache_key(path, schema, idle_gap))
+    if not os.path.isdir(directory):
+        os.makedirs(cache_dir, exist_ok=True)
+        # 途中で止まっても壊れたキャッシュが残らないよう，一時ディレクトリに
+        # 作ってから置き換える
+        staging = tempfile.mkdtemp(dir=cache_dir)
+        try:
+            ingest(path, staging, schema, chunk_size, idle_gap)
+            os.replace(staging, directory)
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+    return Calibration(directory)
@@ -0,0 +1,175 @@
+"""商品メニューと，注文ごとの商品の選択．
+
+商品は注文確率 (重み) に比例して選ばれます．Walker/Vose のエイリアス法を
+使うので，1 回の選択はメニューの大きさによらず O(1) です．
+
+重みや価格は一日の中で変わることがあるので，商品を ``block_size`` 個ずつの
+ブロックに分け，ブロックごとのエイリアス表と，ブロックを選ぶ上位の
+エイリアス表の 2 段にしています．1 商品を更新しても作り直すのはその
+ブロックと上位の表だけです．
+"""
+import random
+from array import array
+
+from .actions import Action
+
+DEFAULT_BLOCK_SIZE = 32
+
+
+class AliasTable:
+    """Vose のエイリアス法による離散分布"""
+
+    __slots__ = ('probability', 'alias', 'total')
+
+    def __init__(self, weights):
+        count = len(weights)
+        total = sum(weights)
+        if count == 0 or total <= 0:
+            raise ValueError('weights must contain a positive value')
+        if any(weight < 0 for weight in weights):
+            raise ValueError('weights must be non-negative')
+        scaled = [weight * count / total for weight in weights]
+        self.probability = [1.0] * count
+        self.alias = list(range(count))
+        self.total = total
+        small = [i for i, p in enumerate(scaled) if p < 1]
+        large = [i for i, p in enumerate(scaled) if p >= 1]
+        while small and large:
+            less = small.pop()
+            more = large.pop()
+            self.probability[less] = scaled[less]
+            self.alias[less] = more
+            scaled[more] += scaled[less] - 1
+            (small if scaled[more] < 1 else large).append(more)
+        # 残りは丸め誤差を除けば確率 1
+
+    def __len__(self):
+        return len(self.probability)
+
+    def sample(self, uniform):
+        """``[0, 1)`` の一様乱数 1 個からインデックスを選ぶ"""
+        position = uniform * len(self.probability)
+        i = int(position)
+        if position - i < self.probability[i]:
+            return i
+        return self.alias[i]
+
+
+class Menu:
+    """商品の一覧と，ブロック分けしたエイリアス表
+
+    ``demand[i]`` は商品 ``i`` が注文された回数，``revenue`` は売上です．
+    """
+
+    def __init__(self, names, weights, prices=None, rng=None,
+                 block_size=DEFAULT_BLOCK_SIZE):
+        if len(names) != len(weights):
+            raise ValueError('names and weights must have the same length')
+        self.names = list(names)
+        self.weights = [float(weight) for weight in weights]
+        self.prices = list(prices) if prices is not None else [0] * len(names)
+        self.index = {name: i for i, name in enumerate(self.names)}
+        self.rng = rng if rng is not None else random.Random()
+        self.block_size = block_size
+        self.demand = array('q', [0] * len(names))
+        self.revenue = 0
+        self._chained = {}
+        self._blocks = [
+            self._build_block(start)
+            for start in range(0, len(names), block_size)
+        ]
+        self._build_top()
+
+    @classmethod
+    def from_probabilities(cls, probabilities, prices=None, **kwargs):
+        """``{商品名: 注文確率}`` から作る．``prices`` も商品名の辞書"""
+        names = list(probabilities)
+        prices = [prices[name] for name in names] if prices else None
+        return cls(names, [probabilities[name] for name in names], prices,
+                   **kwargs)
+
+    def __len__(self):
+        return len(self.names)
+
+    def _build_block(self, start):
+        weights = self.weights[start:start + self.block_size]
+        if sum(weights) <= 0:
+            return None
+        return AliasTable(weights)
+
+    def _build_top(self):
+        totals = [block.total if block is not None else 0.0
+                  for block in self._blocks]
+        self._top = AliasTable(totals)
+
+    def update(self, item, weight=None, price=None):
+        """商品 ``item`` (名前かインデックス) の重みや価格を変える"""
+        i = self.index[item] if isinstance(item, str) else item
+        if price is not None:
+            self.prices[i] = price
+        if weight is not None:
+            self.weights[i] = float(weight)
+            block = i // self.block_size
+            self._blocks[block] = self._build_block(block * self.block_size)
+            self._build_top()
+
+    def pick(self):
+        """商品を 1 つ選び，注文数と売上を数えてインデックスを返す"""
+        # AliasTable.sample() を 2 段分インライン展開したもの
+        uniform = self.rng.random
+        top = self._top
+        position = uniform() * len(top.probability)
+        block = int(position)
+        if position - block >= top.probability[block]:
+            block = top.alias[block]
+        table = self._blocks[block]
+        position = uniform() * len(table.probability)
+        i = int(position)
+        if position - i >= table.probability[i]:
+            i = table.alias[i]
+        i += block * self.block_size
+        self.demand[i] += 1
+        self.revenue += self.prices[i]
+        return i
+
+    def reset(self):
+        self.demand = array('q', [0] * len(self.names))
+        self.revenue = 0
+
+    def cache_key(self):
+        """結果を決める設定だけの辞書 (注文数などの状態は含めない)"""
+        return {
+            'names': self.names,
+            'weights': self.weights,
+            'prices': self.prices,
+            'block_size': self.block_size,
+        }
+
+    def attach(self, sim, actions=(Action.ORDER, Action.LAST_ORDER)):
+        """注文数と売上を 0 に戻し，``actions`` のイベントごとに商品を 1 つ選ぶ
+
+        ``attach()`` の前に同じ行動に登録されていたフックは，商品を選んだ
+        後に呼ばれ，その戻り値がそのままフックの戻り値になります．
+        """
+        self.reset()
+        for action in actions:
+            chained = sim.hooks.get(action)
+            # 同じシミュレーションに 2 度つないでも自分自身は呼ばない
+            if chained != self._order:
+                self._chained[action] = chained
+            sim.on(action, self._order)
+        return self
+
+    def _order(self, sim, time, customer_id, action):
+        self.pick()
+        chained = self._chained.get(action)
+        if chained is None:
+            return True
+        return chained(sim, time, customer_id, action)
+
+    def top_items(self, count=10):
+        """注文数の多い商品を ``(名前, 注文数)`` で返す"""
+        ranked = sorted(range(len(self.names)),
+                        key=self.demand.__getitem__,
+                        reverse=True)
+        return [(self.names[i], self.demand[i]) for i in ranked[:count]]
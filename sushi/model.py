@@ -0,0 +1,180 @@
+"""ページ 05 の 3 節「より現実に即したシミュレーション」のモデル．"""
+import functools
+import math
+import random
+
+from .actions import Action
+from .arrivals import ArrivalSource, inversion_arrivals, thinning_arrivals
+from .durations import Constant, DurationTable, FloorExponential
+from .engine import Simulation, register_process
+from .resource import Seats
+
+DEFAULT_NUMBER_OF_CUSTOMERS = 10
+DEFAULT_CUSTOMER_INTERVAL = 3
+EATING_DURATION = 5
+ORDERING_DURATION = 3
+DEFAULT_END_TIME = 300
+
+
+@register_process('customer')
+def customer_process(customer_id, plates, start_time=0):
+    time = yield (start_time, customer_id, Action.ARRIVE)
+    # 列挙型の属性の参照は遅いので，ループの外で一度だけ引く
+    order = Action.ORDER
+    for _ in range(plates - 1):
+        time = yield (time, customer_id, order)
+    time = yield (time, customer_id, Action.LAST_ORDER)
+    yield (time, customer_id, Action.LEAVE)
+
+
+class SushiModel:
+    """指数分布に基づく来店・注文・喫食のモデル
+
+    ページのコードではモジュールレベルの ``random`` を使っていますが，
+    ここでは複数の乱数列を扱えるよう ``random.Random`` を持たせます．
+    ``seats`` を指定すると席数を導入し，``simulation()`` のたびに
+    ``seating`` に新しい ``Seats`` を用意します．
+
+    ``intensity`` (来店強度 λ(t)) を指定すると，``number_of_customers`` と
+    ``customer_interval`` の代わりに非定常ポアソン過程で来店させます．
+    累積強度を持つ強度 (``PiecewiseIntensity``) は逆関数法，それ以外は
+    間引き法で来店時刻を生成します．
+
+    ``compute_duration`` は行動コードで引く ``DurationTable`` です．
+    ``durations`` (行動コードから分布への辞書) で行動ごとの分布を
+    実データから作ったもの (``sushi.durations.empirical`` など) に
+    差し替えられます．分布はモデルの乱数生成器で引かれます．
+
+    ``menu`` (``sushi.menu.Menu``) を指定すると，注文のたびにモデルの
+    乱数生成器で商品を選び，商品ごとの注文数を数えます．
+
+    ``patience`` (平均の我慢できる時間) を指定すると，席が空くのを待つ
+    顧客はその時間で行列を離れます．``balk_at`` を指定すると，行列が
+    その長さ以上のときに到着した顧客は並ばずに帰ります．
+
+    ``conveyor`` (``sushi.conveyor.Conveyor``) を指定すると，注文した顧客は
+    レーンを流れてくる皿を取るまで待ちます．``menu`` と併せて使うと，
+    商品は皿を取った時点で選ばれます．
+
+    ``streams`` (``sushi.rng.Streams``) を指定すると，所要時間・皿数・
+    来店時刻・我慢できる時間を用途ごとの乱数列からブロック単位で引きます．
+    ``rng`` は商品の選択とレーンにだけ使われます．
+    """
+
+    def __init__(self,
+                 number_of_customers=DEFAULT_NUMBER_OF_CUSTOMERS,
+                 customer_interval=DEFAULT_CUSTOMER_INTERVAL,
+                 eating_duration=EATING_DURATION,
+                 ordering_duration=ORDERING_DURATION,
+                 end_time=DEFAULT_END_TIME,
+                 seats=None,
+                 patience=None,
+                 balk_at=None,
+                 intensity=None,
+                 durations=None,
+                 menu=None,
+                 conveyor=None,
+                 streams=None,
+                 seed=None,
+                 rng=None):
+        self.number_of_customers = number_of_customers
+        self.customer_interval = customer_interval
+        self.eating_duration = eating_duration
+        self.ordering_duration = ordering_duration
+        self.end_time = end_time
+        self.seats = seats
+        self.patience = patience
+        self.balk_at = balk_at
+        self.seating = None
+        self.intensity = intensity
+        self.arrivals = None
+        self.menu = menu
+        self.conveyor = conveyor
+        self.rng = rng if rng is not None else random.Random(seed)
+        self.streams = streams
+        distributions = self.duration_distributions()
+        distributions.update(durations or {})
+        self.compute_duration = DurationTable(distributions,
+                                              rng=self.rng,
+                                              streams=streams)
+        if streams is None:
+            self.draw_plates = functools.partial(self.rng.randint, 1, 10)
+        else:
+            self.draw_plates = streams.stream('plates').integers(1, 10)
+
+    def duration_distributions(self):
+        rng = self.rng
+        return {
+            Action.ARRIVE:
+            FloorExponential(self.ordering_duration, rng),
+            Action.ORDER:
+            FloorExponential(self.eating_duration + self.ordering_duration,
+                             rng),
+            Action.LAST_ORDER:
+            FloorExponential(self.eating_duration, rng),
+            Action.LEAVE:
+            Constant(1),
+        }
+
+    def patience_sampler(self):
+        if self.patience is None:
+            return None
+        distribution = FloorExponential(self.patience)
+        if self.streams is not None:
+            return distribution.block_sampler(
+                self.streams.stream('patience'))
+        return distribution.sampler(self.rng)
+
+    def customers(self):
+        draw_plates = self.draw_plates
+        interval = self.customer_interval
+        if self.streams is None:
+            offset = functools.partial(self.rng.randint, 1, interval)
+        else:
+            offset = self.streams.stream('arrivals').integers(1, interval)
+        return {
+            i: customer_process(i,
+                                draw_plates(),
+                                start_time=interval * i + offset())
+            for i in range(self.number_of_customers)
+        }
+
+    def arrival_times(self):
+        intensity = self.intensity
+        end = self.end_time if self.end_time is not None else math.inf
+        rng = self.rng
+        if self.streams is not None:
+            rng = self.streams.random('arrivals')
+        if hasattr(intensity, 'cumulative_at'):
+            return inversion_arrivals(intensity, 0, end, rng)
+        return thinning_arrivals(intensity, 0, end, rng)
+
+    def arriving_customer(self, customer_id, time):
+        return customer_process(customer_id,
+                                self.draw_plates(),
+                                start_time=time)
+
+    def simulation(self, sink=None, stats=None):
+        """シミュレーションを組み立てる
+
+        ``stats`` (``KPICollector``) は席の待ち時間の通知先です．
+        """
+        sim = Simulation(self.compute_duration,
+                         end_time=self.end_time,
+                         sink=sink)
+        if self.seats is not None:
+            self.seating = Seats(self.seats, stats, self.patience_sampler(),
+                                 self.balk_at).attach(sim)
+        if self.menu is not None:
+            self.menu.rng = self.rng
+            self.menu.attach(sim)
+        if self.conveyor is not None:
+            self.conveyor.rng = self.rng
+            self.conveyor.attach(sim)
+        if self.intensity is not None:
+            self.arrivals = ArrivalSource(self.arrival_times(),
+                                          self.arriving_customer).attach(sim)
+            return sim
+        for customer_id, process in self.customers().items():
+            sim.add(customer_id, process)
+        return sim
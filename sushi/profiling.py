@@ -0,0 +1,260 @@
+"""``Simulation`` のプロファイリングモード．
+
+``Simulation(profiler=Profiler())`` (または ``sim.profiler = Profiler()``)
+とすると，``run()`` は通常のループの代わりに ``Profiler.run()`` の
+計測付きのループを回します．``profiler`` が ``None`` のときの追加の
+コストは ``run()`` 1 回につき属性の比較 1 回だけです．
+
+計測するのは次のものです．
+
+-   行動ごとのイベント数と，イベント 1 件の処理時間の内訳 (シンクへの記録，
+    フック，``compute_duration``，ジェネレータの ``send()``，イベントキューへの
+    push)．イベントキューからの pop は行動が分かる前なので全体で数えます
+-   ``sample_every`` 件ごとのイベントキューの長さ，シミュレーション時刻，
+    経過時間 (実時間)，確保済みのメモリブロック数
+    (``sys.getallocatedblocks()``)，GC の回数
+-   ``trace_every`` 件ごとに 1 件のイベントの処理の内訳
+
+``table()`` は要約の表を返し，``write_trace(path)`` は Chrome の
+トレース形式 (``chrome://tracing`` や Perfetto で開ける JSON) で書き出します．
+"""
+import gc
+import json
+import sys
+import time
+
+from .actions import label
+from .engine import duration_draws
+
+DEFAULT_SAMPLE_EVERY = 1000
+DEFAULT_TRACE_EVERY = 10000
+
+# 行動ごとの計測値の並び
+PHASES = ('sink', 'hook', 'duration', 'send', 'push')
+
+
+def _collections():
+    return sum(generation['collections'] for generation in gc.get_stats())
+
+
+class Profiler:
+    """計測付きのイベントループと，その計測結果"""
+
+    def __init__(self,
+                 sample_every=DEFAULT_SAMPLE_EVERY,
+                 trace_every=DEFAULT_TRACE_EVERY):
+        self.sample_every = sample_every
+        self.trace_every = trace_every
+        self.events = 0
+        self.counts = {}
+        # 行動ごとの PHASES の累積時間 (秒)
+        self.phases = {}
+        self.pop_time = 0.0
+        self.wall_time = 0.0
+        self.cancelled = 0
+        # (実時間, シミュレーション時刻, イベント数, キューの長さ,
+        #  メモリブロック数, GC の回数)
+        self.samples = []
+        # (行動, 顧客ID, シミュレーション時刻, 開始時刻, PHASES の所要時間)
+        self.spans = []
+        self._origin = None
+        self._blocks = 0
+        self._collections = 0
+
+    def __repr__(self):
+        return (f'{type(self).__name__}(events={self.events}, '
+                f'samples={len(self.samples)})')
+
+    def _sample(self, sim, clock, now):
+        self.samples.append(
+            (clock() - self._origin, now, self.events, len(sim),
+             sys.getallocatedblocks() - self._blocks,
+             _collections() - self._collections))
+
+    def run(self, sim, until):
+        """``Simulation._run_scheduler()`` と同じ処理を計測しながら行う"""
+        clock = time.perf_counter
+        if self._origin is None:
+            self._origin = clock()
+            self._blocks = sys.getallocatedblocks()
+            self._collections = _collections()
+        pop_before = sim.scheduler.pop_before
+        push = sim.scheduler.push
+        counter = sim._counter
+        cancelled = sim._cancelled
+        processes = sim.processes
+        draws = duration_draws(sim.compute_duration)
+        hooks = sim.hooks
+        record = sim.sink.record if sim.sink is not None else None
+        counts = self.counts
+        phases = self.phases
+        sample_every = self.sample_every
+        trace_every = self.trace_every
+        now = sim.now
+        events = 0
+        start = clock()
+        while True:
+            t0 = clock()
+            entry = pop_before(until)
+            t1 = clock()
+            self.pop_time += t1 - t0
+            if entry is None:
+                break
+            if cancelled and entry[2] in cancelled:
+                cancelled.discard(entry[2])
+                self.cancelled += 1
+                continue
+            now, customer_id, _, action = entry
+            events += 1
+            self.events += 1
+            if record is not None:
+                record(now, customer_id, action)
+            t2 = clock()
+            resumed = True
+            t3 = t4 = t5 = t2
+            if hooks:
+                hook = hooks.get(action)
+                resumed = hook is None or hook(sim, now, customer_id, action)
+                t3 = t4 = t5 = clock()
+            if resumed:
+                next_time = now + draws[action]()
+                t4 = clock()
+                try:
+                    event_time, next_id, next_action = processes[
+                        customer_id].send(next_time)
+                except StopIteration:
+                    del processes[customer_id]
+                    t5 = clock()
+                else:
+                    t5 = clock()
+                    push((event_time, next_id, next(counter), next_action))
+            t6 = clock()
+            durations = (t2 - t1, t3 - t2, t4 - t3, t5 - t4, t6 - t5)
+            totals = phases.get(action)
+            if totals is None:
+                totals = phases[action] = [0.0] * len(PHASES)
+                counts[action] = 0
+            counts[action] += 1
+            for i, duration in enumerate(durations):
+                totals[i] += duration
+            if trace_every and self.events % trace_every == 0:
+                self.spans.append((action, customer_id, now,
+                                   t1 - self._origin, durations))
+            if self.events % sample_every == 0:
+                self._sample(sim, clock, now)
+        self.wall_time += clock() - start
+        self._sample(sim, clock, now)
+        return now, events
+
+    @property
+    def rate(self):
+        """実時間 1 秒あたりのイベント数"""
+        if not self.wall_time:
+            return 0.0
+        return self.events / self.wall_time
+
+    def summary(self):
+        """行動ごとの件数と PHASES ごとの累積時間の辞書"""
+        return {
+            label(action): dict(zip(PHASES, totals),
+                                events=self.counts[action])
+            for action, totals in self.phases.items()
+        }
+
+    def table(self):
+        lines = [
+            f'{"action":<16}{"events":>10}{"total ms":>10}{"us/event":>10}' +
+            ''.join(f'{phase:>9}' for phase in PHASES)
+        ]
+        for action, totals in sorted(self.phases.items(),
+                                     key=lambda item: -sum(item[1])):
+            count = self.counts[action]
+            total = sum(totals)
+            shares = ''.join(f'{value / total if total else 0:>9.1%}'
+                             for value in totals)
+            lines.append(f'{label(action):<16}{count:>10,}'
+                         f'{total * 1e3:>10.1f}{total / count * 1e6:>10.2f}' +
+                         shares)
+        depths = [sample[3] for sample in self.samples]
+        lines += [
+            '',
+            f'events              {self.events:,}',
+            f'wall time           {self.wall_time:.3f} s',
+            f'events/s            {self.rate:,.0f}',
+            f'scheduler pop       {self.pop_time * 1e3:.1f} ms',
+            f'cancelled skipped   {self.cancelled:,}',
+        ]
+        if depths:
+            last = self.samples[-1]
+            lines += [
+                f'queue depth         mean {sum(depths) / len(depths):,.1f}, '
+                f'max {max(depths):,}',
+                f'net alloc. blocks   {last[4]:+,}',
+                f'gc collections      {last[5]:,}',
+            ]
+        return '\n'.join(lines)
+
+    def trace_events(self):
+        """Chrome のトレース形式のイベントのリスト (時刻はマイクロ秒)"""
+        events = [{
+            'name': 'process_name',
+            'ph': 'M',
+            'pid': 0,
+            'args': {
+                'name': 'sushi'
+            },
+        }]
+        for action, customer_id, now, start, durations in self.spans:
+            begin = start * 1e6
+            total = sum(durations) * 1e6
+            events.append({
+                'name': label(action),
+                'cat': 'event',
+                'ph': 'X',
+                'pid': 0,
+                'tid': 0,
+                'ts': begin,
+                'dur': total,
+                'args': {
+                    'time': now,
+                    'customer_id': customer_id
+                },
+            })
+            for phase, duration in zip(PHASES, durations):
+                if duration > 0:
+                    events.append({
+                        'name': phase,
+                        'cat': 'phase',
+                        'ph': 'X',
+                        'pid': 0,
+                        'tid': 0,
+                        'ts': begin,
+                        'dur': duration * 1e6,
+                    })
+                    begin += duration * 1e6
+        previous = (0.0, 0)
+        for wall, now, events_so_far, depth, blocks, _ in self.samples:
+            ts = wall * 1e6
+            elapsed = wall - previous[0]
+            rate = (events_so_far - previous[1]) / elapsed if elapsed else 0
+            previous = (wall, events_so_far)
+            for name, value in (('queue depth', depth),
+                                ('allocated blocks', blocks),
+                                ('events/s', rate), ('simulation time', now)):
+                events.append({
+                    'name': name,
+                    'ph': 'C',
+                    'pid': 0,
+                    'ts': ts,
+                    'args': {
+                        name: value
+                    },
+                })
+        return events
+
+    def write_trace(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'traceEvents': self.trace_events(),
+                'displayTimeUnit': 'ms'
+            }, f)
@@ -0,0 +1,233 @@
+"""席数などの容量を持つ資源．
+
+``Seats`` は ``Simulation.on()`` のフックとして働きます．満席のときに
+到着した顧客は待ち行列 (FIFO) に並び，席が空いた時点で先頭の顧客が
+``Simulation.resume()`` で再開されます．再開はヒープへの push 1 回
+(O(log n)) なので，空席をポーリングする必要はありません．
+
+``patience`` を指定すると，並んだ顧客は我慢できる時間が過ぎたところで
+帰ります (``Action.RENEGE``)．我慢の限界は ``Seats`` の中のヒープに入れ，
+シミュレーションには並んでいる顧客のうち限界が最も早い 1 人分の
+``Action.RENEGE`` だけを積みます．席に着いた顧客の限界はヒープから消さずに，
+先頭に来たときに読み飛ばします (``sushi.conveyor`` の皿の廃棄と同じ考え方)．
+イベントを ``Simulation.cancel()`` で取り消すのは，その 1 人が席に着いた
+ときと，より早い限界の顧客が並んだときだけです．帰った顧客の項目も行列から
+探して消さずに，先頭に来たときに読み飛ばします．``balk_at`` を指定すると，
+待ち行列がその長さ以上のときに到着した顧客は並ばずに帰ります
+(``Action.BALK``)．
+
+待ち時間は ``stats`` (``sushi.stats.KPICollector``) だけに集計します．
+観測値は保持せず，平均と分散・最大値・ヒストグラムだけを逐次更新するので，
+何人来店してもメモリは増えません．
+"""
+import heapq
+from array import array
+from collections import deque
+
+from .actions import Action
+from .engine import COMPACT_THRESHOLD
+from .stats import KPICollector
+
+# ホットパスで列挙型の属性を引かないための別名
+BALK = Action.BALK
+RENEGE = Action.RENEGE
+
+
+class Seats:
+    """``capacity`` 席の資源と待ち行列
+
+    待ち時間は ``stats`` (``KPICollector``) に ``stats.observe_wait(wait)``
+    で集計します．省略すると，幅 ``wait_bin_width`` のヒストグラムを持ち
+    P² の分位点を持たない ``KPICollector`` を用意します．待ち行列の長さごとの
+    滞在時間は ``queue_time`` (インデックスが行列の長さ) に記録されます．
+
+    ``patience`` は並んだ顧客ごとに我慢できる時間を返す引数なしの関数
+    (``FloorExponential(10).sampler(rng)`` など) です．
+    """
+
+    def __init__(self,
+                 capacity,
+                 stats=None,
+                 patience=None,
+                 balk_at=None,
+                 wait_bin_width=1.0):
+        self.capacity = capacity
+        if stats is None:
+            stats = KPICollector(quantiles=(), wait_bin_width=wait_bin_width)
+        self.stats = stats
+        self.patience = patience
+        self.balk_at = balk_at
+        self.in_use = 0
+        self.waiting = deque()
+        self.queue_time = array('d', [0.0])
+        self.balked = 0
+        self.reneged = 0
+        # 並んでいる顧客の項目．waiting には帰った顧客の項目も残る
+        self._queued = {}
+        # (我慢の限界, 項目) のヒープと，積んである RENEGE の
+        # (我慢の限界, 顧客ID, ハンドル)
+        self._deadlines = []
+        self._armed = None
+        self._last_change = 0
+
+    def __repr__(self):
+        return (f'{type(self).__name__}(capacity={self.capacity}, '
+                f'in_use={self.in_use}, waiting={len(self)})')
+
+    def __len__(self):
+        """待ち行列に並んでいる顧客の人数"""
+        return len(self._queued)
+
+    def attach(self,
+               sim,
+               request_action=Action.ARRIVE,
+               release_action=Action.LEAVE):
+        """``request_action`` で席を確保し，``release_action`` で解放する"""
+        sim.on(request_action, self.request)
+        sim.on(release_action, self.release)
+        sim.on(Action.BALK, self.leave)
+        sim.on(Action.RENEGE, self.renege)
+        return self
+
+    def _record_queue(self, time):
+        length = len(self._queued)
+        if length >= len(self.queue_time):
+            self.queue_time.extend([0.0] * (length + 1 -
+                                            len(self.queue_time)))
+        self.queue_time[length] += time - self._last_change
+        self._last_change = time
+
+    def _observe(self, wait):
+        self.stats.observe_wait(wait)
+
+    def _enqueue(self, sim, time, customer_id, action):
+        # 並ぶか，行列が長ければ帰る．並ぶときは我慢の限界を予約する
+        if self.balk_at is not None and len(self._queued) >= self.balk_at:
+            self.balked += 1
+            sim.schedule(time, customer_id, BALK)
+            return
+        self._record_queue(time)
+        entry = (customer_id, action, time)
+        self._line_up(entry)
+        self._queued[customer_id] = entry
+        patience = self.patience
+        if patience is not None:
+            deadline = time + patience()
+            heapq.heappush(self._deadlines, (deadline, entry))
+            armed = self._armed
+            if armed is None or deadline < armed[0]:
+                self._arm(sim)
+
+    def _line_up(self, entry):
+        # 待ち行列の末尾に並ばせる
+        self.waiting.append(entry)
+
+    def _arm(self, sim):
+        # 並んでいる顧客のうち我慢の限界が最も早い 1 人の RENEGE だけを積む
+        if self._armed is not None:
+            sim.cancel(self._armed[2])
+            self._armed = None
+        deadlines = self._deadlines
+        queued = self._queued
+        while deadlines:
+            deadline, entry = deadlines[0]
+            customer_id = entry[0]
+            if queued.get(customer_id) is entry:
+                handle = sim.schedule(deadline, customer_id, RENEGE)
+                self._armed = (deadline, customer_id, handle)
+                return
+            heapq.heappop(deadlines)
+
+    def _admit(self, sim, time, entry):
+        # 並んでいた顧客を席に着かせて再開する
+        customer_id, action, since = entry
+        del self._queued[customer_id]
+        armed = self._armed
+        if armed is not None and armed[1] == customer_id:
+            self._arm(sim)
+        elif (len(self._deadlines) > COMPACT_THRESHOLD
+              and len(self._deadlines) > 2 * len(self._queued)):
+            # 席に着いた顧客の限界がヒープの半分を超えたらまとめて捨てる
+            queued = self._queued
+            self._deadlines = [
+                item for item in self._deadlines
+                if queued.get(item[1][0]) is item[1]
+            ]
+            heapq.heapify(self._deadlines)
+        self.stats.observe_wait(time - since)
+        sim.resume(customer_id, time, action)
+
+    def _popleft(self):
+        # 先頭の並んでいる顧客の項目．帰った顧客の項目は捨てる
+        waiting = self.waiting
+        queued = self._queued
+        while waiting:
+            entry = waiting.popleft()
+            if queued.get(entry[0]) is entry:
+                return entry
+        return None
+
+    def request(self, sim, time, customer_id, action):
+        if self.in_use < self.capacity:
+            self.in_use += 1
+            self.stats.observe_wait(0.0)
+            return True
+        self._enqueue(sim, time, customer_id, action)
+        return False
+
+    def release(self, sim, time, customer_id, action):
+        if self._queued:
+            # 空いた席をそのまま先頭の顧客に渡す
+            self._record_queue(time)
+            self._admit(sim, time, self._popleft())
+        else:
+            self.in_use -= 1
+        return True
+
+    def renege(self, sim, time, customer_id, action):
+        """我慢の限界が来た顧客を行列から外して帰らせる"""
+        self._record_queue(time)
+        # 項目は waiting に残し，先頭に来たときに読み飛ばす
+        del self._queued[customer_id]
+        self.reneged += 1
+        self._armed = None
+        self._arm(sim)
+        return self.leave(sim, time, customer_id, action)
+
+    def leave(self, sim, time, customer_id, action):
+        sim.stop(customer_id)
+        return False
+
+    def mean_queue_length(self, until):
+        """時刻 ``until`` までの待ち行列の長さの時間平均"""
+        self._record_queue(until)
+        if not until:
+            return 0.0
+        return sum(length * duration
+                   for length, duration in enumerate(self.queue_time)) / until
+
+    @property
+    def waited(self):
+        """席が空くのを待った (待ち時間が正の) 人数"""
+        return self.stats.waited
+
+    def wait_quantiles(self, probabilities=(0.5, 0.9, 0.99)):
+        """待ち時間の分位点 (``KPICollector.quantile()``)"""
+        if not self.stats.waits.count:
+            return {p: 0.0 for p in probabilities}
+        return {p: self.stats.quantile(p) for p in probabilities}
+
+    def report(self, until):
+        stats = self.stats
+        return {
+            'served': stats.waits.count,
+            'waited': stats.waited,
+            'still_waiting': len(self),
+            'balked': self.balked,
+            'reneged': self.reneged,
+            'mean_wait': stats.waits.mean,
+            'max_wait': stats.max_wait,
+            'mean_queue_length': self.mean_queue_length(until),
+            'max_queue_length': len(self.queue_time) - 1,
+            'wait_quantiles': self.wait_quantiles(),
+        }
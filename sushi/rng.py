@@ -0,0 +1,216 @@
+"""ブロック単位で前もって生成する乱数列．
+
+``random.expovariate`` や ``random.randint`` は Python で書かれているので，
+1 個引くたびに関数呼び出しが数段重なります．``Streams`` は用途ごとの
+乱数列 (``Stream``) から一様乱数を ``block_size`` 個ずつまとめて生成し，
+指数分布などへの変換もブロック単位で済ませます．1 個の抽出はリストの
+イテレータの ``__next__`` (C の関数) を呼ぶだけです．
+
+NumPy があれば PCG64 を使い，用途ごとの乱数列は親シードの PCG64 を
+用途のキーから決まる回数だけ ``jumped()`` したものです．NumPy が
+なければ，親シードとキーから SHA-256 で導いたシードの ``random.Random``
+で同じことをします．どちらの場合も変量 1 個は一様乱数 1 個の逆関数変換
+なので，ブロックの大きさや引くタイミングによらず同じ列になります．
+
+``antithetic=True`` の ``Streams`` は，同じシードの一様乱数 ``u`` の
+代わりに ``1 - 2**-53 - u`` を使う対称変量の乱数列です．一様乱数は
+``2**-53`` の倍数なので，この変換は ``[0, 1)`` の上で厳密な 1 対 1 です．
+"""
+import functools
+import hashlib
+import itertools
+import math
+import random
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+DEFAULT_BLOCK_SIZE = 4096
+# 2**-53 刻みの一様乱数 u を 1 - 2**-53 - u に写す
+MIRROR = 1 - 2**-53
+
+
+def stream_index(*key):
+    """用途のキー (``('duration', 1)`` など) から決まる 64 ビットの整数"""
+    digest = hashlib.sha256(repr(key).encode()).digest()
+    return int.from_bytes(digest[:8], 'big')
+
+
+class MirroredRandom(random.Random):
+    """``random()`` が ``MIRROR - u`` を返す ``random.Random``
+
+    ``expovariate`` などは ``random()`` を通るので対称変量になります．
+    ``randint`` などの整数は ``getrandbits()`` から作られるので元のままです．
+    """
+
+    def random(self):
+        return MIRROR - super().random()
+
+    def _randbelow(self, n):
+        # random() を上書きしたサブクラスでは，random.Random は整数の抽出を
+        # random() から作る版に切り替えるので，ここで getrandbits() から
+        # 引き直す．n のビット数だけ引き，n 以上なら棄却する (n > 0)
+        bits = n.bit_length()
+        value = self.getrandbits(bits)
+        while value >= n:
+            value = self.getrandbits(bits)
+        return value
+
+
+class _NumpyBlocks:
+    # PCG64 を jumped() した乱数列から NumPy でブロックを作る
+
+    def __init__(self, seed, index, antithetic=False):
+        generator = np.random.Generator(np.random.PCG64(seed).jumped(index))
+        uniform = generator.random
+        if antithetic:
+            self._random = lambda size: MIRROR - uniform(size)
+        else:
+            self._random = uniform
+
+    def random(self, size):
+        return self._random(size).tolist()
+
+    def exponential(self, size, scale):
+        return (-scale * np.log1p(-self._random(size))).tolist()
+
+    def floor_exponential(self, size, scale):
+        values = np.floor(-scale * np.log1p(-self._random(size)))
+        return values.astype(np.int64).tolist()
+
+    def integers(self, size, low, high):
+        # u * n が丸めで n になることがあるので high で抑える
+        values = low + np.floor(self._random(size) * (high - low + 1))
+        return np.minimum(values, high).astype(np.int64).tolist()
+
+
+class _PythonBlocks:
+    # NumPy がないときの代わり．変換は _NumpyBlocks と同じ
+
+    def __init__(self, seed, index, antithetic=False):
+        digest = hashlib.sha256(f'{seed}:{index}'.encode()).digest()
+        factory = MirroredRandom if antithetic else random.Random
+        self._random = factory(int.from_bytes(digest, 'big')).random
+
+    def random(self, size):
+        uniform = self._random
+        return [uniform() for _ in range(size)]
+
+    def exponential(self, size, scale):
+        log1p = math.log1p
+        return [-scale * log1p(-u) for u in self.random(size)]
+
+    def floor_exponential(self, size, scale):
+        log1p = math.log1p
+        return [int(-scale * log1p(-u)) for u in self.random(size)]
+
+    def integers(self, size, low, high):
+        count = high - low + 1
+        return [min(low + int(u * count), high) for u in self.random(size)]
+
+
+BACKENDS = {'python': _PythonBlocks}
+if np is not None:
+    BACKENDS['numpy'] = _NumpyBlocks
+
+
+class Stream:
+    """1 つの用途の乱数列
+
+    ``random()`` などは引数なしの抽出関数を返します．抽出関数は
+    ブロックを使い切ったときだけ次のブロックを生成します．1 つの
+    ``Stream`` からは抽出関数を 1 つだけ作ってください (2 つ作ると
+    ブロックを交互に取り合います)．
+    """
+
+    def __init__(self, blocks, block_size=DEFAULT_BLOCK_SIZE):
+        self._blocks = blocks
+        self.block_size = block_size
+
+    def __repr__(self):
+        return (f'{type(self).__name__}({type(self._blocks).__name__}, '
+                f'block_size={self.block_size})')
+
+    def _draw(self, refill, *args):
+        refill = functools.partial(refill, self.block_size, *args)
+        # refill() は None を返さないので，ブロックを無限に連ねた列になる
+        return itertools.chain.from_iterable(iter(refill, None)).__next__
+
+    def random(self):
+        """``[0, 1)`` の一様乱数"""
+        return self._draw(self._blocks.random)
+
+    def exponential(self, scale):
+        """平均 ``scale`` の指数分布"""
+        return self._draw(self._blocks.exponential, scale)
+
+    def floor_exponential(self, scale):
+        """平均 ``scale`` の指数分布を ``int()`` で切り捨てたもの"""
+        return self._draw(self._blocks.floor_exponential, scale)
+
+    def integers(self, low, high):
+        """``[low, high]`` の一様分布の整数"""
+        return self._draw(self._blocks.integers, low, high)
+
+
+class Streams:
+    """親シードから用途ごとの乱数列を作る
+
+    ``stream(*key)`` は ``(seed, key)`` だけで決まる ``Stream`` を返すので，
+    所要時間・皿数・来店などの用途ごと，あるいは顧客ごとに独立な乱数列を
+    使えます．``spawn(*key)`` はキーの頭に ``key`` を付ける ``Streams``
+    (反復ごとの乱数列など) を返します．``random(*key)`` は ``random.Random``
+    の形が必要なコード (来店時刻の生成など) 向けの乱数生成器です．
+
+    ``backend`` は ``'numpy'`` か ``'python'`` で，省略すると NumPy が
+    あれば ``'numpy'`` を使います．
+
+    ``antithetic=True`` なら全ての乱数列が対称変量になります．
+    ``mirror()`` は同じシードで ``antithetic`` を反転した ``Streams`` です．
+    """
+
+    def __init__(self,
+                 seed=None,
+                 block_size=DEFAULT_BLOCK_SIZE,
+                 backend=None,
+                 prefix=(),
+                 antithetic=False):
+        if seed is None:
+            seed = random.getrandbits(64)
+        if backend is None:
+            backend = 'numpy' if 'numpy' in BACKENDS else 'python'
+        if backend not in BACKENDS:
+            raise ValueError(f'unknown backend: {backend!r}')
+        self.seed = seed
+        self.block_size = block_size
+        self.backend = backend
+        self.prefix = tuple(prefix)
+        self.antithetic = antithetic
+
+    def __repr__(self):
+        return (f'{type(self).__name__}(seed={self.seed!r}, '
+                f'backend={self.backend!r}, prefix={self.prefix!r}, '
+                f'antithetic={self.antithetic!r})')
+
+    def stream(self, *key):
+        index = stream_index(*self.prefix, *key)
+        return Stream(
+            BACKENDS[self.backend](self.seed, index, self.antithetic),
+            self.block_size)
+
+    def spawn(self, *key):
+        return Streams(self.seed, self.block_size, self.backend,
+                       self.prefix + key, self.antithetic)
+
+    def mirror(self):
+        return Streams(self.seed, self.block_size, self.backend, self.prefix,
+                       not self.antithetic)
+
+    def random(self, *key):
+        index = stream_index(*self.prefix, *key)
+        # 'python' の Stream と同じ列にならないよう別の文字列から導く
+        digest = hashlib.sha256(f'{self.seed}:{index}:random'.encode())
+        factory = MirroredRandom if self.antithetic else random.Random
+        return factory(int.from_bytes(digest.digest(), 'big'))
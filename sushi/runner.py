@@ -0,0 +1,306 @@
+"""プロセスプールによる反復実行．
+
+各反復は親シード ``master_seed`` と反復番号から導いた独立な乱数列を使います．
+乱数列は反復番号だけで決まるので，ワーカー数を変えても結果は変わりません．
+反復は ``block_size`` 回ずつワーカーに渡され，ブロックが終わるたびに
+それまでの集計 (平均と 95% 信頼区間) を返します．
+
+分散減少法として次のものを使えます．
+
+-   共通乱数 (``streams=True``): 反復ごとに ``sushi.rng.Streams`` を作り，
+    所要時間・皿数・来店などを用途ごとの乱数列から引きます．設定を変えても
+    同じ反復番号の顧客は同じ乱数を使うので，``compare()`` で 2 つの設定の
+    差を反復ごとに取ると，差の分散が小さくなります．
+-   対称変量 (``antithetic=True``): 同じ乱数列とその対称変量で 2 回動かし，
+    その平均を 1 反復とします．
+-   制御変量: 非定常ポアソン過程で来店させるときは来店数を ``arrivals``
+    として記録し，その期待値 Λ(end_time) を使った推定値を
+    ``ReplicationSummary.controlled()`` で返します．
+"""
+import hashlib
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from .model import DEFAULT_END_TIME, SushiModel
+from .rng import Streams
+from .stats import Covariance, KPICollector, Welford
+
+DEFAULT_MASTER_SEED = 1991
+DEFAULT_BLOCK_SIZE = 64
+
+
+def replication_seed(master_seed, index):
+    """``master_seed`` の ``index`` 番目の反復に使うシード
+
+    SHA-256 で混ぜた 256 ビットの値で ``random.Random`` (MT19937) を
+    初期化します．周期 2**19937 - 1 に対し，異なるシードから始まる
+    乱数列が実用上重なることはありません．
+    """
+    digest = hashlib.sha256(f'{master_seed}:{index}'.encode()).digest()
+    return int.from_bytes(digest, 'big')
+
+
+def replication_streams(master_seed, index, antithetic=False):
+    """``master_seed`` の ``index`` 番目の反復の用途ごとの乱数列"""
+    return Streams(replication_seed(master_seed, index),
+                   antithetic=antithetic)
+
+
+def expected_arrivals(**params):
+    """``params`` のモデルの来店数の期待値 (分からなければ ``None``)"""
+    intensity = params.get('intensity')
+    end_time = params.get('end_time', DEFAULT_END_TIME)
+    if intensity is None:
+        return params.get('number_of_customers')
+    if end_time is None or not hasattr(intensity, 'cumulative_at'):
+        return None
+    return intensity.cumulative_at(end_time)
+
+
+def run_replication(index,
+                    master_seed=DEFAULT_MASTER_SEED,
+                    collector=None,
+                    **params):
+    """1 回分のシミュレーションを行い，指標を辞書で返す
+
+    ``collector`` (``KPICollector``) を渡すと，そこにも KPI を集計します．
+    """
+    rng = random.Random(replication_seed(master_seed, index))
+    model = SushiModel(rng=rng, **params)
+    if collector is None:
+        collector = KPICollector()
+    sim = model.simulation(sink=collector, stats=collector)
+    left_behind = sim.run()
+    collector.advance(sim.now if model.end_time is None else model.end_time)
+    metrics = {
+        'left_behind': left_behind,
+        'events': sim.events,
+        'end_time': sim.now,
+        'mean_time_in_store': collector.time_in_store.mean,
+        'mean_plates': collector.plates.mean,
+    }
+    if model.seating is not None:
+        report = model.seating.report(sim.now)
+        metrics['mean_wait'] = report['mean_wait']
+        metrics['mean_queue_length'] = report['mean_queue_length']
+        metrics['balked'] = report['balked']
+        metrics['reneged'] = report['reneged']
+    if model.arrivals is not None:
+        metrics['arrivals'] = model.arrivals.arrived
+    return metrics
+
+
+def _replicate(index, master_seed, collector, params, streams, antithetic):
+    # 分散減少法を適用した 1 反復分の指標
+    if not (streams or antithetic):
+        return run_replication(index, master_seed, collector, **params)
+    metrics = run_replication(
+        index, master_seed, collector,
+        streams=replication_streams(master_seed, index), **params)
+    if not antithetic:
+        return metrics
+    mirror = run_replication(
+        index, master_seed, collector,
+        streams=replication_streams(master_seed, index, True), **params)
+    return {
+        name: (value + mirror[name]) / 2
+        for name, value in metrics.items()
+    }
+
+
+def _push(stats, controls, metrics):
+    for name, value in metrics.items():
+        stats.setdefault(name, Welford()).push(value)
+    arrivals = metrics.get('arrivals')
+    if arrivals is not None:
+        for name, value in metrics.items():
+            controls.setdefault(name, Covariance()).push(arrivals, value)
+
+
+def _run_block(start, stop, master_seed, params, streams=False,
+               antithetic=False):
+    stats = {}
+    controls = {}
+    kpis = KPICollector()
+    for index in range(start, stop):
+        collector = KPICollector()
+        _push(stats, controls,
+              _replicate(index, master_seed, collector, params, streams,
+                         antithetic))
+        kpis.merge(collector)
+    return stats, kpis, controls
+
+
+def _run_difference_block(start, stop, master_seed, baseline, variant,
+                          streams=True, antithetic=False):
+    # 同じ反復番号で 2 つの設定を動かし，指標の差 (variant - baseline) を集計する
+    stats = {}
+    controls = {}
+    for index in range(start, stop):
+        before = _replicate(index, master_seed, KPICollector(), baseline,
+                            streams, antithetic)
+        after = _replicate(index, master_seed, KPICollector(), variant,
+                           streams, antithetic)
+        _push(stats, controls, {
+            name: after[name] - before[name]
+            for name in before.keys() & after.keys() if name != 'arrivals'
+        })
+    return stats, KPICollector(), controls
+
+
+class ReplicationSummary:
+    """反復結果の集計
+
+    ``stats`` は反復ごとの指標の ``Welford``，``kpis`` は全反復の顧客を
+    通して集計した ``KPICollector`` です．``controls`` は指標ごとの
+    (来店数, 指標) の ``Covariance`` で，``expected_arrivals`` は来店数の
+    期待値です．
+    """
+
+    def __init__(self, stats=None, completed=0, total=0,
+                 expected_arrivals=None):
+        self.stats = stats if stats is not None else {}
+        self.kpis = KPICollector()
+        self.controls = {}
+        self.completed = completed
+        self.total = total
+        self.expected_arrivals = expected_arrivals
+
+    def __repr__(self):
+        return (f'{type(self).__name__}(completed={self.completed}, '
+                f'total={self.total})')
+
+    def merge(self, stats, kpis=None, controls=None):
+        for name, stat in stats.items():
+            self.stats.setdefault(name, Welford()).merge(stat)
+        if kpis is not None:
+            self.kpis.merge(kpis)
+        for name, stat in (controls or {}).items():
+            self.controls.setdefault(name, Covariance()).merge(stat)
+        return self
+
+    def mean(self, name):
+        return self.stats[name].mean
+
+    def confidence_interval(self, name, level=0.95):
+        return self.stats[name].confidence_interval(level)
+
+    def controlled(self, name, level=0.95):
+        """来店数を制御変量とした ``name`` の平均と信頼区間の半幅
+
+        来店数を記録していない (期待値が分からない) ときは，通常の平均と
+        半幅を返します．
+        """
+        control = self.controls.get(name)
+        if control is None or self.expected_arrivals is None:
+            stat = self.stats[name]
+            return stat.mean, stat.half_width(level)
+        return control.controlled(self.expected_arrivals, level)
+
+    def table(self, level=0.95):
+        lines = [f'{"metric":<16}{"mean":>14}{"± half width":>16}']
+        for name, stat in self.stats.items():
+            lines.append(f'{name:<16}{stat.mean:>14.4f}'
+                         f'{stat.half_width(level):>16.4f}')
+        return '\n'.join(lines)
+
+
+def _merge_in_order(results, total, expected):
+    summary = ReplicationSummary(total=total, expected_arrivals=expected)
+    for start in sorted(results):
+        stop, block = results[start]
+        summary.merge(*block)
+        summary.completed += stop - start
+    return summary
+
+
+def _completed_blocks(blocks, workers, function, *args):
+    if workers == 1:
+        for start, stop in blocks:
+            yield start, stop, function(start, stop, *args)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(function, start, stop, *args): (start, stop)
+            for start, stop in blocks
+        }
+        for future in as_completed(futures):
+            start, stop = futures[future]
+            yield start, stop, future.result()
+
+
+def _summaries(replications, workers, block_size, expected, function, *args):
+    if workers is None:
+        workers = os.cpu_count() or 1
+    blocks = [(start, min(start + block_size, replications))
+              for start in range(0, replications, block_size)]
+    results = {}
+    running = ReplicationSummary(total=replications,
+                                 expected_arrivals=expected)
+    for start, stop, block in _completed_blocks(blocks, workers, function,
+                                                *args):
+        results[start] = stop, block
+        if len(results) < len(blocks):
+            running.merge(*block)
+            running.completed += stop - start
+            yield running
+    yield _merge_in_order(results, replications, expected)
+
+
+def run_replications(replications,
+                     master_seed=DEFAULT_MASTER_SEED,
+                     workers=None,
+                     block_size=DEFAULT_BLOCK_SIZE,
+                     streams=False,
+                     antithetic=False,
+                     **params):
+    """``replications`` 回の反復を実行し，途中経過を順次返すジェネレータ
+
+    途中経過は到着順に結合したものですが，最後に返す集計はブロック順に
+    結合し直すので，ワーカー数によらずビット単位で同じ値になります．
+    ``params`` は ``SushiModel`` にそのまま渡されます．
+    ``antithetic=True`` では 1 反復が 2 回のシミュレーションになります．
+    """
+    return _summaries(replications, workers, block_size,
+                      expected_arrivals(**params), _run_block, master_seed,
+                      params, streams, antithetic)
+
+
+def replicate(replications,
+              master_seed=DEFAULT_MASTER_SEED,
+              workers=None,
+              block_size=DEFAULT_BLOCK_SIZE,
+              streams=False,
+              antithetic=False,
+              **params):
+    """``run_replications`` を最後まで回し，最終的な集計だけを返す"""
+    summary = None
+    for summary in run_replications(replications, master_seed, workers,
+                                    block_size, streams, antithetic,
+                                    **params):
+        pass
+    return summary
+
+
+def compare(replications,
+            baseline,
+            variant,
+            master_seed=DEFAULT_MASTER_SEED,
+            workers=None,
+            block_size=DEFAULT_BLOCK_SIZE,
+            streams=True,
+            antithetic=False):
+    """2 つの設定 (``SushiModel`` の引数の辞書) の指標の差を集計する
+
+    反復ごとに ``variant`` の指標から ``baseline`` の指標を引いた値の
+    ``ReplicationSummary`` を返します．既定では共通乱数を使うので，
+    2 つの設定を別々に ``replicate()`` するより少ない反復数で差の
+    信頼区間が狭くなります．
+    """
+    summary = None
+    for summary in _summaries(replications, workers, block_size, None,
+                              _run_difference_block, master_seed, baseline,
+                              variant, streams, antithetic):
+        pass
+    return summary
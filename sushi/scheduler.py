@@ -0,0 +1,235 @@
+"""``Simulation`` のイベントキュー．
+
+イベントは ``(time, customer_id, seq, action)`` のタプルで，どの
+スケジューラもこの順に小さいものから取り出します．スケジューラを
+差し替えてもイベントの処理順は変わりません．
+
+-   ``HeapScheduler``: ``heapq`` による二分ヒープ．push と pop は
+    O(log n) です．
+-   ``CalendarQueue``: 時刻を幅 ``width`` の日に区切り，日ごとのバケツを
+    環状に並べたカレンダーキューです．ページ 05 の 3 節のように所要時間を
+    ``int()`` で切り捨てたモデルでは，同時刻のイベントが同じバケツに
+    集まります．
+
+``Simulation`` の既定は ``HeapScheduler`` です．``CalendarQueue`` の
+push と pop が平均 O(1) になるのは，イベントが多くの日にばらけている
+ときだけです．1 日 (``width``) に多くのイベントが集まると，その日に
+積まれるイベントは整列済みのリストへの挿入 (その日のイベント数に比例)
+になり，二分ヒープより遅くなることがあります．使うときは
+``Simulation(..., scheduler=CalendarQueue(width=...))`` と明示し，
+``benchmarks/bench_scheduler.py`` で実際のモデルの規模で比べてください．
+"""
+import bisect
+import heapq
+
+DEFAULT_BUCKETS = 1024
+
+
+class HeapScheduler:
+    """``heapq`` による二分ヒープ
+
+    ``Simulation.run()`` はループを速くするため ``heap`` を直接操作します．
+    """
+
+    def __init__(self):
+        self.heap = []
+
+    def __repr__(self):
+        return f'{type(self).__name__}(events={len(self.heap)})'
+
+    def __len__(self):
+        return len(self.heap)
+
+    def push(self, entry):
+        heapq.heappush(self.heap, entry)
+
+    def peek(self):
+        return self.heap[0] if self.heap else None
+
+    def pop(self):
+        return heapq.heappop(self.heap)
+
+    def pop_before(self, until):
+        """時刻が ``until`` より前なら先頭のイベントを取り出し，なければ ``None``"""
+        heap = self.heap
+        if heap and heap[0][0] < until:
+            return heapq.heappop(heap)
+        return None
+
+    def compact(self, cancelled):
+        """``seq`` が ``cancelled`` に含まれるイベントを取り除く"""
+        # run() がリストを直接持っているので，同じリストを書き換える
+        heap = self.heap
+        heap[:] = [entry for entry in heap if entry[2] not in cancelled]
+        heapq.heapify(heap)
+
+
+class CalendarQueue:
+    """日ごとのバケツを環状に並べたカレンダーキュー
+
+    時刻 ``t`` のイベントは ``int(t / width)`` 日目のバケツ
+    (``buckets`` で割った余り) に入ります．時刻は 0 以上とします．
+    バケツへの追加は ``list.append()`` だけで，カーソルがその日に来たときに
+    一度だけ整列します．同じ日のイベントは整列済みのリストから順に
+    取り出すので，push と pop はどちらも平均 O(1) です．
+
+    カーソルから ``buckets`` 日以上先のイベント (長い我慢の限界など) は
+    別のヒープに置き，カーソルが近づいたときにバケツへ移します．
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, width=1):
+        if buckets < 4 or buckets & (buckets - 1):
+            raise ValueError('buckets must be a power of two (at least 4)')
+        self.width = width
+        self._scale = 1 / width
+        self._mask = buckets - 1
+        self._days = buckets
+        self._buckets = [[] for _ in range(buckets)]
+        self._overflow = []
+        self._size = 0
+        # カーソルの日のイベントを整列したもの (_pos より前は取り出し済み)
+        self._day = 0
+        self._today = []
+        self._pos = 0
+        self._loaded = False
+
+    def __repr__(self):
+        return (f'{type(self).__name__}(buckets={len(self._buckets)}, '
+                f'width={self.width}, events={self._size})')
+
+    def __len__(self):
+        return self._size
+
+    def push(self, entry):
+        day = int(entry[0] * self._scale)
+        self._size += 1
+        cursor = self._day
+        if day > cursor:
+            if day < cursor + self._days:
+                self._buckets[day & self._mask].append(entry)
+            else:
+                heapq.heappush(self._overflow, entry)
+        elif day == cursor:
+            if self._loaded:
+                bisect.insort(self._today, entry, self._pos)
+            else:
+                self._buckets[day & self._mask].append(entry)
+        else:
+            # カーソルより前の日: 取り出し前のイベントをバケツに戻して巻き戻す
+            rest = self._today[self._pos:]
+            if rest:
+                self._buckets[cursor & self._mask].extend(rest)
+            self._today = []
+            self._pos = 0
+            self._day = day
+            self._loaded = False
+            self._buckets[day & self._mask].append(entry)
+
+    def _current(self):
+        # イベントの残っている日までカーソルを進め，その日のリストを返す
+        if self._pos < len(self._today):
+            return self._today
+        buckets = self._buckets
+        mask = self._mask
+        scale = self._scale
+        day = self._day + 1 if self._loaded else self._day
+        overflow = self._overflow
+        if self._size == len(overflow):
+            # バケツが空なら (取り消し済みの遠い未来のイベントだけが
+            # 残っているときなど)，1 周調べずに別のヒープの先頭の日へ飛ぶ
+            day = max(day, int(overflow[0][0] * scale))
+        self._migrate(day)
+        while True:
+            for _ in range(len(buckets)):
+                bucket = buckets[day & mask]
+                if bucket:
+                    bucket.sort()
+                    if int(bucket[0][0] * scale) == day:
+                        return self._load(day, bucket)
+                day += 1
+            # 1 周しても見つからなければ，最も早いイベントの日へ飛ぶ
+            days = [
+                int(min(bucket)[0] * scale) for bucket in buckets if bucket
+            ]
+            if self._overflow:
+                days.append(int(self._overflow[0][0] * scale))
+            day = min(days)
+            self._migrate(day)
+
+    def _migrate(self, day):
+        # day から 1 周以内に入ったイベントを別のヒープからバケツへ移す
+        overflow = self._overflow
+        buckets = self._buckets
+        scale = self._scale
+        horizon = day + len(buckets)
+        while overflow and int(overflow[0][0] * scale) < horizon:
+            entry = heapq.heappop(overflow)
+            buckets[int(entry[0] * scale) & self._mask].append(entry)
+
+    def _load(self, day, bucket):
+        # 巻き戻した後は翌年以降のイベントがバケツに残っていることがある．
+        # それらは半周より先の時刻なので，そこで切り分ける
+        limit = (day + len(self._buckets) // 2) * self.width
+        split = bisect.bisect_left(bucket, (limit, ))
+        if split == len(bucket):
+            self._buckets[day & self._mask] = []
+            today = bucket
+        else:
+            today = bucket[:split]
+            del bucket[:split]
+        self._day = day
+        self._today = today
+        self._pos = 0
+        self._loaded = True
+        return today
+
+    def peek(self):
+        if not self._size:
+            return None
+        return self._current()[self._pos]
+
+    def pop(self):
+        if not self._size:
+            raise IndexError('pop from an empty calendar queue')
+        today = self._current()
+        entry = today[self._pos]
+        self._pos += 1
+        self._size -= 1
+        return entry
+
+    def pop_before(self, until):
+        """時刻が ``until`` より前なら先頭のイベントを取り出し，なければ ``None``"""
+        today = self._today
+        pos = self._pos
+        if pos == len(today):
+            if not self._size:
+                return None
+            today = self._current()
+            pos = 0
+        entry = today[pos]
+        if entry[0] >= until:
+            return None
+        self._pos = pos + 1
+        self._size -= 1
+        return entry
+
+    def compact(self, cancelled):
+        """``seq`` が ``cancelled`` に含まれるイベントを取り除く"""
+        size = 0
+        for bucket in self._buckets:
+            if bucket:
+                bucket[:] = [
+                    entry for entry in bucket if entry[2] not in cancelled
+                ]
+                size += len(bucket)
+        self._today = [
+            entry for entry in self._today[self._pos:]
+            if entry[2] not in cancelled
+        ]
+        self._pos = 0
+        self._overflow = [
+            entry for entry in self._overflow if entry[2] not in cancelled
+        ]
+        heapq.heapify(self._overflow)
+        self._size = size + len(self._today) + len(self._overflow)
+
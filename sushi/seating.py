@@ -0,0 +1,320 @@
+"""カウンター席とボックス席の配置と，グループへの席の割り当て．
+
+``Floor`` はカウンターの列ごとに空席を整数のビット列 (1 が空席) で持ち，
+ボックス席は定員ごとに空いているボックスのビット列を持ちます．
+
+-   ``size`` 人が並んで座れる最初の位置は，空席のビット列を自分自身と
+    ずらして AND を取ることで求めます．ずらす幅を倍々にするので，
+    シフトと AND は列ごとに O(log size) 回で済みます．
+-   最も短く収まる区間 (``counter_fit(best=True)``) は空席の区間を
+    1 つずつ調べるので，空席の区間の数に比例します．
+-   ボックスは定員の小さい順に空きを調べるので，定員の種類数だけで
+    最も小さく収まるボックスが見つかります．
+-   解放はビットを立てるだけなので，隣り合う空席の区間は自然に
+    つながります．
+
+席の選び方は ``policy(floor, size)`` という関数で差し替えられます
+(``POLICIES``)．``FloorSeating`` は ``Seats`` と同じくフックとして働き，
+待ち時間と待ち行列の長さも同じ形で記録します．
+"""
+import heapq
+import itertools
+from collections import deque
+from typing import NamedTuple
+
+from .resource import Seats
+
+COUNTER = 'counter'
+BOX = 'box'
+
+
+class Allocation(NamedTuple):
+    kind: str  # COUNTER か BOX
+    index: int  # カウンターの列番号，またはボックスの番号
+    start: int  # カウンターの先頭の席 (ボックスでは 0)
+    size: int  # 占有する席数
+
+
+def _lowest_bit(bits):
+    return (bits & -bits).bit_length() - 1
+
+
+def _run_starts(free, size):
+    # ビット i が立っているのは i から size 席が全て空いているとき
+    runs = free
+    width = 1
+    while width < size:
+        step = min(width, size - width)
+        runs &= runs >> step
+        width += step
+    return runs
+
+
+class Floor:
+    """カウンター席の列と，ボックス席の集まり
+
+    ``counters`` は列ごとの席数，``boxes`` はボックスごとの定員です．
+    """
+
+    def __init__(self, counters=(), boxes=()):
+        self.counters = list(counters)
+        self.boxes = list(boxes)
+        self._free_counter = [(1 << length) - 1 for length in self.counters]
+        # 定員ごとの (ボックス番号のリスト, 空きのビット列)
+        self._box_ids = {}
+        for box, capacity in enumerate(self.boxes):
+            self._box_ids.setdefault(capacity, []).append(box)
+        self._capacities = sorted(self._box_ids)
+        self._free_boxes = {
+            capacity: (1 << len(ids)) - 1
+            for capacity, ids in self._box_ids.items()
+        }
+        self._box_slot = {
+            box: (capacity, slot)
+            for capacity, ids in self._box_ids.items()
+            for slot, box in enumerate(ids)
+        }
+        self.capacity = sum(self.counters) + sum(self.boxes)
+        self.largest = max(self.counters + self.boxes, default=0)
+
+    def __repr__(self):
+        return (f'{type(self).__name__}(counters={self.counters}, '
+                f'boxes={self.boxes})')
+
+    @property
+    def free_seats(self):
+        counter = sum(bin(free).count('1') for free in self._free_counter)
+        boxes = sum(capacity * bin(free).count('1')
+                    for capacity, free in self._free_boxes.items())
+        return counter + boxes
+
+    def counter_fit(self, size, best=False):
+        """``size`` 人が並んで座れるカウンターの位置
+
+        ``best=False`` なら最初に見つかった位置，``True`` なら最も短い
+        空席の区間の先頭を返します．``best=True`` は空席の区間を全て
+        調べるので，区間の数に比例する時間がかかります．
+        """
+        found = None
+        found_length = None
+        for segment, free in enumerate(self._free_counter):
+            if not best:
+                runs = _run_starts(free, size)
+                if runs:
+                    return Allocation(COUNTER, segment, _lowest_bit(runs),
+                                      size)
+                continue
+            starts = free & ~(free << 1)
+            ends = free & ~(free >> 1)
+            while starts:
+                start = _lowest_bit(starts)
+                end = _lowest_bit(ends)
+                length = end - start + 1
+                if size <= length and (found is None or length < found_length):
+                    found = Allocation(COUNTER, segment, start, size)
+                    found_length = length
+                    if length == size:
+                        return found
+                starts &= starts - 1
+                ends &= ends - 1
+        return found
+
+    def box_fit(self, size, best=True):
+        """``size`` 人が座れる空きボックス
+
+        ``best=True`` なら定員が最も小さいもの，``False`` なら番号が
+        最も小さいものを返します．
+        """
+        found = None
+        for capacity in self._capacities:
+            if capacity < size:
+                continue
+            free = self._free_boxes[capacity]
+            if not free:
+                continue
+            box = self._box_ids[capacity][_lowest_bit(free)]
+            if best:
+                return Allocation(BOX, box, 0, capacity)
+            if found is None or box < found.index:
+                found = Allocation(BOX, box, 0, capacity)
+        return found
+
+    def take(self, allocation):
+        kind, index, start, size = allocation
+        if kind == COUNTER:
+            self._free_counter[index] &= ~(((1 << size) - 1) << start)
+        else:
+            capacity, slot = self._box_slot[index]
+            self._free_boxes[capacity] &= ~(1 << slot)
+
+    def release(self, allocation):
+        kind, index, start, size = allocation
+        if kind == COUNTER:
+            self._free_counter[index] |= ((1 << size) - 1) << start
+        else:
+            capacity, slot = self._box_slot[index]
+            self._free_boxes[capacity] |= 1 << slot
+
+
+def first_fit(floor, size):
+    """カウンターの最初に空いている位置，なければ番号の小さいボックス"""
+    return floor.counter_fit(size) or floor.box_fit(size, best=False)
+
+
+def best_fit(floor, size):
+    """ちょうど埋まるボックス，なければカウンターの最も短い区間
+
+    カウンターに並んで座れなければ，定員が最も小さいボックスです．
+    カウンターの区間の残りは後のグループが使えるので，余る席の数だけで
+    比べずにボックスより優先します．
+    """
+    counter = floor.counter_fit(size, best=True)
+    box = floor.box_fit(size)
+    if counter is None or box is None:
+        return counter or box
+    if box.size == size:
+        return box
+    return counter
+
+
+def hold_boxes(floor, size, group_size=2):
+    """ボックスは ``group_size`` 人以上のグループのために取っておく
+
+    ``size`` 人が並べるカウンターの列がない床では，少人数のグループも
+    ボックスに案内します．
+    """
+    if size < group_size and size <= max(floor.counters, default=0):
+        return floor.counter_fit(size, best=True)
+    return floor.box_fit(size) or floor.counter_fit(size, best=True)
+
+
+POLICIES = {
+    'first_fit': first_fit,
+    'best_fit': best_fit,
+    'hold_boxes': hold_boxes,
+}
+
+
+class FloorSeating(Seats):
+    """``Floor`` の席をグループ単位で割り当てる資源
+
+    ``size_of(customer_id)`` はグループの人数を返す関数です (既定は 1 人)．
+    ``policy`` は ``POLICIES`` の名前か ``policy(floor, size)`` です．
+    ``strict=True`` なら待ち行列の先頭が座れるまで後ろのグループも
+    待たせ，``False`` なら座れるグループを並んだ順に案内します．
+    ``strict=False`` では人数ごとに行列を分けて持ち，席が空いたときは
+    各行列の先頭だけを調べるので，行列の長さではなく人数の種類数に
+    比例する時間で済みます．
+
+    ``in_use`` は埋まっている席数 (ボックスは定員分) です．
+    空の床でも ``policy`` が席を選べない人数のグループが到着すると
+    ``ValueError`` を送出します (待ち行列に並ばせると，``strict=True``
+    では後ろのグループも永久に待たされるため)．
+    """
+
+    def __init__(self, floor, policy='best_fit', size_of=None, stats=None,
+                 strict=True, patience=None, balk_at=None):
+        super().__init__(floor.capacity, stats, patience, balk_at)
+        self.floor = floor
+        self.policy = POLICIES[policy] if isinstance(policy, str) else policy
+        self.size_of = size_of
+        self.strict = strict
+        self.assigned = {}
+        self._seatable = {}
+        # strict=False のときの人数ごとの (並んだ順番, 項目) の行列
+        self._by_size = {}
+        self._order = itertools.count()
+
+    def __repr__(self):
+        return (f'{type(self).__name__}(floor={self.floor!r}, '
+                f'in_use={self.in_use}, waiting={len(self)})')
+
+    def seatable(self, size):
+        """空の床で ``policy`` が ``size`` 人の席を選べるか"""
+        seatable = self._seatable.get(size)
+        if seatable is None:
+            empty = Floor(self.floor.counters, self.floor.boxes)
+            seatable = self._seatable[size] = (self.policy(empty, size)
+                                               is not None)
+        return seatable
+
+    def _size(self, customer_id):
+        return self.size_of(customer_id) if self.size_of is not None else 1
+
+    def _seat(self, customer_id, size):
+        allocation = self.policy(self.floor, size)
+        if allocation is None:
+            return False
+        self.floor.take(allocation)
+        self.assigned[customer_id] = allocation
+        self.in_use += allocation.size
+        return True
+
+    def _line_up(self, entry):
+        if self.strict:
+            self.waiting.append(entry)
+            return
+        size = self._size(entry[0])
+        queue = self._by_size.get(size)
+        if queue is None:
+            queue = self._by_size[size] = deque()
+        queue.append((next(self._order), entry))
+
+    def _head(self, queue):
+        # 人数ごとの行列の先頭の並んでいる顧客．帰った顧客の項目は捨てる
+        queued = self._queued
+        while queue:
+            entry = queue[0][1]
+            if queued.get(entry[0]) is entry:
+                return queue[0]
+            queue.popleft()
+        return None
+
+    def _seat_any(self, sim, time):
+        # 各人数の行列の先頭を並んだ順に調べる．空席は案内するたびに減る
+        # だけなので，一度座れなかった人数はこの解放では調べ直さない
+        heads = []
+        for size, queue in self._by_size.items():
+            head = self._head(queue)
+            if head is not None:
+                heads.append((head[0], size))
+        heapq.heapify(heads)
+        while heads:
+            _, size = heapq.heappop(heads)
+            queue = self._by_size[size]
+            if not self._seat(queue[0][1][0], size):
+                continue
+            self._admit(sim, time, queue.popleft()[1])
+            head = self._head(queue)
+            if head is not None:
+                heapq.heappush(heads, (head[0], size))
+
+    def request(self, sim, time, customer_id, action):
+        size = self._size(customer_id)
+        if not self.seatable(size):
+            raise ValueError(f'no table on the floor seats {size} people')
+        if ((not self._queued or not self.strict)
+                and self._seat(customer_id, size)):
+            self._observe(0.0)
+            return True
+        self._enqueue(sim, time, customer_id, action)
+        return False
+
+    def release(self, sim, time, customer_id, action):
+        allocation = self.assigned.pop(customer_id)
+        self.floor.release(allocation)
+        self.in_use -= allocation.size
+        if not self._queued:
+            return True
+        self._record_queue(time)
+        if not self.strict:
+            self._seat_any(sim, time)
+            return True
+        entry = self._popleft()
+        while entry is not None:
+            if not self._seat(entry[0], self._size(entry[0])):
+                self.waiting.appendleft(entry)
+                break
+            self._admit(sim, time, entry)
+            entry = self._popleft()
+        return True
@@ -0,0 +1,232 @@
+"""シミュレーションのイベントを記録するシンク．
+
+ページ 05 のループはイベントごとに ``print()`` していましたが，規模が
+大きくなると整形と標準出力への書き込みが実行時間の大半を占めます．
+シンクはイベントをリストに溜め，``batch_size`` 件ごとに
+時刻 (``'d'``)，顧客ID (``'q'``)，行動コード (``'B'``) の型付きの列として
+まとめて書き出します．
+
+-   ``NullSink``: 何もしない
+-   ``MemorySink``: メモリ上の列 (structure of arrays)
+-   ``CSVSink``: バッチごとに CSV へ追記
+-   ``ColumnarSink``: ``sushi.columnar`` 形式のバイナリ列
+-   ``TeeSink``: 複数のシンクに同じイベントを渡す
+-   ``TimelineSink``: ページと同じ人間向けのタイムラインを出力
+    (``format_timeline`` を他のシンクの列に使うこともできます)
+
+行動コードは ``Action`` の値をそのまま使い，それ以外の行動には最初に
+現れた順にコードを振ります．``actions[code]`` で元の値に戻せます．
+文字列に直すのは ``format_timeline`` などの表示の段階だけです．
+"""
+import csv
+import sys
+from array import array
+
+from .actions import Action, label
+from .columnar import ColumnWriter
+
+DEFAULT_BATCH_SIZE = 1 << 16
+DEFAULT_MAX_INDENT = 16
+TYPECODES = {'time': 'd', 'customer_id': 'q', 'action': 'B'}
+
+
+def format_timeline(times, customer_ids, codes, actions,
+                    max_indent=DEFAULT_MAX_INDENT):
+    """ページ 05 の ``print()`` と同じ形式のタイムラインを 1 行ずつ返す
+
+    顧客IDによる字下げは ``max_indent`` 段で折り返します．顧客IDが負の
+    イベント (来店ソースなどの内部イベント) は表示しません．
+    """
+    labels = [label(action) for action in actions]
+    yield 'time |         events'
+    yield '-' * 30
+    for time, customer_id, code in zip(times, customer_ids, codes):
+        if customer_id < 0:
+            continue
+        indent = '  ' * (customer_id % max_indent)
+        yield (f'{time:>3.1f}m |{indent} customer_id={customer_id} '
+               f'{labels[code]}')
+
+
+class NullSink:
+    """イベントを捨てるシンク"""
+
+    def record(self, time, customer_id, action):
+        pass
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class TeeSink(NullSink):
+    """受け取ったイベントを ``sinks`` の全てに渡す"""
+
+    def __init__(self, *sinks):
+        self.sinks = sinks
+
+    def record(self, time, customer_id, action):
+        for sink in self.sinks:
+            sink.record(time, customer_id, action)
+
+    def flush(self):
+        for sink in self.sinks:
+            sink.flush()
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+
+
+class EventSink(NullSink):
+    """イベントをバッファに溜め，列としてまとめて書き出すシンクの基底クラス
+
+    サブクラスは ``write_batch(times, customer_ids, actions)`` を実装します．
+    引数はいずれも ``array`` で，``actions`` は行動コードです．
+    """
+
+    def __init__(self, batch_size=DEFAULT_BATCH_SIZE):
+        self.batch_size = batch_size
+        self.actions = list(Action)
+        self._codes = {action: action.value for action in Action}
+        self._times = []
+        self._customer_ids = []
+        self._actions = []
+
+    def record(self, time, customer_id, action):
+        self._times.append(time)
+        self._customer_ids.append(customer_id)
+        self._actions.append(action)
+        if len(self._times) >= self.batch_size:
+            self.flush()
+
+    def code(self, action):
+        """``action`` の行動コード (初出なら新しく割り当てる)"""
+        code = self._codes.get(action)
+        if code is None:
+            code = self._codes[action] = len(self.actions)
+            self.actions.append(action)
+        return code
+
+    def flush(self):
+        if not self._times:
+            return
+        try:
+            actions = array('B', self._actions)
+        except TypeError:
+            # Action 以外の行動 (文字列など) が混ざっている
+            codes = self._codes
+            code = self.code
+            actions = array('B', [
+                codes[action] if action in codes else code(action)
+                for action in self._actions
+            ])
+        self.write_batch(array('d', self._times),
+                         array('q', self._customer_ids), actions)
+        self._times = []
+        self._customer_ids = []
+        self._actions = []
+
+    def write_batch(self, times, customer_ids, actions):
+        raise NotImplementedError
+
+    def close(self):
+        self.flush()
+
+
+class MemorySink(EventSink):
+    """イベントをメモリ上の 3 本の ``array`` に保持する"""
+
+    def __init__(self, batch_size=DEFAULT_BATCH_SIZE):
+        super().__init__(batch_size)
+        self.times = array('d')
+        self.customer_ids = array('q')
+        self.codes = array('B')
+
+    def __len__(self):
+        return len(self.times) + len(self._times)
+
+    def write_batch(self, times, customer_ids, actions):
+        self.times.extend(times)
+        self.customer_ids.extend(customer_ids)
+        self.codes.extend(actions)
+
+    def timeline(self, max_indent=DEFAULT_MAX_INDENT):
+        self.flush()
+        return format_timeline(self.times, self.customer_ids, self.codes,
+                               self.actions, max_indent)
+
+
+class CSVSink(EventSink):
+    """バッチごとに ``time,customer_id,action`` の CSV を追記する"""
+
+    def __init__(self, path, batch_size=DEFAULT_BATCH_SIZE):
+        super().__init__(batch_size)
+        self._file = open(path, 'w', newline='', encoding='utf-8')
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(TYPECODES)
+
+    def write_batch(self, times, customer_ids, actions):
+        labels = [label(action) for action in self.actions]
+        self._writer.writerows(
+            zip(times, customer_ids, [labels[code] for code in actions]))
+
+    def close(self):
+        if self._file.closed:
+            return
+        super().close()
+        self._file.close()
+
+
+class TimelineSink(EventSink):
+    """バッチごとにタイムラインを整形して ``stream`` に書き出す"""
+
+    def __init__(self, stream=None, batch_size=DEFAULT_BATCH_SIZE,
+                 max_indent=DEFAULT_MAX_INDENT):
+        super().__init__(batch_size)
+        self.stream = stream if stream is not None else sys.stdout
+        self.max_indent = max_indent
+        self._header = True
+
+    def write_batch(self, times, customer_ids, actions):
+        lines = format_timeline(times, customer_ids, actions, self.actions,
+                                self.max_indent)
+        if not self._header:
+            # ヘッダは最初のバッチにだけ付ける
+            next(lines)
+            next(lines)
+        self._header = False
+        self.stream.write('\n'.join(lines) + '\n')
+
+
+class ColumnarSink(EventSink):
+    """``sushi.columnar`` 形式で列ごとのバイナリファイルに追記する
+
+    行動の一覧は ``close()`` 時に ``meta.json`` の ``actions`` に書かれます．
+    """
+
+    def __init__(self, directory, batch_size=DEFAULT_BATCH_SIZE):
+        super().__init__(batch_size)
+        self._writer = ColumnWriter(directory, TYPECODES)
+
+    def write_batch(self, times, customer_ids, actions):
+        self._writer.append({
+            'time': times,
+            'customer_id': customer_ids,
+            'action': actions,
+        })
+
+    def close(self):
+        super().close()
+        self._writer.meta['actions'] = [
+            label(action) for action in self.actions
+        ]
+        self._writer.close()
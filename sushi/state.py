@@ -0,0 +1,160 @@
+"""状態機械による顧客プロセスと，シミュレーションのスナップショット．
+
+ジェネレータの ``customer_process`` は pickle できないので，長い
+シミュレーションを途中保存したり，途中から条件を変えて分岐させたり
+できません．ここでは顧客を「次の行動 (プログラムカウンタ)，残りの皿数，
+次の時刻」という単なるデータで表します．``customer_process`` と同じ順序で
+乱数を引くので，同じシードなら ``Simulation`` と同じ結果になります．
+
+``snapshot()`` はヒープ・顧客の状態・乱数の状態をまとめた pickle 可能な
+``Snapshot`` を返し，``fork()`` はそれを共有したまま新しい
+シミュレーションを作ります (最初に進めるときに初めてコピーします)．
+"""
+import heapq
+import random
+from typing import NamedTuple
+
+from .actions import Action
+from .model import SushiModel
+
+
+class CustomerState(NamedTuple):
+    action: Action  # 次に行う行動 (プログラムカウンタ)
+    plates: int  # 残りの注文数 (最後の注文を含む)
+    time: float  # 次の行動の時刻
+
+
+class Snapshot(NamedTuple):
+    params: dict
+    now: float
+    events: int
+    seq: int
+    heap: list
+    states: dict
+    rng_state: tuple
+
+
+class StateMachineSimulation:
+    """``customer_process`` を状態機械として駆動するシミュレーション
+
+    ``params`` は ``SushiModel`` の引数 (所要時間の平均や ``end_time``) です．
+    席数と ``intensity`` による来店には対応していません．
+    """
+
+    def __init__(self, seed=None, sink=None, **params):
+        self.params = params
+        self.sink = sink
+        self.now = 0
+        self.events = 0
+        self.rng = random.Random(seed)
+        self._model = SushiModel(rng=self.rng, **params)
+        self.end_time = self._model.end_time
+        self._heap = []
+        self._states = {}
+        self._seq = 0
+        self._shared = False
+
+    @classmethod
+    def from_model_params(cls, seed=None, sink=None, **params):
+        """``SushiModel.customers()`` と同じ乱数の引き方で顧客を並べる"""
+        sim = cls(seed, sink, **params)
+        model = sim._model
+        randint = sim.rng.randint
+        interval = model.customer_interval
+        for i in range(model.number_of_customers):
+            plates = randint(1, 10)
+            sim.add_customer(i, plates, interval * i + randint(1, interval))
+        return sim
+
+    def __len__(self):
+        return len(self._heap)
+
+    @property
+    def customers(self):
+        """店内 (到着前を含む) の顧客の ``CustomerState``"""
+        return dict(self._states)
+
+    def add_customer(self, customer_id, plates, start_time=0):
+        self._own()
+        self._push(customer_id,
+                   CustomerState(Action.ARRIVE, plates, start_time))
+
+    def _push(self, customer_id, state):
+        self._states[customer_id] = state
+        heapq.heappush(self._heap, (state.time, customer_id, self._seq))
+        self._seq += 1
+
+    def _own(self):
+        # fork() 直後はヒープと状態を親と共有しているので，ここでコピーする
+        if self._shared:
+            self._heap = list(self._heap)
+            self._states = dict(self._states)
+            self._shared = False
+
+    def run(self, until=None):
+        """``until`` より前のイベントを処理し，取り残された人数を返す"""
+        if until is None:
+            until = self.end_time
+        if until is None:
+            until = float('inf')
+        self._own()
+        heap = self._heap
+        states = self._states
+        heappush = heapq.heappush
+        heappop = heapq.heappop
+        draws = self._model.compute_duration.draws
+        record = self.sink.record if self.sink is not None else None
+        seq = self._seq
+        now = self.now
+        events = 0
+        while heap and heap[0][0] < until:
+            now, customer_id, _ = heappop(heap)
+            action, plates, _ = states[customer_id]
+            events += 1
+            if record is not None:
+                record(now, customer_id, action)
+            if action == Action.LEAVE:
+                del states[customer_id]
+                continue
+            next_time = now + draws[action]()
+            if action == Action.ORDER:
+                plates -= 1
+            if action == Action.LAST_ORDER:
+                action = Action.LEAVE
+            elif plates > 1:
+                action = Action.ORDER
+            else:
+                action = Action.LAST_ORDER
+            states[customer_id] = CustomerState(action, plates, next_time)
+            heappush(heap, (next_time, customer_id, seq))
+            seq += 1
+        self._seq = seq
+        self.now = now
+        self.events += events
+        if record is not None:
+            self.sink.flush()
+        return len(states)
+
+    def snapshot(self):
+        """現在の状態を pickle 可能な ``Snapshot`` として返す"""
+        self._shared = True
+        return Snapshot(dict(self.params), self.now, self.events, self._seq,
+                        self._heap, self._states, self.rng.getstate())
+
+    @classmethod
+    def restore(cls, snapshot, sink=None, **overrides):
+        """``snapshot`` から再開する．``overrides`` で ``end_time`` などを変える"""
+        params = {**snapshot.params, **overrides}
+        sim = cls(sink=sink, **params)
+        sim.rng.setstate(snapshot.rng_state)
+        sim.now = snapshot.now
+        sim.events = snapshot.events
+        sim._seq = snapshot.seq
+        sim._heap = snapshot.heap
+        sim._states = snapshot.states
+        sim._shared = True
+        return sim
+
+    def fork(self, sink=None, **overrides):
+        """この時点から分岐した新しいシミュレーションを返す"""
+        return self.restore(self.snapshot(), sink=sink, **overrides)
@@ -0,0 +1,455 @@
+"""シミュレーション結果の集計に使う統計量．
+
+どれも観測値を保持せずに逐次更新でき，``KPICollector`` はこれらを束ねて
+エンジンのシンクとして KPI を集計します．
+"""
+import math
+from statistics import NormalDist
+
+from .actions import Action
+
+
+def t_quantile(p, df):
+    """自由度 ``df`` の t 分布の ``p`` 分位点
+
+    自由度 1, 2 は厳密な式，それ以外はコーニッシュ・フィッシャー展開による
+    近似です (相対誤差は自由度 3 で 0.2% 以下)．
+    """
+    if df == 1:
+        return math.tan(math.pi * (p - 0.5))
+    if df == 2:
+        return (2 * p - 1) / math.sqrt(2 * p * (1 - p))
+    z = NormalDist().inv_cdf(p)
+    z2 = z * z
+    g1 = (z2 + 1) * z / 4
+    g2 = ((5 * z2 + 16) * z2 + 3) * z / 96
+    g3 = (((3 * z2 + 19) * z2 + 17) * z2 - 15) * z / 384
+    g4 = ((((79 * z2 + 776) * z2 + 1482) * z2 - 1920) * z2 - 945) * z / 92160
+    return z + g1 / df + g2 / df**2 + g3 / df**3 + g4 / df**4
+
+
+class Welford:
+    """平均と分散を 1 パスで計算する (Welford のアルゴリズム)
+
+    ``merge()`` は Chan らの式による厳密な結合なので，並列ワーカーの
+    部分結果をまとめても逐次に ``push()`` したものと一致します．
+    """
+
+    __slots__ = ('count', 'mean', 'm2')
+
+    def __init__(self, values=()):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        for value in values:
+            self.push(value)
+
+    def __repr__(self):
+        return (f'{type(self).__name__}(count={self.count}, '
+                f'mean={self.mean!r}, variance={self.variance!r})')
+
+    def push(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    def merge(self, other):
+        if not other.count:
+            return self
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.count = count
+        return self
+
+    @property
+    def variance(self):
+        if self.count < 2:
+            return math.nan
+        return self.m2 / (self.count - 1)
+
+    @property
+    def stdev(self):
+        return math.sqrt(self.variance)
+
+    def half_width(self, level=0.95):
+        """平均の ``level`` 信頼区間の半幅"""
+        if self.count < 2:
+            return math.inf
+        quantile = t_quantile(0.5 + level / 2, self.count - 1)
+        return quantile * self.stdev / math.sqrt(self.count)
+
+    def confidence_interval(self, level=0.95):
+        half_width = self.half_width(level)
+        return self.mean - half_width, self.mean + half_width
+
+
+class Covariance:
+    """2 つの量 ``(x, y)`` の平均・分散・共分散を 1 パスで計算する
+
+    ``Welford`` と同じく ``merge()`` は厳密な結合です．``controlled()`` は
+    ``x`` の平均が ``expected`` と分かっているときの，``x`` を制御変量とした
+    ``y`` の平均の推定値です．
+    """
+
+    __slots__ = ('count', 'mean_x', 'mean_y', 'm2_x', 'm2_y', 'co_moment')
+
+    def __init__(self, pairs=()):
+        self.count = 0
+        self.mean_x = 0.0
+        self.mean_y = 0.0
+        self.m2_x = 0.0
+        self.m2_y = 0.0
+        self.co_moment = 0.0
+        for x, y in pairs:
+            self.push(x, y)
+
+    def __repr__(self):
+        return (f'{type(self).__name__}(count={self.count}, '
+                f'covariance={self.covariance!r})')
+
+    def push(self, x, y):
+        self.count += 1
+        dx = x - self.mean_x
+        self.mean_x += dx / self.count
+        dy = y - self.mean_y
+        self.mean_y += dy / self.count
+        self.m2_x += dx * (x - self.mean_x)
+        self.m2_y += dy * (y - self.mean_y)
+        self.co_moment += dx * (y - self.mean_y)
+
+    def merge(self, other):
+        if not other.count:
+            return self
+        count = self.count + other.count
+        weight = self.count * other.count / count
+        dx = other.mean_x - self.mean_x
+        dy = other.mean_y - self.mean_y
+        self.mean_x += dx * other.count / count
+        self.mean_y += dy * other.count / count
+        self.m2_x += other.m2_x + dx * dx * weight
+        self.m2_y += other.m2_y + dy * dy * weight
+        self.co_moment += other.co_moment + dx * dy * weight
+        self.count = count
+        return self
+
+    @property
+    def covariance(self):
+        if self.count < 2:
+            return math.nan
+        return self.co_moment / (self.count - 1)
+
+    def controlled(self, expected, level=0.95):
+        """制御変量法による ``y`` の平均の推定値と信頼区間の半幅
+
+        回帰係数 β = Cov(x, y) / Var(x) で ``mean_y - β (mean_x - expected)``
+        を返します．β を同じ標本から推定するので自由度は ``count - 2`` です．
+        """
+        count = self.count
+        if count < 3 or not self.m2_x:
+            # x がばらつかなければ補正できないので y の平均そのもの
+            return self.mean_y, self.y.half_width(level)
+        beta = self.co_moment / self.m2_x
+        shift = self.mean_x - expected
+        residual = (self.m2_y - beta * self.co_moment) / (count - 2)
+        variance = max(residual, 0.0) * (1 / count + shift * shift / self.m2_x)
+        quantile = t_quantile(0.5 + level / 2, count - 2)
+        return self.mean_y - beta * shift, quantile * math.sqrt(variance)
+
+    @property
+    def y(self):
+        """``y`` だけの ``Welford``"""
+        stat = Welford()
+        stat.count, stat.mean, stat.m2 = self.count, self.mean_y, self.m2_y
+        return stat
+
+
+class TimeAverage:
+    """区分的に一定な量 (店内の人数など) の時間平均
+
+    ``update(time, value)`` で時刻 ``time`` 以降の値を ``value`` にします．
+    最後の変化から観測の終わりまでの区間は，``advance(time)`` で値を変えずに
+    時刻を進めるまで面積に入りません．``merge()`` は面積と観測時間を
+    足し合わせるので厳密です．
+    """
+
+    __slots__ = ('area', 'duration', 'value', 'last_time', 'maximum')
+
+    def __init__(self, value=0, start=0):
+        self.area = 0.0
+        self.duration = 0.0
+        self.value = value
+        self.last_time = start
+        self.maximum = value
+
+    def __repr__(self):
+        return f'{type(self).__name__}(mean={self.mean!r})'
+
+    def update(self, time, value):
+        elapsed = time - self.last_time
+        self.area += self.value * elapsed
+        self.duration += elapsed
+        self.value = value
+        self.last_time = time
+        if value > self.maximum:
+            self.maximum = value
+
+    def add(self, time, delta):
+        self.update(time, self.value + delta)
+
+    def advance(self, time):
+        """値を変えずに時刻 ``time`` まで進める"""
+        self.update(time, self.value)
+
+    @property
+    def mean(self):
+        if not self.duration:
+            return 0.0
+        return self.area / self.duration
+
+    def merge(self, other):
+        self.area += other.area
+        self.duration += other.duration
+        self.maximum = max(self.maximum, other.maximum)
+        return self
+
+
+class P2Quantile:
+    """P² アルゴリズム (Jain & Chlamtac) による分位点の逐次推定
+
+    5 個のマーカーだけを持つので，観測数によらずメモリは一定です．
+    マーカー同士は厳密には結合できないので，並列の結果をまとめるときは
+    ``Histogram`` を使います．
+    """
+
+    __slots__ = ('p', 'count', 'heights', 'positions', 'desired',
+                 'increments')
+
+    def __init__(self, p):
+        self.p = p
+        self.count = 0
+        self.heights = []
+        self.positions = [1, 2, 3, 4, 5]
+        self.desired = [1, 1 + 2 * p, 1 + 4 * p, 3 + 2 * p, 5]
+        self.increments = [0, p / 2, p, (1 + p) / 2, 1]
+
+    def __repr__(self):
+        return f'{type(self).__name__}(p={self.p!r}, value={self.value!r})'
+
+    def push(self, x):
+        self.count += 1
+        heights = self.heights
+        if self.count <= 5:
+            heights.append(x)
+            heights.sort()
+            return
+
+        if x < heights[0]:
+            heights[0] = x
+            k = 0
+        elif x >= heights[4]:
+            heights[4] = x
+            k = 3
+        else:
+            k = 0
+            while x >= heights[k + 1]:
+                k += 1
+        positions = self.positions
+        for i in range(k + 1, 5):
+            positions[i] += 1
+        desired = self.desired
+        for i, increment in enumerate(self.increments):
+            desired[i] += increment
+
+        for i in (1, 2, 3):
+            d = desired[i] - positions[i]
+            if ((d >= 1 and positions[i + 1] - positions[i] > 1)
+                    or (d <= -1 and positions[i - 1] - positions[i] < -1)):
+                d = 1 if d > 0 else -1
+                height = self._parabolic(i, d)
+                if not heights[i - 1] < height < heights[i + 1]:
+                    height = self._linear(i, d)
+                heights[i] = height
+                positions[i] += d
+
+    def _parabolic(self, i, d):
+        q, n = self.heights, self.positions
+        return q[i] + d / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i]) +
+            (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1]))
+
+    def _linear(self, i, d):
+        q, n = self.heights, self.positions
+        return q[i] + d * (q[i + d] - q[i]) / (n[i + d] - n[i])
+
+    @property
+    def value(self):
+        if not self.count:
+            return math.nan
+        if self.count <= 5:
+            heights = self.heights
+            return heights[min(len(heights) - 1,
+                               round(self.p * (len(heights) - 1)))]
+        return self.heights[2]
+
+
+class Histogram:
+    """幅 ``width`` の固定ビンによるヒストグラム
+
+    ビンの数は値の範囲で決まり観測数には依存しません．``merge()`` は
+    度数を足すだけなので厳密で，結合後の分位点はビン内の線形補間で求めます．
+    """
+
+    __slots__ = ('width', 'counts', 'count')
+
+    def __init__(self, width=1.0):
+        self.width = width
+        self.counts = {}
+        self.count = 0
+
+    def __repr__(self):
+        return (f'{type(self).__name__}(width={self.width!r}, '
+                f'count={self.count})')
+
+    def push(self, x):
+        index = math.floor(x / self.width)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+
+    def merge(self, other):
+        if other.width != self.width:
+            raise ValueError('cannot merge histograms of different widths')
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.count += other.count
+        return self
+
+    def quantile(self, p):
+        if not self.count:
+            return math.nan
+        target = p * self.count
+        cumulative = 0
+        for index in sorted(self.counts):
+            count = self.counts[index]
+            if cumulative + count >= target:
+                fraction = (target - cumulative) / count
+                return (index + fraction) * self.width
+            cumulative += count
+        return (max(self.counts) + 1) * self.width
+
+
+class KPICollector:
+    """エンジンから直接イベントを受け取り，KPI を逐次集計するシンク
+
+    ``Simulation(sink=...)`` に渡すと，店内滞在時間と 1 人あたりの皿数の
+    平均・分散，店内人数の時間平均を計算します．``Seats(stats=...)`` に
+    渡すと待ち時間 (平均と分散，待った人数 ``waited``，最大値 ``max_wait``，
+    分位点) も集計します．保持するのは店内の顧客の到着時刻と皿数だけなので，
+    何日分走らせてもメモリは増えません．
+
+    店内人数の時間平均は，実行の終わりに ``advance(time)`` を呼ぶと最後の
+    イベントから ``time`` までの区間も含みます．
+
+    ``merge()`` は分位点の P² マーカー以外を厳密に結合します．待ち時間の
+    ある相手と結合した後の分位点は ``wait_histogram`` から求めます．
+    """
+
+    def __init__(self, quantiles=(0.5, 0.9, 0.99), wait_bin_width=1.0):
+        self.time_in_store = Welford()
+        self.plates = Welford()
+        self.waits = Welford()
+        self.waited = 0
+        self.max_wait = 0.0
+        self.occupancy = TimeAverage()
+        self.wait_quantiles = {p: P2Quantile(p) for p in quantiles}
+        self.wait_histogram = Histogram(wait_bin_width)
+        self.balked = 0
+        self.reneged = 0
+        self._arrivals = {}
+        self._plates = {}
+
+    def __repr__(self):
+        return (f'{type(self).__name__}(customers={self.time_in_store.count}, '
+                f'in_store={len(self._arrivals)})')
+
+    def record(self, time, customer_id, action):
+        if action == Action.ARRIVE:
+            self._arrivals[customer_id] = time
+            self._plates[customer_id] = 0
+            self.occupancy.add(time, 1)
+        elif action == Action.ORDER or action == Action.LAST_ORDER:
+            self._plates[customer_id] += 1
+        elif action == Action.LEAVE:
+            self.time_in_store.push(time - self._arrivals.pop(customer_id))
+            self.plates.push(self._plates.pop(customer_id))
+            self.occupancy.add(time, -1)
+        elif action == Action.BALK or action == Action.RENEGE:
+            # 席に着かずに帰った顧客は滞在時間と皿数に含めない
+            if action == Action.BALK:
+                self.balked += 1
+            else:
+                self.reneged += 1
+            del self._arrivals[customer_id]
+            del self._plates[customer_id]
+            self.occupancy.add(time, -1)
+
+    def observe_wait(self, wait):
+        self.waits.push(wait)
+        self.wait_histogram.push(wait)
+        if wait > 0:
+            self.waited += 1
+            if wait > self.max_wait:
+                self.max_wait = wait
+        for estimator in self.wait_quantiles.values():
+            estimator.push(wait)
+
+    def advance(self, time):
+        """店内人数の時間平均を時刻 ``time`` (実行の終わり) まで延ばす"""
+        self.occupancy.advance(time)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+    def merge(self, other):
+        self.time_in_store.merge(other.time_in_store)
+        self.plates.merge(other.plates)
+        self.waits.merge(other.waits)
+        self.waited += other.waited
+        self.max_wait = max(self.max_wait, other.max_wait)
+        self.occupancy.merge(other.occupancy)
+        self.balked += other.balked
+        self.reneged += other.reneged
+        self.wait_histogram.merge(other.wait_histogram)
+        if other.waits.count:
+            # P² のマーカーは結合できないので，結合後はヒストグラムから求める
+            self.wait_quantiles = {}
+        return self
+
+    def quantile(self, p):
+        estimator = self.wait_quantiles.get(p)
+        if estimator is not None:
+            return estimator.value
+        return self.wait_histogram.quantile(p)
+
+    def summary(self, quantiles=(0.5, 0.9, 0.99)):
+        result = {
+            'customers': self.time_in_store.count,
+            'mean_time_in_store': self.time_in_store.mean,
+            'var_time_in_store': self.time_in_store.variance,
+            'mean_plates': self.plates.mean,
+            'var_plates': self.plates.variance,
+            'mean_occupancy': self.occupancy.mean,
+            'max_occupancy': self.occupancy.maximum,
+            'balked': self.balked,
+            'reneged': self.reneged,
+        }
+        if self.waits.count:
+            result['mean_wait'] = self.waits.mean
+            for p in quantiles:
+                result[f'wait_p{round(p * 100)}'] = self.quantile(p)
+        return result
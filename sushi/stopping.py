@@ -0,0 +1,287 @@
+"""ウォームアップの切り捨てと逐次的な停止規則．
+
+シミュレーションは空の店から始まるので，序盤の顧客の待ち時間や滞在時間は
+定常状態より短くなります．``mser()`` は MSER-5 (5 個ずつのバッチ平均に
+対する Marginal Standard Error Rule) で，先頭から捨てる観測数を決めます．
+
+停止規則は 2 通りあります．
+
+-   ``run_until()``: 1 回の長い実行を ``check_every`` 分ずつ進め，
+    切り捨て後のバッチ平均による信頼区間の相対半幅が ``precision`` 以下に
+    なったところで止めます．
+-   ``replicate_until()``: 反復を ``block_size`` 回ずつ追加し，反復ごとの
+    (切り捨て後の) 平均の信頼区間の相対半幅が ``precision`` 以下になった
+    ところで止めます．
+
+どちらも固定長の実行 (``end_time`` まで，または ``max_replications`` 回)
+と比べてどれだけ計算を省けたかを ``saved`` で返します．観測が 1 つも
+ない反復 (誰も退店しなかったなど) は平均に含めず，``empty`` に数えます．
+"""
+import math
+import os
+import random
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from typing import NamedTuple
+
+from .actions import Action
+from .model import SushiModel
+from .runner import DEFAULT_MASTER_SEED, replication_seed
+from .sinks import NullSink, TeeSink
+from .stats import KPICollector, Welford
+
+MSER_BATCH_SIZE = 5
+DEFAULT_BATCHES = 20
+DEFAULT_PRECISION = 0.05
+METRICS = ('time_in_store', 'wait')
+
+
+def mser(values, batch_size=MSER_BATCH_SIZE):
+    """MSER の切り捨て点 (先頭から捨てる観測数)
+
+    ``batch_size`` 個ずつのバッチ平均 Z_1, ..., Z_k について，先頭 d 個を
+    捨てた残りの Σ(Z_i - Z̄)² / (k - d)² を最小にする d を k / 2 以下から
+    選びます．上限の k / 2 で最小になるときは，まだ定常状態に達して
+    いないと考えられます (``stationary()``)．
+    """
+    count = len(values) // batch_size
+    if count < 4:
+        return 0
+    means = [
+        sum(values[i * batch_size:(i + 1) * batch_size]) / batch_size
+        for i in range(count)
+    ]
+    # 後ろからの和と 2 乗和で，各 d の統計量を O(1) で求める
+    total = 0.0
+    squares = 0.0
+    best = math.inf
+    truncation = 0
+    for d in range(count - 1, -1, -1):
+        z = means[d]
+        total += z
+        squares += z * z
+        if 2 * d > count:
+            continue
+        remaining = count - d
+        statistic = (squares - total * total / remaining) / remaining**2
+        if statistic <= best:
+            best = statistic
+            truncation = d
+    return truncation * batch_size
+
+
+def stationary(values, truncation, batch_size=MSER_BATCH_SIZE):
+    """``mser()`` の切り捨て点が探索範囲の上限より前にあるか"""
+    count = len(values) // batch_size
+    return count >= 4 and truncation < count // 2 * batch_size
+
+
+def batch_means(values, batches=DEFAULT_BATCHES):
+    """``values`` を ``batches`` 個のバッチに分けた平均の ``Welford``"""
+    size = len(values) // batches
+    stat = Welford()
+    if not size:
+        return stat
+    for i in range(batches):
+        stat.push(sum(values[i * size:(i + 1) * size]) / size)
+    return stat
+
+
+class CustomerSeries(NullSink):
+    """顧客ごとの店内滞在時間を退店順に記録するシンク"""
+
+    def __init__(self):
+        self.time_in_store = array('d')
+        self._arrivals = {}
+
+    def __len__(self):
+        return len(self.time_in_store)
+
+    def record(self, time, customer_id, action):
+        if action == Action.ARRIVE:
+            self._arrivals[customer_id] = time
+        elif action == Action.LEAVE:
+            self.time_in_store.append(time -
+                                      self._arrivals.pop(customer_id))
+        elif action == Action.BALK or action == Action.RENEGE:
+            del self._arrivals[customer_id]
+
+
+class WaitSeries(KPICollector):
+    """待ち時間を着席順に ``waits_in_order`` にも記録する ``KPICollector``"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.waits_in_order = array('d')
+
+    def observe_wait(self, wait):
+        super().observe_wait(wait)
+        self.waits_in_order.append(wait)
+
+
+class StoppingResult(NamedTuple):
+    estimate: float
+    half_width: float
+    converged: bool
+    warmup: int  # 切り捨てた観測数 (反復のときは平均)
+    events: int
+    used: float  # 進めた時間，または反復数
+    budget: float  # 固定長の実行の時間，または反復数
+    empty: int = 0  # 観測がなく平均に含めなかった反復の数
+
+    @property
+    def relative_half_width(self):
+        if not self.estimate:
+            return math.inf
+        return self.half_width / abs(self.estimate)
+
+    @property
+    def saved(self):
+        """固定長の実行に比べて省けた計算の割合"""
+        if not self.budget or math.isinf(self.budget):
+            return 0.0
+        return 1 - self.used / self.budget
+
+
+def _observations(model, series, collector, metric):
+    if metric == 'time_in_store':
+        return series.time_in_store
+    if metric == 'wait':
+        if model.seating is None:
+            raise ValueError('waits need seats')
+        return collector.waits_in_order
+    raise ValueError(f'unknown metric: {metric!r}')
+
+
+def _simulate(model):
+    series = CustomerSeries()
+    collector = WaitSeries()
+    sim = model.simulation(sink=TeeSink(collector, series), stats=collector)
+    return sim, series, collector
+
+
+def run_until(precision=DEFAULT_PRECISION,
+              level=0.95,
+              metric='time_in_store',
+              check_every=60,
+              batches=DEFAULT_BATCHES,
+              **params):
+    """1 回の実行を信頼区間の相対半幅が ``precision`` 以下になるまで進める
+
+    ``check_every`` 分進めるたびに ``mser()`` で切り捨て，残りの観測の
+    ``batches`` 個のバッチ平均で信頼区間を求めます．``end_time`` に
+    達するかイベントがなくなったら，収束していなくても止めます．
+    ``params`` は ``SushiModel`` にそのまま渡されます．
+    """
+    model = SushiModel(**params)
+    sim, series, collector = _simulate(model)
+    horizon = model.end_time if model.end_time is not None else math.inf
+    until = 0
+    while True:
+        until = min(until + check_every, horizon)
+        sim.run(until)
+        values = _observations(model, series, collector, metric)
+        truncation = mser(values)
+        stat = batch_means(values[truncation:], batches)
+        # 平均が 0 (誰も待っていないなど) では相対半幅が決まらない
+        converged = (stationary(values, truncation) and
+                     stat.count == batches and stat.mean != 0 and
+                     stat.half_width(level) <= precision * abs(stat.mean))
+        if converged or until >= horizon or not len(sim):
+            break
+    return StoppingResult(stat.mean, stat.half_width(level), converged,
+                          truncation, sim.events, until, horizon)
+
+
+def truncated_replication(index,
+                          master_seed=DEFAULT_MASTER_SEED,
+                          metric='time_in_store',
+                          **params):
+    """1 回分を最後まで実行し，切り捨て後の平均などを辞書で返す
+
+    観測が 1 つもなければ ``'mean'`` は ``None`` です．
+    """
+    model = SushiModel(rng=random.Random(replication_seed(master_seed, index)),
+                       **params)
+    sim, series, collector = _simulate(model)
+    sim.run()
+    values = _observations(model, series, collector, metric)
+    truncation = mser(values)
+    rest = values[truncation:]
+    return {
+        'mean': sum(rest) / len(rest) if rest else None,
+        'warmup': truncation,
+        'observations': len(values),
+        'events': sim.events,
+    }
+
+
+def _run_indices(indices, master_seed, metric, params):
+    return [
+        truncated_replication(index, master_seed, metric, **params)
+        for index in indices
+    ]
+
+
+def replicate_until(precision=DEFAULT_PRECISION,
+                    level=0.95,
+                    metric='time_in_store',
+                    min_replications=8,
+                    max_replications=1000,
+                    block_size=8,
+                    master_seed=DEFAULT_MASTER_SEED,
+                    workers=None,
+                    **params):
+    """反復平均の信頼区間の相対半幅が ``precision`` 以下になるまで反復する
+
+    反復は ``block_size`` 回ずつ追加し，追加のたびに判定します．判定は
+    反復番号の順に行うので，ワーカー数によらず同じ回数で止まります．
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    stat = Welford()
+    warmup = Welford()
+    events = 0
+    replications = 0
+    empty = 0
+    converged = False
+    executor = ProcessPoolExecutor(workers) if workers > 1 else None
+    try:
+        while replications < max_replications and not converged:
+            start = replications
+            stop = min(start + block_size, max_replications)
+            # ブロックをワーカー数に分けて配る
+            chunks = [
+                range(start + i, stop, workers)
+                for i in range(min(workers, stop - start))
+            ]
+            if executor is None:
+                results = [
+                    _run_indices(chunk, master_seed, metric, params)
+                    for chunk in chunks
+                ]
+            else:
+                futures = [
+                    executor.submit(_run_indices, chunk, master_seed, metric,
+                                    params) for chunk in chunks
+                ]
+                results = [future.result() for future in futures]
+            by_index = {}
+            for chunk, chunk_results in zip(chunks, results):
+                by_index.update(zip(chunk, chunk_results))
+            for _, result in sorted(by_index.items()):
+                events += result['events']
+                if result['mean'] is None:
+                    empty += 1
+                    continue
+                stat.push(result['mean'])
+                warmup.push(result['warmup'])
+            replications = stop
+            converged = (stat.count >= min_replications and
+                         stat.half_width(level) <= precision * abs(stat.mean))
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    return StoppingResult(stat.mean, stat.half_width(level), converged,
+                          round(warmup.mean), events, replications,
+                          max_replications, empty)
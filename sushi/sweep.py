@@ -0,0 +1,261 @@
+"""パラメータの格子を掃引する反復実行と，その結果のディスクキャッシュ．
+
+格子の各点は ``(MODEL_VERSION, params, master_seed, replications)`` を
+JSON にして SHA-256 を取ったキーで ``cache_dir`` に 1 ファイルずつ
+保存されます．軸を 1 本変えて掃引し直しても，計算するのはキャッシュに
+ない点だけです．
+
+キャッシュにない点はプロセスプールに 1 点ずつ配り，終わった点から
+すぐに書き出します．書き出しは一時ファイルに書いてから ``os.replace()``
+で置き換えるので，途中で止まっても壊れたファイルは残りません．同じ
+掃引をもう一度呼べば，残りの点から再開します．``max_points`` で
+1 回に計算する点の数を制限することもできます．
+
+    points = grid(customer_interval=[2, 3, 4], seats=range(8, 16))
+    result = sweep(points, replications=32, end_time=600)
+    print(result.table('mean_wait'))
+"""
+import hashlib
+import itertools
+import json
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from .runner import DEFAULT_MASTER_SEED, replicate
+
+# モデルの結果が変わる変更をしたら上げる (古いキャッシュを使わないため)
+MODEL_VERSION = 2
+DEFAULT_CACHE_DIR = os.path.join('.cache', 'sushi', 'sweep')
+DEFAULT_REPLICATIONS = 32
+
+
+def grid(base=None, **axes):
+    """``axes`` (引数名から値の列への辞書) の直積を引数の辞書のリストにする
+
+    ``base`` の引数は全ての点に共通に加えます．
+    """
+    names = list(axes)
+    return [
+        dict(base or {}, **dict(zip(names, values)))
+        for values in itertools.product(*(axes[name] for name in names))
+    ]
+
+
+def _canonical(value):
+    # JSON にできない引数は型名と，cache_key() (Menu や Conveyor など，
+    # 実行中に状態が変わるもの) か公開属性 (PiecewiseIntensity など) で表す
+    if isinstance(value, (set, frozenset)):
+        return sorted(value)
+    if hasattr(value, 'cache_key'):
+        return {'__type__': type(value).__qualname__, **value.cache_key()}
+    if hasattr(value, '__dict__'):
+        state = {
+            name: attribute
+            for name, attribute in vars(value).items()
+            if not name.startswith('_') and name != 'rng'
+        }
+        return {'__type__': type(value).__qualname__, **state}
+    raise TypeError(f'cannot hash {type(value).__name__} parameters')
+
+
+def point_key(params,
+              master_seed=DEFAULT_MASTER_SEED,
+              replications=DEFAULT_REPLICATIONS):
+    """格子の 1 点のキャッシュキー"""
+    source = {
+        'version': MODEL_VERSION,
+        'params': params,
+        'master_seed': master_seed,
+        'replications': replications,
+    }
+    encoded = json.dumps(source, sort_keys=True, default=_canonical).encode()
+    return hashlib.sha256(encoded).hexdigest()[:32]
+
+
+class SweepCache:
+    """格子の点ごとの結果を 1 ファイルずつ持つディレクトリ"""
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR):
+        self.directory = directory
+
+    def __repr__(self):
+        return f'{type(self).__name__}({self.directory!r})'
+
+    def path(self, key):
+        return os.path.join(self.directory, f'{key}.json')
+
+    def get(self, key):
+        """保存された結果．ないか読めなければ ``None``"""
+        try:
+            with open(self.path(key), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, key, record):
+        os.makedirs(self.directory, exist_ok=True)
+        # 一時ファイルに書き切ってから置き換える
+        fd, staging = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(record, f, sort_keys=True, default=_canonical)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(staging, self.path(key))
+        except BaseException:
+            try:
+                os.remove(staging)
+            except OSError:
+                pass
+            raise
+
+
+def run_point(params, master_seed, replications, level=0.95):
+    """1 点分の反復を実行し，指標ごとの平均と信頼区間の半幅を返す"""
+    summary = replicate(replications, master_seed, workers=1, **params)
+    return {
+        name: {
+            'mean': stat.mean,
+            'half_width': stat.half_width(level),
+        }
+        for name, stat in summary.stats.items()
+    }
+
+
+class SweepResult:
+    """格子の点ごとの ``(params, metrics)`` (入力と同じ順)
+
+    ``computed`` は今回計算した点，``cached`` はキャッシュから読んだ点，
+    ``missing`` は ``max_points`` のために計算しなかった点の数です．
+    """
+
+    def __init__(self, points, computed=0, cached=0, missing=0):
+        self.points = points
+        self.computed = computed
+        self.cached = cached
+        self.missing = missing
+
+    def __repr__(self):
+        return (f'{type(self).__name__}(computed={self.computed}, '
+                f'cached={self.cached}, missing={self.missing})')
+
+    def __iter__(self):
+        return iter(self.points)
+
+    def __len__(self):
+        return len(self.points)
+
+    @property
+    def complete(self):
+        return not self.missing
+
+    def table(self, metric):
+        """点ごとの ``metric`` の平均と半幅 (変化する引数だけを列にする)"""
+        names = sorted({
+            name
+            for params, _ in self.points for name, value in params.items()
+            if any(other.get(name) != value for other, _ in self.points)
+        })
+        lines = [
+            ''.join(f'{name:>18}' for name in names) +
+            f'{metric:>16}{"± half width":>16}'
+        ]
+        for params, metrics in self.points:
+            row = ''.join(f'{params.get(name)!s:>18}' for name in names)
+            if metrics is None or metric not in metrics:
+                row += f'{"-":>16}{"-":>16}'
+            else:
+                value = metrics[metric]
+                row += f'{value["mean"]:>16.4f}{value["half_width"]:>16.4f}'
+            lines.append(row)
+        return '\n'.join(lines)
+
+
+def run_sweep(points,
+              replications=DEFAULT_REPLICATIONS,
+              master_seed=DEFAULT_MASTER_SEED,
+              workers=None,
+              cache_dir=DEFAULT_CACHE_DIR,
+              max_points=None,
+              **base):
+    """格子の点を処理し，``(index, params, metrics, cached)`` を順次返す
+
+    キャッシュにある点を先に返し，残りは終わった順に返します．
+    ``base`` の引数は全ての点に共通に加えます．
+    """
+    cache = SweepCache(cache_dir)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    pending = []
+    for index, point in enumerate(points):
+        params = dict(base, **point)
+        key = point_key(params, master_seed, replications)
+        record = cache.get(key)
+        if record is None:
+            pending.append((index, params, key))
+        else:
+            yield index, params, record['metrics'], True
+    if max_points is not None:
+        pending = pending[:max_points]
+
+    def store(params, key, metrics):
+        cache.put(
+            key, {
+                'version': MODEL_VERSION,
+                'params': params,
+                'master_seed': master_seed,
+                'replications': replications,
+                'metrics': metrics,
+            })
+
+    if workers == 1:
+        for index, params, key in pending:
+            metrics = run_point(params, master_seed, replications)
+            store(params, key, metrics)
+            yield index, params, metrics, False
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(run_point, params, master_seed, replications):
+            (index, params, key)
+            for index, params, key in pending
+        }
+        try:
+            for future in as_completed(futures):
+                index, params, key = futures[future]
+                metrics = future.result()
+                store(params, key, metrics)
+                yield index, params, metrics, False
+        finally:
+            # 中断されたときは，まだ始まっていない点を取り消す
+            for future in futures:
+                future.cancel()
+
+
+def sweep(points,
+          replications=DEFAULT_REPLICATIONS,
+          master_seed=DEFAULT_MASTER_SEED,
+          workers=None,
+          cache_dir=DEFAULT_CACHE_DIR,
+          max_points=None,
+          **base):
+    """``run_sweep`` を最後まで回し，入力の順に並べた ``SweepResult`` を返す"""
+    points = list(points)
+    found = [None] * len(points)
+    computed = cached = 0
+    for index, params, metrics, hit in run_sweep(points, replications,
+                                                 master_seed, workers,
+                                                 cache_dir, max_points,
+                                                 **base):
+        found[index] = (params, metrics)
+        if hit:
+            cached += 1
+        else:
+            computed += 1
+    missing = 0
+    for index, point in enumerate(points):
+        if found[index] is None:
+            found[index] = (dict(base, **point), None)
+            missing += 1
+    return SweepResult(found, computed, cached, missing)
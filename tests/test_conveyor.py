@@ -0,0 +1,90 @@
+import random
+
+import pytest
+
+from sushi import Action, SushiModel
+from sushi.conveyor import Conveyor, Lane, TimingWheel
+from sushi.menu import Menu
+
+
+def test_timing_wheel_returns_items_at_their_tick():
+    wheel = TimingWheel(slots=4, levels=3)
+    expiries = [1, 3, 4, 5, 17, 40, 63]
+    for expires in expiries:
+        wheel.add(expires, expires)
+    seen = {}
+    for _ in range(63):
+        for item in wheel.advance():
+            seen[item] = wheel.tick
+    assert seen == {expires: expires for expires in expiries}
+    assert len(wheel) == 0
+    with pytest.raises(ValueError):
+        wheel.add(wheel.tick + 64, 'late')
+
+
+def test_seats_stay_within_the_reach_of_a_plate():
+    lane = Lane(100, shelf_life=30, seats=10, kitchen=95)
+    assert lane.reach == 29
+    assert len(lane.positions) == 10
+    for position in lane.positions:
+        assert 1 <= (position - 95) % 100 <= lane.reach
+    with pytest.raises(ValueError):
+        Lane(100, shelf_life=1)
+
+
+def ticks_until_served(lane, position, ticks=200):
+    lane.positions = [position]
+    lane.wait(0, Action.ORDER, 0)
+    for tick in range(1, ticks + 1):
+        if lane.advance(tick):
+            return tick
+    return None
+
+
+@pytest.mark.parametrize('shelf_life', [2, 5, 12])
+def test_plates_reach_exactly_the_last_seat(shelf_life):
+    def lane():
+        return Lane(50, shelf_life=shelf_life, production=1,
+                    pick_probability=1, seats=1, rng=random.Random(1))
+
+    reach = lane().reach
+    assert ticks_until_served(lane(), reach) is not None
+    assert ticks_until_served(lane(), reach + 1) is None
+
+
+def test_customers_at_one_seat_are_served_in_order():
+    lane = Lane(10, shelf_life=5, production=1, pick_probability=1, seats=1,
+                rng=random.Random(2))
+    for customer_id in range(3):
+        lane.wait(customer_id, Action.ORDER, 0)
+    served = []
+    for tick in range(1, 20):
+        served.extend(customer_id for customer_id, _ in lane.advance(tick))
+    assert served == [0, 1, 2]
+    assert lane.pick_waits.count == 3
+    assert lane.report()['still_waiting'] == 0
+
+
+def conveyor_model(menu=None):
+    lanes = [Lane(120, shelf_life=30, seats=12), Lane(80, shelf_life=20)]
+    return SushiModel(number_of_customers=40, end_time=None, seed=3,
+                      conveyor=Conveyor(lanes), menu=menu)
+
+
+def test_run_without_end_time_returns_when_everyone_is_served():
+    model = conveyor_model()
+    sim = model.simulation()
+    assert sim.run() == 0
+    assert not sim.processes
+    report = model.conveyor.report()
+    picked = report['total']['picked']
+    assert picked == sum(lane.pick_waits.count for lane in model.conveyor.lanes)
+    assert picked > 40
+    assert all(lane['still_waiting'] == 0 for lane in report['lanes'])
+
+
+def test_menu_picks_when_the_plate_is_taken():
+    menu = Menu(['maguro', 'tamago'], [1, 1])
+    model = conveyor_model(menu)
+    model.simulation().run()
+    assert sum(menu.demand) == model.conveyor.report()['total']['picked']
@@ -0,0 +1,104 @@
+import random
+import statistics
+
+import pytest
+
+import sushi.durations
+from sushi import Action
+from sushi.durations import (Constant, DurationTable, FloorExponential,
+                             InverseCDFTable, empirical, fit_exponential,
+                             fit_lognormal, fit_weibull, kernel)
+
+
+def sequential(table, size, seed):
+    draw = table.sampler(random.Random(seed))
+    return [draw() for _ in range(size)]
+
+
+@pytest.mark.parametrize('integral', [False, True])
+def test_draw_many_matches_sequential_draws(integral):
+    samples = [random.Random(1).expovariate(0.2) for _ in range(500)]
+    table = empirical(samples, integral=integral)
+    values = table.draw_many(2000, random.Random(4))
+    assert values == sequential(table, 2000, 4)
+    assert all(isinstance(value, int) for value in values) == integral
+
+
+def test_draw_many_without_numpy(monkeypatch):
+    table = empirical(range(100))
+    expected = table.draw_many(1000, random.Random(5))
+    monkeypatch.setattr(sushi.durations, 'np', None)
+    assert table.draw_many(1000, random.Random(5)) == expected
+
+
+def test_inverse_cdf_table_interpolates():
+    table = InverseCDFTable([0, 10, 30])
+    assert table.ppf(0.25) == pytest.approx(5)
+    assert table.ppf(0.75) == pytest.approx(20)
+    assert table.mean == pytest.approx(12.5)
+    with pytest.raises(ValueError):
+        InverseCDFTable([1])
+
+
+def test_empirical_reproduces_the_sample_mean():
+    rng = random.Random(2)
+    samples = [rng.expovariate(1 / 8) for _ in range(5000)]
+    table = empirical(samples)
+    draws = table.draw_many(20000, random.Random(3))
+    assert statistics.fmean(draws) == pytest.approx(statistics.fmean(samples),
+                                                    rel=0.05)
+    with pytest.raises(ValueError):
+        empirical([])
+
+
+def test_fits_recover_parameters():
+    rng = random.Random(6)
+    exponential = [rng.expovariate(1 / 4) for _ in range(5000)]
+    assert fit_exponential(exponential).params['scale'] == pytest.approx(
+        4, rel=0.05)
+    lognormal = [rng.lognormvariate(1, 0.5) for _ in range(5000)]
+    params = fit_lognormal(lognormal).params
+    assert params['mu'] == pytest.approx(1, abs=0.05)
+    assert params['sigma'] == pytest.approx(0.5, rel=0.05)
+    weibull = [rng.weibullvariate(3, 1.5) for _ in range(5000)]
+    params = fit_weibull(weibull).params
+    assert params['scale'] == pytest.approx(3, rel=0.05)
+    assert params['shape'] == pytest.approx(1.5, rel=0.05)
+
+
+def test_fits_reject_empty_samples():
+    with pytest.raises(ValueError):
+        fit_exponential([])
+    with pytest.raises(ValueError):
+        fit_lognormal([])
+    with pytest.raises(ValueError):
+        fit_weibull([])
+    with pytest.raises(ValueError):
+        kernel([1.0])
+
+
+def test_kernel_is_not_negative():
+    table = kernel([0.5, 1, 1, 2, 3, 5, 8], lower=0.0)
+    assert min(table.quantiles) >= 0.0
+
+
+def test_duration_table_indexes_samplers_by_action():
+    table = DurationTable({
+        Action.ARRIVE: Constant(3),
+        Action.LEAVE: Constant(1),
+    })
+    assert table(Action.ARRIVE) == 3
+    assert table.draws[Action.LEAVE]() == 1
+    assert table.integral
+    with pytest.raises(KeyError):
+        table(Action.ORDER)
+
+
+def test_floor_exponential_moments():
+    distribution = FloorExponential(5)
+    draw = distribution.sampler(random.Random(7))
+    values = [draw() for _ in range(50000)]
+    assert statistics.fmean(values) == pytest.approx(distribution.mean,
+                                                     rel=0.03)
+    assert statistics.variance(values) == pytest.approx(
+        distribution.variance, rel=0.05)
@@ -0,0 +1,171 @@
+import queue
+import random
+
+import pytest
+
+from sushi import Action, Simulation, SushiModel
+from sushi.engine import COMPACT_THRESHOLD
+from sushi.scheduler import CalendarQueue, HeapScheduler
+from sushi.sinks import MemorySink
+
+
+def page_log(seed=1991,
+             number_of_customers=10,
+             customer_interval=3,
+             eating_duration=5,
+             ordering_duration=3,
+             end_time=300):
+    # ページ 05 の 3 節のループ (print() の代わりにリストに記録する)
+    rng = random.Random(seed)
+
+    def customer_process(customer_id, plates, start_time=0):
+        time = yield (start_time, customer_id, 'お店に到着')
+        for _ in range(plates - 1):
+            time = yield (time, customer_id, '1皿注文')
+        time = yield (time, customer_id, '最後の注文')
+        yield (time, customer_id, '退店')
+
+    def compute_duration(previous_action):
+        if previous_action == 'お店に到着':
+            interval = ordering_duration
+        if previous_action == '1皿注文':
+            interval = eating_duration + ordering_duration
+        if previous_action == '最後の注文':
+            interval = eating_duration
+        if previous_action == '退店':
+            return 1
+        return int(rng.expovariate(1 / interval))
+
+    event_que = queue.PriorityQueue()
+    customers = {
+        i: customer_process(i,
+                            rng.randint(1, 10),
+                            start_time=customer_interval * i +
+                            rng.randint(1, customer_interval))
+        for i in range(number_of_customers)
+    }
+    for _, process in customers.items():
+        event_que.put(next(process))
+
+    log = []
+    simulation_time = 0
+    while simulation_time < end_time:
+        if event_que.empty():
+            break
+        simulation_time, customer_id, previous_action = event_que.get()
+        log.append((simulation_time, customer_id, previous_action))
+        next_time = simulation_time + compute_duration(previous_action)
+        try:
+            next_event = customers[customer_id].send(next_time)
+        except StopIteration:
+            del customers[customer_id]
+        else:
+            event_que.put(next_event)
+    return log
+
+
+def sink_log(sink):
+    sink.flush()
+    return [(time, customer_id, sink.actions[code].label)
+            for time, customer_id, code in zip(sink.times, sink.customer_ids,
+                                               sink.codes)]
+
+
+def model_log(scheduler=None, **kwargs):
+    sink = MemorySink()
+    sim = SushiModel(**kwargs).simulation(sink=sink)
+    if scheduler is not None:
+        while len(sim.scheduler):
+            scheduler.push(sim.scheduler.pop())
+        sim.scheduler = scheduler
+    sim.run()
+    return sink_log(sink)
+
+
+def test_seed_reproduces_page_log():
+    assert model_log(seed=1991) == page_log(seed=1991)
+
+
+def test_page_log_with_more_customers():
+    # ページのループは閉店時刻を過ぎた最初のイベントも処理するので，
+    # 閉店までに全員が帰る設定で比べる
+    expected = page_log(seed=7, number_of_customers=40, end_time=10**9)
+    assert model_log(seed=7, number_of_customers=40, end_time=None) == expected
+
+
+def test_heap_scheduler_gives_same_log():
+    assert model_log(HeapScheduler(), seed=1991) == page_log(seed=1991)
+
+
+def constant(action):
+    return 2
+
+
+def two_orders(customer_id, start_time=0):
+    time = yield (start_time, customer_id, Action.ARRIVE)
+    time = yield (time, customer_id, Action.ORDER)
+    yield (time, customer_id, Action.LEAVE)
+
+
+def test_run_returns_customers_left_behind():
+    sim = Simulation(constant, end_time=3)
+    sim.add(0, two_orders(0))
+    sim.add(1, two_orders(1, start_time=10))
+    assert sim.run() == 2
+    assert sim.events == 2
+
+
+def test_run_can_be_resumed():
+    sim = Simulation(constant)
+    sim.add(0, two_orders(0))
+    sim.run(until=3)
+    assert sim.events == 2
+    assert sim.run() == 0
+    assert sim.events == 3
+    assert sim.now == 4
+
+
+def test_hook_holds_process_until_resumed():
+    held = []
+
+    def hold(sim, time, customer_id, action):
+        held.append((customer_id, time, action))
+        return False
+
+    sim = Simulation(constant)
+    sim.on(Action.ORDER, hold)
+    sim.add(0, two_orders(0))
+    sim.run()
+    assert held == [(0, 2, Action.ORDER)]
+    assert len(sim.processes) == 1
+
+    sim.resume(0, 10, Action.ORDER)
+    sim.run()
+    assert not sim.processes
+    assert sim.now == 12
+
+
+def test_cancelled_event_is_skipped():
+    sink = MemorySink()
+    sim = Simulation(constant, sink=sink)
+    sim.add(0, two_orders(0))
+    handle = sim.schedule(1, 5, Action.TICK)
+    sim.cancel(handle)
+    assert len(sim) == 1
+    sim.run()
+    assert list(sink.customer_ids) == [0, 0, 0]
+
+
+@pytest.mark.parametrize('scheduler', [HeapScheduler, CalendarQueue])
+def test_cancelled_events_are_compacted(scheduler):
+    sim = Simulation(constant, sink=MemorySink(), scheduler=scheduler())
+    handles = [sim.schedule(i, -2, Action.TICK) for i in range(4000)]
+    for handle in handles[:3000]:
+        sim.cancel(handle)
+    assert len(sim) == 1000
+    # 取り消しがキューの半分を超えたところでまとめて取り除かれる
+    assert len(sim.scheduler) < 4000 - COMPACT_THRESHOLD
+    sim.on(Action.TICK, lambda sim, time, customer_id, action: False)
+    sim.run()
+    assert sim.events == 1000
+    assert sim.sink.times[0] == 3000
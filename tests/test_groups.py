@@ -0,0 +1,49 @@
+import pytest
+
+from sushi import Action
+from sushi.arrivals import PiecewiseIntensity
+from sushi.groups import GroupModel, Party, PeopleStats, party_process
+from sushi.seating import Floor
+from sushi.sinks import MemorySink
+
+
+def test_first_orders_start_from_the_seat_time():
+    party = Party(0, [2, 1], arrival=0)
+    process = party_process(party, lambda: 3)
+    assert next(process) == (0, 0, Action.ARRIVE)
+    # 30 分待たされて席に着いた
+    time, _, action = process.send(30)
+    assert (time, action) == (33, Action.ORDER)
+
+
+def test_party_leaves_when_every_member_has_finished():
+    people = PeopleStats()
+    party = Party(0, [1, 3], arrival=0)
+    process = party_process(party, lambda: 1, on_leave=people.observe)
+    events = [next(process)]
+    while events[-1][2] != Action.LEAVE:
+        time, _, action = events[-1]
+        events.append(process.send(time + 2))
+    actions = [action for _, _, action in events]
+    assert actions.count(Action.LAST_ORDER) == 2
+    assert actions.count(Action.ORDER) == 2
+    assert events[-1][0] == max(party.exit_time)
+    assert list(party.eaten) == [1, 3]
+    assert people.people == 2
+    assert people.plates.mean == 2
+
+
+@pytest.mark.parametrize('params', [{}, {'patience': 5}, {'balk_at': 1}])
+def test_party_sizes_are_dropped_when_parties_end(params):
+    model = GroupModel(intensity=PiecewiseIntensity([0], [0.03]),
+                       end_time=5000, seed=3, floor=Floor((4,), (4, 6)),
+                       **params)
+    sim = model.simulation(sink=MemorySink())
+    largest = 0
+    while sim.step() is not None:
+        largest = max(largest, len(model.party_sizes))
+    assert model.party_sizes == {}
+    # 来店した約 150 組ではなく，店にいるグループの数だけを持つ
+    assert model.arrivals.arrived > 100
+    assert largest < 30
+    assert model.seating.in_use == 0
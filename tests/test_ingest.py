@@ -0,0 +1,114 @@
+import time
+
+import pytest
+
+import sushi.ingest
+from sushi import Action
+from sushi.ingest import load, parse_time
+
+
+def write_log(path, rows, header=('customer_id', 'time', 'kind', 'item')):
+    lines = [','.join(header)] + [','.join(map(str, row)) for row in rows]
+    path.write_text('\n'.join(lines) + '\n', encoding='utf-8')
+    return path
+
+
+@pytest.fixture
+def tokyo(monkeypatch):
+    # 日時の解釈がホストのタイムゾーンによらないことを確かめる
+    if not hasattr(time, 'tzset'):
+        pytest.skip('time.tzset is not available')
+    monkeypatch.setenv('TZ', 'Asia/Tokyo')
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def test_parse_time_counts_minutes_of_the_local_day(tokyo):
+    assert parse_time('12.5') == 12.5
+    for value in ('2024-03-05T09:30:15', '2024-03-05T09:30:15+09:00',
+                  '2024-03-05T09:30:15-05:00'):
+        assert parse_time(value) % (24 * 60) == pytest.approx(9 * 60 + 30.25)
+    assert (parse_time('2024-03-06T00:10:00')
+            - parse_time('2024-03-05T23:50:00')) == pytest.approx(20)
+
+
+def test_load_summarises_each_customer(tmp_path):
+    log = write_log(tmp_path / 'pos.csv', [
+        ('a', 0, 'arrival', ''),
+        ('a', 5, 'order', 'maguro'),
+        ('b', 6, 'arrival', ''),
+        ('a', 9, 'order', 'tamago'),
+        ('b', 10, 'order', 'maguro'),
+        ('a', 20, 'exit', ''),
+        ('b', 30, 'exit', ''),
+    ])
+    with load(log, cache_dir=tmp_path / 'cache', chunk_size=2) as calibration:
+        assert len(calibration) == 2
+        assert list(calibration.customers['arrival']) == [0, 6]
+        assert list(calibration.customers['ordering']) == [5, 4]
+        assert list(calibration.customers['eating']) == [11, 20]
+        assert list(calibration.customers['stay']) == [20, 24]
+        assert list(calibration.customers['orders']) == [2, 1]
+        assert list(calibration.intervals['interval']) == [4]
+        assert calibration.items == ['maguro', 'tamago']
+        assert calibration.demand == [2, 1]
+        durations = calibration.durations()
+        assert set(durations) == {Action.ARRIVE, Action.ORDER,
+                                  Action.LAST_ORDER}
+
+
+def test_idle_customers_leave_at_their_last_order(tmp_path):
+    log = write_log(tmp_path / 'pos.csv', [
+        ('a', 0, 'order', ''),
+        ('a', 3, 'order', ''),
+        ('b', 100, 'order', ''),
+        ('a', 200, 'order', ''),
+    ])
+    with load(log, cache_dir=tmp_path / 'cache', chunk_size=1,
+              idle_gap=60) as calibration:
+        # 100 分の時点で a は閉じられ，200 分の行は別の来店になる
+        assert list(calibration.customers['arrival']) == [0, 100, 200]
+        assert list(calibration.customers['orders']) == [2, 1, 1]
+        assert list(calibration.customers['stay']) == [3, 0, 0]
+    with load(log, cache_dir=tmp_path / 'cache', chunk_size=1,
+              idle_gap=None) as calibration:
+        assert list(calibration.customers['orders']) == [1, 3]
+
+
+def test_arrival_intensity_peaks_at_the_local_hour(tmp_path, tokyo):
+    rows = []
+    for day in (1, 2):
+        for minute in range(0, 60, 10):
+            rows.append((f'{day}-{minute}',
+                         f'2024-03-0{day}T12:{minute:02d}:00', 'order',
+                         ''))
+        rows.append((f'{day}-late', f'2024-03-0{day}T20:00:00', 'order', ''))
+    log = write_log(tmp_path / 'pos.csv', rows)
+    with load(log, cache_dir=tmp_path / 'cache',
+              idle_gap=None) as calibration:
+        intensity = calibration.arrival_intensity()
+    rates = intensity.rates
+    assert max(range(24), key=rates.__getitem__) == 12
+    assert rates[12] == pytest.approx(6 / 60)
+    assert rates[20] == pytest.approx(1 / 60)
+
+
+def test_load_reuses_the_cache(tmp_path, monkeypatch):
+    log = write_log(tmp_path / 'pos.csv', [('a', 0, 'order', 'maguro')])
+    load(log, cache_dir=tmp_path / 'cache').close()
+
+    def fail(*args, **kwargs):
+        raise AssertionError('the cache was rebuilt')
+
+    monkeypatch.setattr(sushi.ingest, 'ingest', fail)
+    with load(log, cache_dir=tmp_path / 'cache') as calibration:
+        assert calibration.demand == [1]
+
+
+def test_unknown_kind_is_rejected(tmp_path):
+    log = write_log(tmp_path / 'pos.csv', [('a', 0, 'refund', '')])
+    with pytest.raises(ValueError):
+        load(log, cache_dir=tmp_path / 'cache')
+    assert list((tmp_path / 'cache').iterdir()) == []
@@ -0,0 +1,104 @@
+import random
+
+import pytest
+
+from sushi import Action, Simulation, SushiModel
+from sushi.menu import AliasTable, Menu
+from sushi.sinks import MemorySink
+
+
+def frequencies(sample, size, draws=100000, seed=1):
+    rng = random.Random(seed)
+    counts = [0] * size
+    for _ in range(draws):
+        counts[sample(rng)] += 1
+    return [count / draws for count in counts]
+
+
+def test_alias_table_follows_the_weights():
+    weights = [1, 2, 3, 4, 0]
+    table = AliasTable(weights)
+    observed = frequencies(lambda rng: table.sample(rng.random()), 5)
+    for frequency, weight in zip(observed, weights):
+        assert frequency == pytest.approx(weight / 10, abs=0.01)
+
+
+def test_alias_table_rejects_bad_weights():
+    with pytest.raises(ValueError):
+        AliasTable([])
+    with pytest.raises(ValueError):
+        AliasTable([0, 0])
+    with pytest.raises(ValueError):
+        AliasTable([1, -1, 2])
+
+
+def test_blocked_menu_follows_the_weights_and_updates():
+    weights = [i % 7 + 1 for i in range(100)]
+    menu = Menu([f'item{i}' for i in range(100)], weights, block_size=8,
+                rng=random.Random(2))
+    menu.update('item3', weight=0)
+    menu.update(97, weight=50)
+    weights[3] = 0
+    weights[97] = 50
+    total = sum(weights)
+    draws = 200000
+    for _ in range(draws):
+        menu.pick()
+    assert menu.demand[3] == 0
+    for i in (0, 50, 97):
+        assert menu.demand[i] / draws == pytest.approx(weights[i] / total,
+                                                       abs=0.005)
+
+
+def test_pick_counts_revenue():
+    menu = Menu(['maguro', 'tamago'], [1, 0], prices=[300, 100],
+                rng=random.Random(3))
+    for _ in range(5):
+        assert menu.pick() == 0
+    assert list(menu.demand) == [5, 0]
+    assert menu.revenue == 1500
+
+
+def test_names_and_weights_must_match():
+    with pytest.raises(ValueError):
+        Menu(['a', 'b'], [1])
+
+
+def one_order(customer_id):
+    time = yield (0, customer_id, Action.ARRIVE)
+    time = yield (time, customer_id, Action.LAST_ORDER)
+    yield (time, customer_id, Action.LEAVE)
+
+
+def test_attach_chains_to_an_existing_hook():
+    held = []
+
+    def hold(sim, time, customer_id, action):
+        held.append(customer_id)
+        return False
+
+    sim = Simulation(lambda action: 1)
+    sim.on(Action.LAST_ORDER, hold)
+    menu = Menu(['a'], [1], rng=random.Random(4)).attach(sim)
+    sim.add(0, one_order(0))
+    sim.run()
+    # 商品は選ばれ，前のフックがプロセスを保留したまま
+    assert list(menu.demand) == [1]
+    assert held == [0]
+    assert len(sim.processes) == 1
+
+
+def test_model_counts_every_order_once_per_run():
+    menu = Menu(['a', 'b', 'c'], [1, 2, 3])
+    model = SushiModel(number_of_customers=30, end_time=None, seed=5,
+                       menu=menu)
+    for _ in range(2):
+        sink = MemorySink()
+        sim = model.simulation(sink=sink)
+        # 2 度つないでも 1 回の注文で 1 商品
+        menu.attach(sim)
+        sim.run()
+        sink.flush()
+        orders = sum(1 for code in sink.codes
+                     if code in (Action.ORDER, Action.LAST_ORDER))
+        assert sum(menu.demand) == orders
@@ -0,0 +1,142 @@
+import pytest
+
+from sushi import Action, Seats, Simulation
+from sushi.engine import COMPACT_THRESHOLD
+from sushi.sinks import MemorySink
+from sushi.stats import KPICollector
+
+
+def ten_minutes(action):
+    return 10
+
+
+def visit(customer_id, start_time=0):
+    time = yield (start_time, customer_id, Action.ARRIVE)
+    time = yield (time, customer_id, Action.ORDER)
+    yield (time, customer_id, Action.LEAVE)
+
+
+def shop(capacity, arrivals, **kwargs):
+    sim = Simulation(ten_minutes, sink=MemorySink())
+    seats = Seats(capacity, **kwargs).attach(sim)
+    for customer_id, time in enumerate(arrivals):
+        sim.add(customer_id, visit(customer_id, time))
+    return sim, seats
+
+
+def test_waiting_customers_are_seated_in_arrival_order():
+    stats = KPICollector()
+    sim, seats = shop(1, [0, 1, 2], stats=stats)
+    assert sim.run() == 0
+    # 0 は 0 分に座り 20 分に帰る．1 は 20 分，2 は 40 分に座る
+    assert stats.waits.count == 3
+    assert stats.waits.mean == pytest.approx((0 + 19 + 38) / 3)
+    assert stats.waited == 2
+    assert stats.max_wait == 38
+    assert sim.now == 60
+
+
+def test_report_reads_the_shared_collector():
+    stats = KPICollector()
+    sim, seats = shop(2, [0, 0, 0, 0], stats=stats)
+    sim.run()
+    report = seats.report(sim.now)
+    assert seats.stats is stats
+    assert report['served'] == 4
+    assert report['waited'] == 2
+    assert report['max_wait'] == 20
+    assert report['mean_wait'] == stats.waits.mean
+    assert report['max_queue_length'] == 2
+    assert report['mean_queue_length'] == pytest.approx((2 * 20 + 0) / 40)
+
+
+def test_default_collector_has_no_p2_markers():
+    sim, seats = shop(1, [0, 0, 0])
+    sim.run()
+    assert seats.stats.wait_quantiles == {}
+    assert seats.wait_quantiles((0.5,)) == {
+        0.5: seats.stats.wait_histogram.quantile(0.5)
+    }
+
+
+def test_wait_quantiles_without_waits():
+    sim, seats = shop(1, [])
+    assert seats.wait_quantiles((0.5, 0.9)) == {0.5: 0.0, 0.9: 0.0}
+
+
+def test_balk_when_the_line_is_long():
+    sim, seats = shop(1, [0, 1, 2, 3], balk_at=2)
+    assert sim.run() == 0
+    assert seats.balked == 1
+    assert seats.stats.waits.count == 3
+
+
+def logged(sim, action):
+    sim.sink.flush()
+    return [(time, customer_id)
+            for time, customer_id, code in zip(
+                sim.sink.times, sim.sink.customer_ids, sim.sink.codes)
+            if code == action]
+
+
+def test_impatient_customers_renege():
+    sim, seats = shop(1, [0, 1, 2, 3], patience=lambda: 5)
+    assert sim.run() == 0
+    assert logged(sim, Action.RENEGE) == [(6, 1), (7, 2), (8, 3)]
+    assert seats.reneged == 3
+    assert seats.stats.waits.count == 1
+    assert len(seats) == 0
+    assert seats.report(sim.now)['still_waiting'] == 0
+
+
+def test_seated_customers_do_not_renege():
+    sim, seats = shop(1, [0, 1], patience=lambda: 30)
+    assert sim.run() == 0
+    assert logged(sim, Action.RENEGE) == []
+    assert seats.reneged == 0
+    assert seats.stats.max_wait == 19
+
+
+def test_reneged_entries_are_skipped_when_a_seat_frees():
+    patience = iter([5, 100]).__next__
+    sim, seats = shop(1, [0, 1, 2], patience=patience)
+    assert sim.run() == 0
+    assert logged(sim, Action.RENEGE) == [(6, 1)]
+    # 帰った 1 の項目は行列に残っていても読み飛ばされ，2 が座る
+    assert logged(sim, Action.ORDER) == [(10, 0), (30, 2)]
+    assert seats.stats.max_wait == 18
+
+
+def pending(sim, action):
+    return sum(1 for entry in sim.scheduler.heap
+               if entry[3] == action and entry[2] not in sim._cancelled)
+
+
+def test_only_the_earliest_renege_is_scheduled():
+    sim, seats = shop(1, range(50), patience=lambda: 1000)
+    sim.run(until=55)
+    assert len(seats) == 47
+    assert pending(sim, Action.RENEGE) == 1
+    assert sim.run() == 0
+    assert seats.reneged == 0
+
+
+def test_cancelled_renege_events_leave_the_log_unchanged():
+    arrivals = [i // 3 for i in range(3000)]
+    plain, _ = shop(20, arrivals)
+    plain.run()
+    patient, seats = shop(20, arrivals, patience=lambda: 10**9)
+    patient.run()
+    for action in (Action.ARRIVE, Action.ORDER, Action.LEAVE):
+        assert logged(patient, action) == logged(plain, action)
+    assert seats.reneged == 0
+    # 席に着いた顧客の限界はまとめて捨てられる
+    assert len(seats._deadlines) <= 2 * COMPACT_THRESHOLD
+
+
+def test_balking_customers_never_join_the_line():
+    sim, seats = shop(1, [0, 0, 0, 0], balk_at=1, patience=lambda: 100)
+    assert sim.run() == 0
+    assert logged(sim, Action.BALK) == [(0, 2), (0, 3)]
+    assert seats.balked == 2
+    assert logged(sim, Action.RENEGE) == []
@@ -0,0 +1,71 @@
+import random
+
+import pytest
+
+from sushi.rng import BACKENDS, MIRROR, MirroredRandom, Streams
+
+
+def test_mirrored_random_mirrors_only_the_uniforms():
+    plain = random.Random(5)
+    mirrored = MirroredRandom(5)
+    for _ in range(1000):
+        assert mirrored.random() == MIRROR - plain.random()
+    # 整数は getrandbits() から作るので元の列と同じ
+    assert ([mirrored.randint(1, 10) for _ in range(1000)]
+            == [plain.randint(1, 10) for _ in range(1000)])
+    assert ([mirrored.randrange(3, 10**20) for _ in range(100)]
+            == [plain.randrange(3, 10**20) for _ in range(100)])
+    items = list(range(50))
+    shuffled = list(items)
+    mirrored.shuffle(shuffled)
+    plain.shuffle(items)
+    assert shuffled == items
+
+
+def test_mirrored_uniforms_stay_in_the_unit_interval():
+    mirrored = MirroredRandom(6)
+    values = [mirrored.random() for _ in range(10000)]
+    assert min(values) >= 0
+    assert max(values) < 1
+
+
+@pytest.mark.parametrize('backend', sorted(BACKENDS))
+def test_streams_do_not_depend_on_the_block_size(backend):
+    def draws(block_size):
+        streams = Streams(7, block_size=block_size, backend=backend)
+        draw = streams.stream('duration', 1).exponential(3)
+        return [draw() for _ in range(100)]
+
+    assert draws(1) == draws(16) == draws(4096)
+
+
+@pytest.mark.parametrize('backend', sorted(BACKENDS))
+def test_streams_are_keyed(backend):
+    streams = Streams(8, backend=backend)
+
+    def first(*key):
+        draw = streams.stream(*key).random()
+        return [draw() for _ in range(10)]
+
+    assert first('a') == first('a')
+    assert first('a') != first('b')
+    spawned = streams.spawn('a').stream().random()
+    assert first('a') == [spawned() for _ in range(10)]
+    assert first('a') != first('a', 1)
+
+
+@pytest.mark.parametrize('backend', sorted(BACKENDS))
+def test_antithetic_streams_mirror_the_uniforms(backend):
+    streams = Streams(9, backend=backend)
+    plain = streams.stream('x').random()
+    mirrored = streams.mirror().stream('x').random()
+    for _ in range(1000):
+        assert plain() + mirrored() == pytest.approx(MIRROR, abs=1e-15)
+    assert isinstance(streams.mirror().random('y'), MirroredRandom)
+
+
+@pytest.mark.parametrize('backend', sorted(BACKENDS))
+def test_integers_cover_the_closed_range(backend):
+    draw = Streams(10, backend=backend).stream('plates').integers(1, 10)
+    values = [draw() for _ in range(5000)]
+    assert set(values) == set(range(1, 11))
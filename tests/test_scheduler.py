@@ -0,0 +1,105 @@
+import random
+
+import pytest
+
+from sushi import SushiModel
+from sushi.scheduler import CalendarQueue, HeapScheduler
+from sushi.sinks import MemorySink
+
+
+def drain(scheduler):
+    entries = []
+    while len(scheduler):
+        entries.append(scheduler.pop())
+    return entries
+
+
+def random_operations(seed, count=5000):
+    # (push する項目か None (pop)) の列．時刻には同時刻，過去，遠い未来を混ぜる
+    rng = random.Random(seed)
+    now = 0
+    operations = []
+    for seq in range(count):
+        if rng.random() < 0.4:
+            operations.append(None)
+            continue
+        choice = rng.random()
+        if choice < 0.3:
+            time = now
+        elif choice < 0.35:
+            time = max(0, now - rng.randint(1, 50))
+        elif choice < 0.4:
+            time = now + rng.randint(2000, 10000)
+        else:
+            time = now + rng.randint(0, 30)
+        now = max(now, time - 30)
+        operations.append((time, rng.randint(0, 20), seq, 'action'))
+    return operations
+
+
+@pytest.mark.parametrize('width', [1, 0.5, 7])
+def test_calendar_queue_pops_in_heap_order(width):
+    heap = HeapScheduler()
+    calendar = CalendarQueue(buckets=64, width=width)
+    popped = {'heap': [], 'calendar': []}
+    for entry in random_operations(width):
+        if entry is None:
+            if len(heap):
+                popped['heap'].append(heap.pop())
+                popped['calendar'].append(calendar.pop())
+            continue
+        heap.push(entry)
+        calendar.push(entry)
+        assert calendar.peek() == heap.peek()
+    popped['heap'] += drain(heap)
+    popped['calendar'] += drain(calendar)
+    assert popped['calendar'] == popped['heap']
+    assert calendar.peek() is None
+    with pytest.raises(IndexError):
+        calendar.pop()
+
+
+def test_ties_are_broken_by_customer_and_sequence():
+    entries = [(5, 3, 0, 'a'), (5, 1, 1, 'b'), (5, 1, 2, 'c'), (4, 9, 3, 'd')]
+    calendar = CalendarQueue()
+    for entry in entries:
+        calendar.push(entry)
+    assert drain(calendar) == sorted(entries)
+
+
+@pytest.mark.parametrize('scheduler', [HeapScheduler, CalendarQueue])
+def test_pop_before_and_compact(scheduler):
+    queue = scheduler()
+    for seq, time in enumerate([1, 2, 2, 3, 5000, 9]):
+        queue.push((time, 0, seq, 'action'))
+    assert queue.pop_before(2) == (1, 0, 0, 'action')
+    assert queue.pop_before(2) is None
+    queue.compact({1, 4})
+    assert len(queue) == 3
+    assert drain(queue) == [(2, 0, 2, 'action'), (3, 0, 3, 'action'),
+                            (9, 0, 5, 'action')]
+
+
+def event_log(scheduler, **params):
+    model = SushiModel(number_of_customers=300, customer_interval=1,
+                       end_time=None, seed=8, **params)
+    sink = MemorySink()
+    sim = model.simulation(sink=sink)
+    if scheduler is not None:
+        while len(sim.scheduler):
+            scheduler.push(sim.scheduler.pop())
+        sim.scheduler = scheduler
+    sim.run()
+    sink.flush()
+    return list(zip(sink.times, sink.customer_ids, sink.codes))
+
+
+def test_simulation_uses_the_heap_by_default():
+    model = SushiModel()
+    assert isinstance(model.simulation().scheduler, HeapScheduler)
+
+
+@pytest.mark.parametrize('params', [{}, {'seats': 10, 'patience': 4}])
+def test_calendar_queue_gives_the_same_event_log(params):
+    expected = event_log(None, **params)
+    assert event_log(CalendarQueue(buckets=16), **params) == expected
@@ -0,0 +1,162 @@
+import random
+
+import pytest
+
+from sushi import Action, Simulation
+from sushi.seating import (BOX, COUNTER, Allocation, Floor, FloorSeating,
+                           best_fit, first_fit, hold_boxes)
+from sushi.sinks import MemorySink
+
+
+def test_counter_fit_first_and_best():
+    floor = Floor(counters=(10,))
+    floor.take(Allocation(COUNTER, 0, 2, 3))
+    floor.take(Allocation(COUNTER, 0, 8, 1))
+    # 空席は 0-1，5-7，9
+    assert floor.counter_fit(2) == Allocation(COUNTER, 0, 0, 2)
+    assert floor.counter_fit(3) == Allocation(COUNTER, 0, 5, 3)
+    assert floor.counter_fit(1, best=True) == Allocation(COUNTER, 0, 9, 1)
+    assert floor.counter_fit(2, best=True) == Allocation(COUNTER, 0, 0, 2)
+    assert floor.counter_fit(4) is None
+    assert floor.counter_fit(4, best=True) is None
+
+
+def test_release_merges_free_runs():
+    floor = Floor(counters=(6,))
+    left = Allocation(COUNTER, 0, 0, 3)
+    right = Allocation(COUNTER, 0, 3, 3)
+    floor.take(left)
+    floor.take(right)
+    assert floor.free_seats == 0
+    floor.release(left)
+    floor.release(right)
+    assert floor.counter_fit(6) == Allocation(COUNTER, 0, 0, 6)
+
+
+def test_box_fit_prefers_the_smallest_box():
+    floor = Floor(boxes=(6, 4, 4))
+    assert floor.box_fit(3) == Allocation(BOX, 1, 0, 4)
+    assert floor.box_fit(3, best=False) == Allocation(BOX, 0, 0, 6)
+    floor.take(Allocation(BOX, 1, 0, 4))
+    assert floor.box_fit(3) == Allocation(BOX, 2, 0, 4)
+    assert floor.box_fit(7) is None
+
+
+def test_best_fit_takes_an_exact_box_then_the_shortest_counter_run():
+    floor = Floor(counters=(3, 8), boxes=(4, 6))
+    assert best_fit(floor, 4) == Allocation(BOX, 0, 0, 4)
+    assert best_fit(floor, 2) == Allocation(COUNTER, 0, 0, 2)
+    # カウンターの残りは後のグループが使えるので，ボックスより優先する
+    assert best_fit(floor, 5) == Allocation(COUNTER, 1, 0, 5)
+    assert best_fit(floor, 9) is None
+    floor.take(Allocation(COUNTER, 1, 0, 8))
+    assert best_fit(floor, 5) == Allocation(BOX, 1, 0, 6)
+
+
+def test_first_fit_and_hold_boxes():
+    floor = Floor(counters=(2,), boxes=(4,))
+    assert first_fit(floor, 2) == Allocation(COUNTER, 0, 0, 2)
+    assert first_fit(floor, 3) == Allocation(BOX, 0, 0, 4)
+    floor.take(Allocation(COUNTER, 0, 0, 2))
+    assert first_fit(floor, 1) == Allocation(BOX, 0, 0, 4)
+    # 1 人客にはボックスを空けておく
+    assert hold_boxes(floor, 1) is None
+    assert hold_boxes(floor, 2) == Allocation(BOX, 0, 0, 4)
+    assert hold_boxes(Floor(boxes=(4,)), 1) == Allocation(BOX, 0, 0, 4)
+
+
+def visit(customer_id, start_time, stay):
+    time = yield (start_time, customer_id, Action.ARRIVE)
+    time = yield (time + stay, customer_id, Action.ORDER)
+    yield (time, customer_id, Action.LEAVE)
+
+
+def dining(floor, parties, seating_class=FloorSeating, **kwargs):
+    # parties は (到着時刻, 人数, 滞在時間) のリスト
+    sim = Simulation(lambda action: 0, sink=MemorySink())
+    sizes = {i: size for i, (_, size, _) in enumerate(parties)}
+    seating = seating_class(floor, size_of=sizes.__getitem__,
+                            **kwargs).attach(sim)
+    for i, (start, _, stay) in enumerate(parties):
+        sim.add(i, visit(i, start, stay))
+    sim.run()
+    sim.sink.flush()
+    seated = [
+        (time, customer_id)
+        for time, customer_id, code in zip(sim.sink.times,
+                                           sim.sink.customer_ids,
+                                           sim.sink.codes)
+        if code == Action.ORDER
+    ]
+    return sim, seating, seated
+
+
+def test_strict_seating_keeps_the_line_in_order():
+    parties = [(0, 3, 10), (1, 2, 10), (2, 1, 10)]
+    _, seating, seated = dining(Floor(counters=(4,)), parties)
+    # 1 人客は 2 人客の後ろで待つ
+    assert seated == [(10, 0), (20, 1), (20, 2)]
+    assert seating.waited == 2
+    assert seating.in_use == 0
+
+
+def test_loose_seating_seats_whoever_fits_in_arrival_order():
+    parties = [(0, 4, 10), (1, 3, 10), (2, 1, 10), (3, 3, 10), (4, 1, 10)]
+    _, seating, seated = dining(Floor(counters=(4,)), parties, strict=False)
+    # 10 分に 4 席空くと，並んだ順に 3 人と 1 人が座る
+    assert seated[:3] == [(10, 0), (20, 1), (20, 2)]
+    assert sorted(seated[3:]) == [(30, 3), (30, 4)]
+    assert len(seating) == 0
+
+
+class ScanningSeating(FloorSeating):
+    # 1 本の行列を先頭から全て調べる素朴な案内
+
+    def _line_up(self, entry):
+        self.waiting.append(entry)
+
+    def release(self, sim, time, customer_id, action):
+        allocation = self.assigned.pop(customer_id)
+        self.floor.release(allocation)
+        self.in_use -= allocation.size
+        self._record_queue(time)
+        remaining = []
+        entry = self._popleft()
+        while entry is not None:
+            if self._seat(entry[0], self._size(entry[0])):
+                self._admit(sim, time, entry)
+            else:
+                remaining.append(entry)
+            entry = self._popleft()
+        self.waiting.extend(remaining)
+        return True
+
+
+@pytest.mark.parametrize('policy', ['first_fit', 'best_fit', 'hold_boxes'])
+def test_loose_seating_matches_a_full_scan_of_the_line(policy):
+    rng = random.Random(7)
+    parties = [(i, rng.randint(1, 6), rng.randint(5, 60)) for i in range(300)]
+
+    def floor():
+        return Floor(counters=(8, 5), boxes=(4, 4, 6))
+
+    _, fast, fast_seated = dining(floor(), parties, policy=policy,
+                                  strict=False)
+    _, slow, slow_seated = dining(floor(), parties, ScanningSeating,
+                                  policy=policy, strict=False)
+    assert fast_seated == slow_seated
+    assert fast.stats.waits.mean == slow.stats.waits.mean
+
+
+def test_reneged_parties_are_skipped_in_their_line():
+    parties = [(0, 4, 10), (1, 2, 10), (2, 2, 10)]
+    patience = iter([5, 100]).__next__
+    _, seating, seated = dining(Floor(counters=(4,)), parties, strict=False,
+                                patience=patience)
+    assert seating.reneged == 1
+    assert seated == [(10, 0), (20, 2)]
+
+
+def test_a_party_no_table_can_seat_is_rejected():
+    with pytest.raises(ValueError):
+        dining(Floor(counters=(2,), boxes=(4,)), [(0, 5, 10)])
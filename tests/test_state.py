@@ -0,0 +1,77 @@
+import pickle
+
+from sushi import SushiModel
+from sushi.sinks import MemorySink
+from sushi.state import StateMachineSimulation
+
+PARAMS = {'number_of_customers': 200, 'customer_interval': 2}
+
+
+def log(sink):
+    sink.flush()
+    return list(zip(sink.times, sink.customer_ids, sink.codes))
+
+
+def state_log(seed=11, **params):
+    sink = MemorySink()
+    sim = StateMachineSimulation.from_model_params(seed, sink,
+                                                   **{**PARAMS, **params})
+    left = sim.run()
+    return log(sink), left
+
+
+def test_matches_the_generator_simulation():
+    sink = MemorySink()
+    sim = SushiModel(seed=11, **PARAMS).simulation(sink=sink)
+    left = sim.run()
+    assert state_log() == (log(sink), left)
+
+
+def test_run_can_be_split():
+    sink = MemorySink()
+    sim = StateMachineSimulation.from_model_params(11, sink, **PARAMS)
+    sim.run(until=100)
+    assert sim.now < 100
+    left = sim.run()
+    assert (log(sink), left) == state_log()
+
+
+def test_restore_from_a_pickled_snapshot():
+    sink = MemorySink()
+    sim = StateMachineSimulation.from_model_params(11, sink, **PARAMS)
+    sim.run(until=150)
+    snapshot = pickle.loads(pickle.dumps(sim.snapshot()))
+    rest = MemorySink()
+    restored = StateMachineSimulation.restore(snapshot, sink=rest)
+    left = restored.run()
+    expected, expected_left = state_log()
+    assert log(sink) + log(rest) == expected
+    assert left == expected_left
+    assert restored.events == len(expected)
+
+
+def test_forks_do_not_disturb_the_parent():
+    sink = MemorySink()
+    sim = StateMachineSimulation.from_model_params(11, sink, **PARAMS)
+    sim.run(until=150)
+    customers = sim.customers
+    late = sim.fork(sink=MemorySink(), end_time=None)
+    early = sim.fork(sink=MemorySink(), end_time=200)
+    assert late.run() == 0
+    assert early.run() > 0
+    assert early.now < 200
+    # 分岐を先に進めても親の状態は変わらない
+    assert sim.customers == customers
+    sim.run()
+    assert log(sink) == state_log()[0]
+    # 終了時刻の違いは分岐した後のイベントにだけ表れる
+    assert log(early.sink) == log(late.sink)[:len(log(early.sink))]
+
+
+def test_adding_a_customer_to_a_fork_leaves_the_parent_alone():
+    sim = StateMachineSimulation.from_model_params(11, **PARAMS)
+    fork = sim.fork()
+    fork.add_customer(1000, 3, start_time=5)
+    assert 1000 in fork.customers
+    assert 1000 not in sim.customers
+    assert len(fork) == len(sim) + 1
@@ -0,0 +1,105 @@
+import random
+import statistics
+
+import pytest
+
+from sushi import Action
+from sushi.stats import (Histogram, KPICollector, P2Quantile, TimeAverage,
+                         Welford, t_quantile)
+
+
+def test_welford_matches_statistics():
+    values = [random.Random(1).gauss(10, 3) for _ in range(1000)]
+    stat = Welford(values)
+    assert stat.mean == pytest.approx(statistics.fmean(values))
+    assert stat.variance == pytest.approx(statistics.variance(values))
+
+
+def test_welford_merge_is_exact():
+    values = [random.Random(2).random() for _ in range(301)]
+    merged = Welford(values[:100]).merge(Welford(values[100:]))
+    whole = Welford(values)
+    assert merged.count == whole.count
+    assert merged.mean == pytest.approx(whole.mean)
+    assert merged.variance == pytest.approx(whole.variance)
+
+
+def test_t_quantile():
+    assert t_quantile(0.975, 1) == pytest.approx(12.7062, rel=1e-4)
+    assert t_quantile(0.975, 2) == pytest.approx(4.3027, rel=1e-4)
+    assert t_quantile(0.975, 10) == pytest.approx(2.2281, rel=1e-3)
+
+
+def test_time_average_includes_the_interval_after_advance():
+    average = TimeAverage()
+    average.update(0, 2)
+    average.update(10, 4)
+    assert average.mean == pytest.approx(2)
+    average.advance(20)
+    assert average.mean == pytest.approx(3)
+    assert average.maximum == 4
+
+
+def test_p2_quantile_is_close_to_the_sample_quantile():
+    rng = random.Random(3)
+    values = [rng.expovariate(1) for _ in range(20000)]
+    estimator = P2Quantile(0.9)
+    for value in values:
+        estimator.push(value)
+    expected = statistics.quantiles(values, n=10)[-1]
+    assert estimator.value == pytest.approx(expected, rel=0.02)
+
+
+def test_histogram_merge_and_quantile():
+    left = Histogram(1.0)
+    right = Histogram(1.0)
+    for value in range(50):
+        left.push(value)
+    for value in range(50, 100):
+        right.push(value)
+    left.merge(right)
+    assert left.count == 100
+    assert left.quantile(0.5) == pytest.approx(50)
+    with pytest.raises(ValueError):
+        left.merge(Histogram(2.0))
+
+
+def collector_with_waits(waits):
+    collector = KPICollector()
+    for wait in waits:
+        collector.observe_wait(wait)
+    return collector
+
+
+def test_merging_an_empty_collector_keeps_p2_markers():
+    collector = collector_with_waits(range(100))
+    before = collector.quantile(0.9)
+    collector.merge(KPICollector())
+    assert set(collector.wait_quantiles) == {0.5, 0.9, 0.99}
+    assert collector.quantile(0.9) == before
+
+
+def test_merging_waits_falls_back_to_the_histogram():
+    collector = collector_with_waits(range(100))
+    collector.merge(collector_with_waits(range(100, 200)))
+    assert collector.wait_quantiles == {}
+    assert collector.quantile(0.5) == collector.wait_histogram.quantile(0.5)
+    assert collector.waits.count == 200
+    assert collector.waited == 199
+    assert collector.max_wait == 199
+
+
+def test_collector_occupancy_closes_at_the_end_of_the_run():
+    collector = KPICollector()
+    collector.record(0, 0, Action.ARRIVE)
+    collector.record(5, 1, Action.ARRIVE)
+    collector.record(10, 0, Action.ORDER)
+    collector.record(10, 0, Action.LAST_ORDER)
+    collector.record(20, 0, Action.LEAVE)
+    collector.advance(30)
+    # 0-5 分は 1 人，5-20 分は 2 人，20-30 分は 1 人
+    assert collector.occupancy.mean == pytest.approx((5 + 30 + 10) / 30)
+    summary = collector.summary()
+    assert summary['customers'] == 1
+    assert summary['mean_plates'] == 2
+    assert summary['max_occupancy'] == 2
@@ -0,0 +1,86 @@
+import math
+import random
+
+import pytest
+
+from sushi.stopping import (WaitSeries, batch_means, mser, replicate_until,
+                            run_until, stationary, truncated_replication)
+
+PARAMS = {'number_of_customers': 200, 'customer_interval': 1,
+          'end_time': None, 'seats': 20}
+
+
+def test_mser_cuts_the_transient():
+    rng = random.Random(1)
+    values = [i / 10 + rng.random() for i in range(100)]
+    values += [10 + rng.random() for _ in range(900)]
+    truncation = mser(values)
+    assert 80 <= truncation <= 250
+    assert stationary(values, truncation)
+
+
+def test_mser_keeps_a_stationary_series():
+    rng = random.Random(2)
+    values = [rng.random() for _ in range(1000)]
+    assert mser(values) < 100
+    assert mser(values[:15]) == 0
+    trend = [float(i) for i in range(1000)]
+    assert not stationary(trend, mser(trend))
+
+
+def test_batch_means():
+    stat = batch_means([float(i) for i in range(100)], batches=10)
+    assert stat.count == 10
+    assert stat.mean == pytest.approx(49.5)
+    assert batch_means([1.0] * 5, batches=10).count == 0
+
+
+def test_wait_series_keeps_the_seating_order():
+    series = WaitSeries(quantiles=())
+    for wait in (3.0, 0.0, 5.0):
+        series.observe_wait(wait)
+    assert list(series.waits_in_order) == [3.0, 0.0, 5.0]
+    assert series.waits.count == 3
+
+
+def test_replication_without_observations_has_no_mean():
+    result = truncated_replication(0, end_time=1)
+    assert result['mean'] is None
+    assert result['observations'] == 0
+
+
+def test_empty_replications_are_skipped_and_counted():
+    result = replicate_until(end_time=1, max_replications=6, block_size=4,
+                             workers=1)
+    assert result.empty == 6
+    assert result.used == 6
+    assert not result.converged
+    assert not math.isnan(result.estimate)
+
+
+def test_replicate_until_converges_and_saves_replications():
+    result = replicate_until(precision=0.05, max_replications=200, workers=1,
+                             **PARAMS)
+    assert result.converged
+    assert result.empty == 0
+    assert result.relative_half_width <= 0.05
+    assert 0 < result.saved < 1
+    # 判定は反復番号の順なので，ワーカー数によらない
+    assert replicate_until(precision=0.05, max_replications=200, workers=2,
+                           **PARAMS) == result
+
+
+def test_wait_metric_needs_seats():
+    with pytest.raises(ValueError):
+        truncated_replication(0, metric='wait', number_of_customers=5,
+                              end_time=None)
+
+
+def test_run_until_stops_once_converged():
+    result = run_until(precision=0.1, number_of_customers=5000,
+                       customer_interval=1, end_time=6000, seats=30)
+    assert result.converged
+    assert result.relative_half_width <= 0.1
+    assert result.budget == 6000
+    assert result.used < 6000
+    assert result.saved == 1 - result.used / 6000
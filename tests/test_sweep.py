@@ -0,0 +1,80 @@
+import pytest
+
+import sushi.sweep
+from sushi import SushiModel
+from sushi.conveyor import Conveyor, Lane
+from sushi.menu import Menu
+from sushi.sweep import SweepCache, grid, point_key, sweep
+
+BASE = {'number_of_customers': 20, 'end_time': None}
+
+
+def test_grid_is_the_product_of_the_axes():
+    points = grid({'seats': 4}, customer_interval=[2, 3], eating_duration=[5])
+    assert points == [
+        {'seats': 4, 'customer_interval': 2, 'eating_duration': 5},
+        {'seats': 4, 'customer_interval': 3, 'eating_duration': 5},
+    ]
+
+
+def test_point_key_ignores_the_state_of_a_run():
+    menu = Menu(['maguro', 'tamago'], [2, 1])
+    conveyor = Conveyor([Lane(60, seats=5)])
+    before = point_key({'menu': menu, 'conveyor': conveyor})
+    model = SushiModel(seed=1, menu=menu, conveyor=conveyor, **BASE)
+    model.simulation().run()
+    assert sum(menu.demand) > 0
+    assert point_key({'menu': menu, 'conveyor': conveyor}) == before
+    other = Menu(['maguro', 'tamago'], [1, 1])
+    assert point_key({'menu': other, 'conveyor': conveyor}) != before
+    assert point_key({'menu': menu, 'conveyor': conveyor},
+                     replications=8) != before
+
+
+def test_point_key_rejects_unhashable_parameters():
+    with pytest.raises(TypeError):
+        point_key({'seats': object()})
+
+
+def test_sweep_reads_finished_points_from_the_cache(tmp_path, monkeypatch):
+    points = grid(customer_interval=[2, 3])
+    first = sweep(points, replications=2, workers=1, cache_dir=tmp_path,
+                  **BASE)
+    assert (first.computed, first.cached, first.missing) == (2, 0, 0)
+
+    def fail(*args, **kwargs):
+        raise AssertionError('a cached point was recomputed')
+
+    monkeypatch.setattr(sushi.sweep, 'run_point', fail)
+    second = sweep(points, replications=2, workers=1, cache_dir=tmp_path,
+                   **BASE)
+    assert (second.computed, second.cached) == (0, 2)
+    assert list(second) == list(first)
+    assert 'customer_interval' in second.table('mean_time_in_store')
+
+
+def test_partial_sweeps_resume_where_they_stopped(tmp_path):
+    points = grid(customer_interval=[2, 3, 4])
+    partial = sweep(points, replications=2, workers=1, cache_dir=tmp_path,
+                    max_points=1, **BASE)
+    assert (partial.computed, partial.missing) == (1, 2)
+    assert not partial.complete
+    assert sum(metrics is None for _, metrics in partial) == 2
+    rest = sweep(points, replications=2, workers=1, cache_dir=tmp_path,
+                 **BASE)
+    assert (rest.computed, rest.cached, rest.missing) == (2, 1, 0)
+    assert rest.complete
+
+
+def test_unreadable_cache_entries_are_recomputed(tmp_path):
+    points = grid(customer_interval=[2])
+    sweep(points, replications=2, workers=1, cache_dir=tmp_path, **BASE)
+    cache = SweepCache(tmp_path)
+    key = point_key(dict(BASE, customer_interval=2), replications=2)
+    with open(cache.path(key), 'w', encoding='utf-8') as f:
+        f.write('{"metrics": ')
+    assert cache.get(key) is None
+    again = sweep(points, replications=2, workers=1, cache_dir=tmp_path,
+                  **BASE)
+    assert again.computed == 1
+    assert cache.get(key) is not None